@@ -0,0 +1,91 @@
+"""
+Seed market_prices with synthetic ticks and compare latest-price lookup
+latency: unindexed scan (index use disabled), (ticker, ts DESC) index, and
+the latest_prices table. Runs against DATABASE_URL:
+
+    python -m benchmarks.bench_latest_price --rows 10000000 --tickers 500
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+
+from utils.db_helpers import get_engine, init_db
+
+SEED_CHUNK = 1_000_000
+
+QUERIES = {
+    "seq_scan": "SELECT price FROM market_prices WHERE ticker=:t ORDER BY ts DESC LIMIT 1",
+    "ticker_ts_index": "SELECT price FROM market_prices WHERE ticker=:t ORDER BY ts DESC LIMIT 1",
+    "latest_prices": "SELECT price FROM latest_prices WHERE ticker=:t",
+}
+
+
+def seed(rows: int, tickers: int):
+    """Insert `rows` ticks for SEEDBENCH tickers, newest at NOW(), one second apart per ticker."""
+    with get_engine().begin() as conn:
+        conn.execute(text("DELETE FROM market_prices WHERE ticker LIKE 'SEEDBENCH%'"))
+        conn.execute(text("DELETE FROM latest_prices WHERE ticker LIKE 'SEEDBENCH%'"))
+    for start in range(0, rows, SEED_CHUNK):
+        n = min(SEED_CHUNK, rows - start)
+        with get_engine().begin() as conn:
+            conn.execute(text(
+                """
+                INSERT INTO market_prices (ticker, price, ts, source)
+                SELECT 'SEEDBENCH' || ((g % :tickers) + 1), 100 + random() * 10,
+                       NOW() - make_interval(secs => (:total - g) / :tickers), 'seed'
+                FROM generate_series(:start, :end - 1) AS g
+                """
+            ), {"tickers": tickers, "total": rows, "start": start, "end": start + n})
+    with get_engine().begin() as conn:
+        conn.execute(text("ANALYZE market_prices"))
+
+
+def measure(name: str, tickers: int, samples: int) -> dict:
+    timings = []
+    with get_engine().connect() as conn:
+        if name == "seq_scan":
+            conn.execute(text("SET enable_indexscan = off; SET enable_bitmapscan = off; SET enable_indexonlyscan = off"))
+        for _ in range(samples):
+            ticker = f"SEEDBENCH{random.randint(1, tickers)}"
+            started = time.perf_counter()
+            conn.execute(text(QUERIES[name]), {"t": ticker}).fetchone()
+            timings.append((time.perf_counter() - started) * 1000)
+        conn.rollback()
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "samples": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--scan-samples", type=int, default=10, help="Samples for the (slow) unindexed case")
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(args.rows, args.tickers)
+        print(json.dumps({"seeded_rows": args.rows, "seed_sec": round(time.perf_counter() - started, 1)}))
+    results = {
+        "rows": args.rows,
+        "tickers": args.tickers,
+        "seq_scan": measure("seq_scan", args.tickers, args.scan_samples),
+        "ticker_ts_index": measure("ticker_ts_index", args.tickers, args.samples),
+        "latest_prices": measure("latest_prices", args.tickers, args.samples),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Log calls/sec on the calling thread: the old synchronous StreamHandler +
+json.dumps path against the queue handler (with and without sampling),
+writing to /dev/null and to a sink that blocks for --sink-latency-us per
+write (stderr piped to a busy log agent):
+
+    python -m benchmarks.bench_logging --calls 100000 --sink-latency-us 50
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+import utils.logging as app_logging
+
+
+class _LegacyJsonFormatter(logging.Formatter):
+    # The formatter before the queue handler: dict messages str()-ed into "message".
+    def format(self, record):
+        payload = {"level": record.levelname, "message": record.getMessage(), "logger": record.name}
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload)
+
+
+class _SlowSink:
+    def __init__(self, latency_sec: float):
+        self.latency_sec = latency_sec
+
+    def write(self, data: str):
+        time.sleep(self.latency_sec)
+
+    def flush(self):
+        pass
+
+
+def _event(i: int) -> Dict[str, Any]:
+    return {"event": "trade_executed", "trade_id": i, "ticker": "BTC", "side": "buy", "quantity": 0.5,
+            "price": 61234.5, "executed_at": datetime.utcnow()}
+
+
+def _measure(logger: logging.Logger, calls: int) -> int:
+    started = time.perf_counter()
+    for i in range(calls):
+        logger.info(_event(i))
+    return round(calls / (time.perf_counter() - started))
+
+
+def _drain():
+    while not app_logging._queue.empty():
+        time.sleep(0.01)
+
+
+def run(calls: int, sink_latency_us: float) -> Dict[str, Any]:
+    legacy = logging.getLogger("bench.legacy")
+    legacy.propagate = False
+    legacy.setLevel(logging.INFO)
+    legacy_handler = logging.StreamHandler()
+    legacy_handler.setFormatter(_LegacyJsonFormatter())
+    legacy.addHandler(legacy_handler)
+
+    queued = app_logging.get_logger("bench.queued")
+    queued.propagate = False
+    # Size the queue for the whole run so nothing is dropped mid-measurement.
+    app_logging._queue.maxsize = 0
+
+    results: Dict[str, Any] = {"encoder": "orjson" if app_logging.orjson else "json", "calls": calls}
+    for sink_name, stream in (("devnull", open(os.devnull, "w")), ("slow_sink", _SlowSink(sink_latency_us / 1e6))):
+        legacy_handler.setStream(stream)
+        app_logging._stream_handler.setStream(stream)
+        app_logging.LOG_SAMPLE_RATES.pop("trade_executed", None)
+        sink = results[sink_name] = {}
+        sink["sync_calls_per_sec"] = _measure(legacy, calls)
+        sink["queued_calls_per_sec"] = _measure(queued, calls)
+        _drain()
+        app_logging.LOG_SAMPLE_RATES["trade_executed"] = 0.1
+        sink["queued_sampled_10pct_calls_per_sec"] = _measure(queued, calls)
+        _drain()
+    results["stats"] = app_logging.log_stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--sink-latency-us", type=float, default=50.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.calls, args.sink_latency_us), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Per-request cost of the metrics middleware: wraps a stub ASGI app (isolated
+middleware cost), drives a small FastAPI app directly over ASGI (no sockets)
+with and without MetricsMiddleware, and times raw Histogram.observe calls:
+
+    python -m benchmarks.bench_metrics --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+from fastapi import FastAPI
+
+from utils.metrics import Histogram, MetricsMiddleware, render_metrics
+
+
+def _build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/trades/{trade_id}")
+    async def get_trade(trade_id: int):
+        return {"id": trade_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def _drive(app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def call(i: int):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": f"/trades/{i}", "raw_path": f"/trades/{i}".encode(), "root_path": "", "query_string": b"",
+            "headers": [], "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000), "state": {},
+        }
+        await app(scope, receive, send)
+
+    for i in range(200):  # warm-up (builds the middleware stack)
+        await call(i)
+    started = time.perf_counter()
+    for i in range(requests):
+        await call(i)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+class _StubRoute:
+    path = "/trades/{trade_id}"
+
+
+async def _stub_app(scope, receive, send):
+    scope["route"] = _StubRoute
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _middleware_only(calls: int) -> float:
+    async def send(message):
+        pass
+
+    timings = {}
+    for name, app in (("stub", _stub_app), ("wrapped", MetricsMiddleware(_stub_app))):
+        started = time.perf_counter()
+        for _ in range(calls):
+            await app({"type": "http", "method": "GET"}, None, send)
+        timings[name] = (time.perf_counter() - started) / calls * 1e6
+    return timings["wrapped"] - timings["stub"]
+
+
+def _observe_us(calls: int) -> float:
+    histogram = Histogram("bench_seconds", "bench", ("method", "route", "status"))
+    started = time.perf_counter()
+    for _ in range(calls):
+        histogram.observe(0.0123, "GET", "/trades/{trade_id}", 200)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def run(requests: int) -> Dict[str, Any]:
+    # Interleave rounds so CPU frequency/GC drift hits both variants alike.
+    plain, instrumented = [], []
+    for _ in range(3):
+        plain.append(await _drive(_build_app(False), requests))
+        instrumented.append(await _drive(_build_app(True), requests))
+    plain_us, instrumented_us = min(plain), min(instrumented)
+    return {
+        "requests": requests,
+        "plain_us_per_request": round(plain_us, 2),
+        "instrumented_us_per_request": round(instrumented_us, 2),
+        "end_to_end_overhead_us": round(instrumented_us - plain_us, 2),
+        "middleware_only_overhead_us": round(min([await _middleware_only(requests * 10) for _ in range(3)]), 2),
+        "histogram_observe_us": round(_observe_us(requests * 10), 3),
+        "exposition_bytes": len(render_metrics()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compares plain single-attempt calls with the resilience layer (retries,
+breaker, hedging) against benchmarks.fake_upstream under injected faults.
+Starts the fake upstream itself and prints JSON results per scenario/policy:
+
+    python -m benchmarks.bench_resilience --requests 400 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.stats import percentiles
+from services.http_clients import close_http_clients
+from services.resilience import ResilientClient, resilience_config
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "flaky": {"error_rate": 0.1, "slow_rate": 0.05, "slow_ms": 2000, "throttle_rate": 0.0, "outage": False},
+    "throttled": {"error_rate": 0.0, "slow_rate": 0.0, "throttle_rate": 0.2, "retry_after_sec": 0.2, "outage": False},
+    "outage": {"error_rate": 0.0, "slow_rate": 0.0, "throttle_rate": 0.0, "outage": True},
+}
+
+
+def _policies() -> Dict[str, Dict[str, Any]]:
+    base = resilience_config("coinapi")
+    return {
+        "plain": {**base, "max_attempts": 1, "attempt_timeout": 15.0, "breaker_threshold": 10**9},
+        "retry_breaker": {**base},
+        "retry_breaker_hedge": {**base, "hedge_after": 0.25},
+    }
+
+
+async def _run_policy(url: str, config: Dict[str, Any], requests: int, concurrency: int) -> Dict[str, Any]:
+    client = ResilientClient("coinapi", config)
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await client.request("GET", f"{url}/v1/trades/latest", params={"symbol_id": "BTC"})
+                outcome = "ok"
+            except Exception as e:
+                outcome = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = client.snapshot()
+    return {
+        "success_rate": round(outcomes.get("ok", 0) / requests, 4),
+        "outcomes": outcomes,
+        "upstream_attempts": stats["attempts"],
+        "retries": stats["retries"],
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+        "short_circuited": stats["short_circuited"],
+        "elapsed_sec": round(elapsed, 2),
+        **percentiles(latencies),
+    }
+
+
+async def run(port: int, requests: int, concurrency: int) -> Dict[str, Any]:
+    url = f"http://127.0.0.1:{port}"
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=url) as control:
+        for scenario, faults in SCENARIOS.items():
+            await control.put("/_faults", json=faults)
+            results[scenario] = {}
+            for name, config in _policies().items():
+                results[scenario][name] = await _run_policy(url, config, requests, concurrency)
+    await close_http_clients()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    upstream = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_upstream", "--port", str(args.port)])
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{args.port}/_stats", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        print(json.dumps(asyncio.run(run(args.port, args.requests, args.concurrency)), indent=2))
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Fan-out cost of the stream hub. `hub` publishes price ticks in-process to
+thousands of subscribers (a share of them slow readers) and reports delivery
+latency and coalescing; `sse` runs the /stream router in a separate uvicorn
+process and holds that many real SSE connections open against it:
+
+    python -m benchmarks.bench_stream hub --subscribers 5000 --tickers 200
+    python -m benchmarks.bench_stream sse --subscribers 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from benchmarks.stats import percentiles
+from services.market_stream import StreamHub
+
+
+async def run_hub(subscribers: int, tickers: int, per_subscriber: int, rate: float, duration: float, slow_share: float) -> Dict[str, Any]:
+    hub = StreamHub(fanout="local", max_subscribers=subscribers)
+    names = [f"T{i:04d}" for i in range(tickers)]
+    latencies: List[float] = []
+    slow_latencies: List[float] = []
+    stop = asyncio.Event()
+
+    async def consume(slow: bool):
+        subscriber = hub.subscribe(random.sample(names, per_subscriber), {"price"})
+        sink = slow_latencies if slow else latencies
+        while not stop.is_set():
+            batch = await subscriber.get(0.5)
+            if batch:
+                # Oldest update in the batch; parsing every message would cost more than the fan-out being measured.
+                sink.append(time.perf_counter() - json.loads(batch[0][1])["sent"])
+            if slow:
+                await asyncio.sleep(0.2)  # reads five times a second, far below the tick rate
+
+    consumers = [asyncio.create_task(consume(i < subscribers * slow_share)) for i in range(subscribers)]
+    await asyncio.sleep(0.1)
+    publish_times: List[float] = []
+    rounds = int(rate * duration)
+    started = time.perf_counter()
+    for round_no in range(rounds):
+        t0 = time.perf_counter()
+        hub.publish("price", [{"ticker": name, "price": round(random.uniform(1, 100), 4), "sent": t0} for name in names])
+        publish_times.append(time.perf_counter() - t0)
+        await asyncio.sleep(max(0.0, started + (round_no + 1) / rate - time.perf_counter()))
+    await asyncio.sleep(0.5)
+    stop.set()
+    await asyncio.gather(*consumers)
+    stats = hub.stats()
+    return {
+        "scenario": "hub",
+        "subscribers": subscribers,
+        "tickers": tickers,
+        "tickers_per_subscriber": per_subscriber,
+        "ticks_per_sec": tickers * rate,
+        "publish_ms_per_round": percentiles([t * 1000 for t in publish_times]),
+        "publish_us_per_delivery": round(sum(publish_times) / rounds / (subscribers * per_subscriber) * 1e6, 3),
+        "fast_reader_latency": percentiles([t * 1000 for t in latencies]),
+        "slow_reader_latency": percentiles([t * 1000 for t in slow_latencies]),
+        "delivered": stats["delivered"],
+        "coalesced": stats["coalesced"],
+        "dropped": stats["dropped"],
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def serve(port: int):
+    """Minimal app with only the stream router plus a publish hook for the benchmark."""
+    import uvicorn
+    from fastapi import FastAPI
+
+    from routers.stream import router
+    from services.market_stream import hub
+
+    app = FastAPI()
+    app.include_router(router, prefix="/stream")
+
+    @app.post("/_publish")
+    async def publish(tickers: int = 100):
+        sent = time.time()
+        hub.publish("price", [{"ticker": f"T{i:04d}", "price": round(random.uniform(1, 100), 4), "sent": sent} for i in range(tickers)])
+        return {"published": tickers}
+
+    @app.get("/_stats")
+    async def stats():
+        return {**hub.stats(), "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+    uvicorn.run(app, port=port, log_level="warning")
+
+
+async def _sse_client(port: int, ticker: str, latencies: List[float], connected: asyncio.Event, counter: List[int], subscribers: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /stream/events?tickers={ticker}&types=price HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b": connected"):
+                counter[0] += 1
+                if counter[0] == subscribers:
+                    connected.set()
+            elif line.startswith(b"data: "):
+                latencies.append(time.time() - json.loads(line[6:])["sent"])
+    finally:
+        writer.close()
+
+
+async def run_sse(subscribers: int, tickers: int, rounds: int, port: int) -> Dict[str, Any]:
+    import httpx
+
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_stream", "serve", "--port", str(port)],
+                              env={**os.environ, "STREAM_FANOUT": "local"})
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(100):
+                try:
+                    await client.get("/_stats")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.2)
+            latencies: List[float] = []
+            connected, counter = asyncio.Event(), [0]
+            started = time.perf_counter()
+            clients = [
+                asyncio.create_task(_sse_client(port, f"T{i % tickers:04d}", latencies, connected, counter, subscribers))
+                for i in range(subscribers)
+            ]
+            await asyncio.wait_for(connected.wait(), timeout=120)
+            connect_sec = time.perf_counter() - started
+            for _ in range(rounds):
+                await client.post("/_publish", params={"tickers": tickers})
+                await asyncio.sleep(0.1)
+            await asyncio.sleep(1.0)
+            stats = (await client.get("/_stats")).json()
+            for task in clients:
+                task.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "scenario": "sse",
+        "subscribers": subscribers,
+        "connect_all_sec": round(connect_sec, 2),
+        "messages_received": len(latencies),
+        "messages_expected": subscribers * rounds,
+        "latency": percentiles([t * 1000 for t in latencies]),
+        "server_max_rss_mb": stats["max_rss_mb"],
+        "server_subscribers": stats["subscribers"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=["hub", "sse", "serve"])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--per-subscriber", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=10.0, help="publish rounds (one tick per ticker) per second")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--slow-share", type=float, default=0.1)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    if args.scenario == "serve":
+        return serve(args.port)
+    # One socket per subscriber on each side; the server process inherits the raised limit.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if args.scenario == "hub":
+        result = asyncio.run(run_hub(args.subscribers, args.tickers, args.per_subscriber, args.rate, args.duration, args.slow_share))
+    else:
+        result = asyncio.run(run_sse(args.subscribers, args.tickers, args.rounds, args.port))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
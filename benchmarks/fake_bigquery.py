@@ -0,0 +1,183 @@
+"""
+Fake BigQuery REST API (jobs.insert, jobs.get, jobs.getQueryResults) serving
+synthetic rows for the queries services/bigquery_client runs, so /admin/metrics
+and signal analytics can be exercised without a GCP project:
+
+    python -m benchmarks.fake_bigquery --port 9200 --job-ms 800 --rows 20000
+    BQ_API_ENDPOINT=http://localhost:9200 uvicorn main:app
+
+Latency and errors can be changed while running with PUT /_faults (same keys
+as FAULT_DEFAULTS), and GET /_stats reports jobs run and pages served.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FAULT_DEFAULTS: Dict[str, Any] = {
+    "job_ms": 500.0,          # time to run a query job (charged on jobs.insert)
+    "page_ms": 30.0,          # per results page
+    "jitter_ms": 50.0,        # uniform extra latency on both
+    "error_rate": 0.0,        # fraction of job inserts answered 503
+    "cache_hit_rate": 0.0,    # fraction of jobs reported as cache hits (no job_ms wait)
+    "rows": 5000.0,           # portfolio_metrics history length
+    "tickers": 500.0,         # rows per signals analytics query
+}
+MAX_JOBS = 10000
+
+app = FastAPI()
+faults: Dict[str, Any] = dict(FAULT_DEFAULTS)
+served: Counter = Counter()
+jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+METRICS_SCHEMA = [
+    {"name": "ts", "type": "TIMESTAMP"},
+    {"name": "equity", "type": "FLOAT"},
+    {"name": "cash_available", "type": "FLOAT"},
+    {"name": "market_value", "type": "FLOAT"},
+    {"name": "positions", "type": "INTEGER"},
+]
+ANALYTICS_SCHEMA = [
+    {"name": "ticker", "type": "STRING"},
+    {"name": "avg_score", "type": "FLOAT"},
+    {"name": "n", "type": "INTEGER"},
+]
+
+
+def _delay(ms: float) -> float:
+    return (ms + random.uniform(0, faults["jitter_ms"])) / 1000.0
+
+
+def _result_rows(sql: str) -> Tuple[List[Dict[str, str]], List[List[Any]]]:
+    """Schema and rows (BigQuery's f/v cell values) for the query's shape."""
+    if "portfolio_metrics" in sql:
+        count = min(int(faults["rows"]), 100) if "LIMIT 100" in sql else int(faults["rows"])
+        now_us = int(time.time() // 3600 * 3600 * 1e6)
+        rows = []
+        for i in range(count):
+            market_value = 10000 + 50 * ((i * 7919) % 97)
+            rows.append([str(now_us - i * 3600 * 10**6), 20000 + market_value, 20000.0, float(market_value), str(5 + i % 20)])
+        return METRICS_SCHEMA, rows
+    if "avg_score" in sql:
+        return ANALYTICS_SCHEMA, [[f"T{i:04d}", round(random.uniform(-1, 1), 4), str(random.randint(1, 365))] for i in range(int(faults["tickers"]))]
+    return [], []
+
+
+def _job_resource(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "kind": "bigquery#job",
+        "id": f"{job['project']}:{job['location']}.{job['id']}",
+        "jobReference": {"projectId": job["project"], "jobId": job["id"], "location": job["location"]},
+        "configuration": job["configuration"],
+        "status": {"state": "DONE"},
+        "statistics": {
+            "creationTime": str(job["created_ms"]),
+            "startTime": str(job["created_ms"]),
+            "endTime": str(job["created_ms"]),
+            "query": {
+                "cacheHit": job["cache_hit"],
+                "totalBytesProcessed": str(0 if job["cache_hit"] else job["bytes"]),
+                "totalBytesBilled": str(0 if job["cache_hit"] else max(job["bytes"], 10 * 2**20)),
+            },
+        },
+    }
+
+
+@app.post("/bigquery/v2/projects/{project}/jobs")
+async def insert_job(project: str, request: Request):
+    body = await request.json()
+    configuration = body.get("configuration", {})
+    sql = configuration.get("query", {}).get("query", "")
+    if random.random() < faults["error_rate"]:
+        served["503"] += 1
+        return JSONResponse({"error": {"code": 503, "message": "Backend error", "status": "UNAVAILABLE"}}, status_code=503)
+    cache_hit = random.random() < faults["cache_hit_rate"]
+    if not cache_hit:
+        await asyncio.sleep(_delay(faults["job_ms"]))
+    schema, rows = _result_rows(sql)
+    reference = body.get("jobReference", {})
+    job = {
+        "id": reference.get("jobId") or uuid.uuid4().hex,
+        "project": project,
+        "location": reference.get("location") or "US",
+        "configuration": configuration,
+        "schema": schema,
+        "rows": rows,
+        "cache_hit": cache_hit,
+        "bytes": 64 * len(rows),
+        "created_ms": int(time.time() * 1000),
+    }
+    jobs[job["id"]] = job
+    while len(jobs) > MAX_JOBS:
+        jobs.popitem(last=False)
+    served["jobs"] += 1
+    served["cache_hits"] += int(cache_hit)
+    return _job_resource(job)
+
+
+@app.get("/bigquery/v2/projects/{project}/jobs/{job_id}")
+async def get_job(project: str, job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": {"code": 404, "message": f"Not found: Job {project}:{job_id}", "status": "NOT_FOUND"}}, status_code=404)
+    return _job_resource(job)
+
+
+@app.get("/bigquery/v2/projects/{project}/queries/{job_id}")
+async def get_query_results(project: str, job_id: str, maxResults: Optional[int] = None,
+                            pageToken: Optional[str] = None, startIndex: Optional[int] = None):
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": {"code": 404, "message": f"Not found: Job {project}:{job_id}", "status": "NOT_FOUND"}}, status_code=404)
+    response = {
+        "kind": "bigquery#getQueryResultsResponse",
+        "jobReference": {"projectId": project, "jobId": job_id, "location": job["location"]},
+        "jobComplete": True,
+        "schema": {"fields": job["schema"]},
+        "totalRows": str(len(job["rows"])),
+        "cacheHit": job["cache_hit"],
+    }
+    if maxResults == 0:
+        return response
+    await asyncio.sleep(_delay(faults["page_ms"]))
+    offset = int(pageToken) if pageToken else int(startIndex or 0)
+    end = len(job["rows"]) if not maxResults else min(offset + maxResults, len(job["rows"]))
+    response["rows"] = [{"f": [{"v": v} for v in row]} for row in job["rows"][offset:end]]
+    if end < len(job["rows"]):
+        response["pageToken"] = str(end)
+    served["pages"] += 1
+    served["rows"] += end - offset
+    return response
+
+
+@app.put("/_faults")
+async def set_faults(update: Dict[str, Any]):
+    faults.update({k: v for k, v in update.items() if k in FAULT_DEFAULTS})
+    return faults
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {"faults": faults, "served": dict(served), "jobs_held": len(jobs)}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9200)
+    for key, default in FAULT_DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=default)
+    args = parser.parse_args()
+    faults.update({key: getattr(args, key) for key in FAULT_DEFAULTS})
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Fake CoinAPI / Santiment / Yahoo / ML service with fault injection, for
+exercising the upstream resilience layer locally:
+
+    python -m benchmarks.fake_upstream --port 9100 --error-rate 0.1 --slow-rate 0.05 --slow-ms 2000
+    COINAPI_BASE=http://localhost:9100/v1 SANTIMENT_BASE=http://localhost:9100 \\
+    YAHOO_BASE=http://localhost:9100 ML_SERVICE_BASE=http://localhost:9100 uvicorn main:app
+
+Faults can be changed while running with PUT /_faults (same keys as FAULT_DEFAULTS),
+and GET /_stats reports what was served.
+"""
+import argparse
+import asyncio
+import json
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAULT_DEFAULTS: Dict[str, Any] = {
+    "latency_ms": 20.0,       # base latency for every response
+    "jitter_ms": 10.0,        # uniform extra latency
+    "error_rate": 0.0,        # fraction answered 503
+    "throttle_rate": 0.0,     # fraction answered 429 with Retry-After
+    "retry_after_sec": 1.0,
+    "slow_rate": 0.0,         # fraction delayed by slow_ms (tail latency)
+    "slow_ms": 2000.0,
+    "outage": False,          # every request answered 503
+}
+
+app = FastAPI()
+faults: Dict[str, Any] = dict(FAULT_DEFAULTS)
+served: Counter = Counter()
+
+
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    if request.url.path.startswith("/_"):
+        return await call_next(request)
+    delay = faults["latency_ms"] + random.uniform(0, faults["jitter_ms"])
+    roll = random.random()
+    if roll < faults["slow_rate"]:
+        delay += faults["slow_ms"]
+        served["slow"] += 1
+    await asyncio.sleep(delay / 1000.0)
+    roll = random.random()
+    if faults["outage"] or roll < faults["error_rate"]:
+        served["503"] += 1
+        return JSONResponse({"error": "unavailable"}, status_code=503)
+    if roll < faults["error_rate"] + faults["throttle_rate"]:
+        served["429"] += 1
+        return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": str(faults["retry_after_sec"])})
+    served["200"] += 1
+    return await call_next(request)
+
+
+def _trade(symbol: str) -> Dict[str, Any]:
+    return {"symbol_id": symbol, "price": round(random.uniform(10, 100), 4), "time_exchange": datetime.utcnow().isoformat()}
+
+
+@app.get("/v1/trades/latest")
+async def coinapi_latest(symbol_id: str = None, filter_symbol_id: str = None):
+    symbols = filter_symbol_id.split(",") if filter_symbol_id else [symbol_id]
+    return [_trade(s) for s in symbols if s]
+
+
+@app.get("/labs/sanapi/social_volume")
+async def santiment_social_volume(slug: str):
+    return {"slug": slug, "social_volume": random.randint(0, 1000)}
+
+
+@app.get("/v7/finance/quote")
+async def yahoo_quote(symbols: str):
+    return {"quoteResponse": {"result": [{"symbol": s, "regularMarketPrice": round(random.uniform(10, 100), 4)} for s in symbols.split(",")]}}
+
+
+@app.get("/signals")
+async def ml_signals(lookback_days: int = 7, ticker: str = None, tickers: int = 500):
+    """One score per ticker per day (`tickers` of them when no ticker is given), streamed as a JSON array."""
+    names = [ticker] if ticker else [f"T{i:04d}" for i in range(tickers)]
+    today = date.today()
+
+    def body():
+        yield b"["
+        for day in range(lookback_days):
+            rows = [
+                {"ticker": name, "date": (today - timedelta(days=day)).isoformat(), "score": round(random.uniform(-1, 1), 4)}
+                for name in names
+            ]
+            chunk = json.dumps(rows)[1:-1].encode()
+            yield (b"," if day else b"") + chunk
+        yield b"]"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+@app.post("/admin/retrain")
+async def ml_retrain():
+    return {"status": "started"}
+
+
+@app.put("/_faults")
+async def set_faults(update: Dict[str, Any]):
+    faults.update({k: v for k, v in update.items() if k in FAULT_DEFAULTS})
+    return faults
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {"faults": faults, "served": dict(served)}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    for key, default in FAULT_DEFAULTS.items():
+        if not isinstance(default, bool):
+            parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=default)
+    parser.add_argument("--outage", action="store_true")
+    args = parser.parse_args()
+    faults.update({key: getattr(args, key) for key in FAULT_DEFAULTS})
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Concurrent-request load test for POST /trades against a running API. A
+background probe hits /health throughout, so event-loop stalls caused by
+blocking I/O in handlers show up as /health latency.
+
+    uvicorn main:app --port 8000 &
+    python -m benchmarks.load_trades --url http://localhost:8000 --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.stats import percentiles
+
+
+async def _worker(client: httpx.AsyncClient, queue: asyncio.Queue, latencies: List[float], errors: List[int]):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        payload = {"ticker": f"LOAD{random.randint(1, 50)}", "action": random.choice(["buy", "sell"]), "quantity": 0.01}
+        started = time.perf_counter()
+        resp = await client.post("/trades/", json=payload)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if resp.status_code != 200:
+            errors.append(resp.status_code)
+
+
+async def _probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float]):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def run(url: str, requests: int, concurrency: int) -> Dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    latencies: List[float] = []
+    health: List[float] = []
+    errors: List[int] = []
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, stop, health))
+        started = time.perf_counter()
+        await asyncio.gather(*(_worker(client, queue, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_sec": round(elapsed, 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "errors": len(errors),
+        "trades": percentiles(latencies),
+        "health_probe": percentiles(health),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.url, args.requests, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
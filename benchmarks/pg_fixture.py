@@ -0,0 +1,94 @@
+"""
+Throwaway Postgres database for benchmarks: created on the server DATABASE_URL
+points at (e.g. the compose Postgres), migrated with init_db(), seeded with a
+token universe and latest prices, and dropped afterwards. Runs as a script
+to leave one in place for manual runs:
+
+    python -m benchmarks.pg_fixture --tokens 500 --keep
+    DATABASE_URL=<printed url> uvicorn main:app
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+SEED_SQL = [
+    text(
+        """
+        INSERT INTO tokens (ticker, name, universe)
+        SELECT 'T' || lpad(g::text, 4, '0'), 'Token ' || g,
+               CASE WHEN g < :portfolio THEN 'portfolio' WHEN g < :watchlist THEN 'watchlist' ELSE 'market' END
+        FROM generate_series(0, :tokens - 1) g
+        ON CONFLICT (ticker) DO NOTHING
+        """
+    ),
+    text(
+        """
+        INSERT INTO latest_prices (ticker, price, ts)
+        SELECT 'T' || lpad(g::text, 4, '0'), 10 + (g % 90), NOW() FROM generate_series(0, :tokens - 1) g
+        ON CONFLICT (ticker) DO NOTHING
+        """
+    ),
+]
+
+
+def _init_schema(url: str):
+    # init_db() reads DATABASE_URL at import time, so it runs in a fresh interpreter.
+    subprocess.run(
+        [sys.executable, "-c", "from utils.db_helpers import init_db; init_db()"],
+        env={**os.environ, "DATABASE_URL": url}, check=True, stdout=subprocess.DEVNULL,
+    )
+
+
+def seed(url: str, tokens: int = 500):
+    """Token universe (5% portfolio, 15% watchlist, the rest market) with a latest price each."""
+    engine = create_engine(url)
+    try:
+        with engine.begin() as conn:
+            params = {"tokens": tokens, "portfolio": max(tokens // 20, 1), "watchlist": max(tokens // 5, 1)}
+            for statement in SEED_SQL:
+                conn.execute(statement, params)
+    finally:
+        engine.dispose()
+
+
+@contextmanager
+def bench_database(server_url: Optional[str] = None, tokens: int = 500, keep: bool = False) -> Iterator[str]:
+    """Yields the URL of a new, migrated and seeded database on `server_url`'s server; dropped on exit unless `keep`."""
+    server = make_url(server_url or os.environ["DATABASE_URL"])
+    name = f"comoda_bench_{uuid.uuid4().hex[:8]}"
+    # CREATE/DROP DATABASE can be issued from any database, so the configured one serves as the admin connection.
+    admin = create_engine(server, isolation_level="AUTOCOMMIT")
+    url = server.set(database=name).render_as_string(hide_password=False)
+    try:
+        with admin.connect() as conn:
+            conn.execute(text(f'CREATE DATABASE "{name}" TEMPLATE template0 ENCODING \'UTF8\''))
+        _init_schema(url)
+        seed(url, tokens)
+        yield url
+    finally:
+        if not keep:
+            with admin.connect() as conn:
+                conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        admin.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server-url", default=None, help="default: DATABASE_URL")
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--keep", action="store_true", help="leave the database in place and print its URL")
+    args = parser.parse_args()
+    with bench_database(args.server_url, args.tokens, keep=args.keep) as url:
+        print(json.dumps({"database_url": url, "kept": args.keep}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""Summary statistics shared by the benchmark scripts."""
+from typing import Dict, List
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max of latencies in milliseconds (nearest rank); {} when there are none."""
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(int(len(ordered) * p), len(ordered) - 1)], 2)
+
+    return {"p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": round(ordered[-1], 2)}
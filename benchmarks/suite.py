@@ -0,0 +1,342 @@
+"""
+End-to-end load scenarios against main.app with every external dependency
+replaced by a local stand-in: benchmarks.fake_upstream (CoinAPI, Santiment,
+Yahoo, ML service), benchmarks.fake_bigquery, and a throwaway database from
+benchmarks.pg_fixture on the DATABASE_URL server (optionally behind
+benchmarks.latency_proxy). Each scenario reports throughput and p50/p95/p99
+latency per endpoint, plus a /health probe that shows event-loop stalls.
+Results are written as JSON (default benchmarks/results/) tagged with the git
+commit, and two result files can be compared:
+
+    python -m benchmarks.suite run
+    python -m benchmarks.suite run --profile degraded --scenarios trade_burst --requests 2000 --concurrency 100
+    python -m benchmarks.suite run --db-latency-ms 2 --env RATE_LIMIT_COINAPI_PER_SEC=5
+    python -m benchmarks.suite compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+
+Scenarios:
+    ingest_fanout    POST /ingest/batch for the market universe across all three providers
+    trade_burst      concurrent single POST /trades orders against one portfolio
+    dashboard_storm  dashboard refreshes: /signals with analytics, /portfolio, /portfolio/history, /admin/metrics
+
+Profiles set the stand-ins' latency and faults (see PROFILES).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.engine import make_url
+
+from benchmarks.pg_fixture import bench_database
+from benchmarks.stats import percentiles
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+UPSTREAM_PORT, BIGQUERY_PORT, PROXY_PORT, APP_PORT = 9101, 9201, 6544, 8101
+
+PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "clean": {
+        "upstream": {"latency_ms": 20, "jitter_ms": 10, "error_rate": 0.0, "throttle_rate": 0.0, "slow_rate": 0.0, "outage": False},
+        "bigquery": {"job_ms": 500, "page_ms": 30, "error_rate": 0.0},
+    },
+    "degraded": {
+        "upstream": {"latency_ms": 50, "jitter_ms": 50, "error_rate": 0.05, "throttle_rate": 0.05, "retry_after_sec": 0.5,
+                     "slow_rate": 0.02, "slow_ms": 1500, "outage": False},
+        "bigquery": {"job_ms": 1500, "page_ms": 100, "error_rate": 0.02},
+    },
+}
+
+Request = Tuple[str, str, Dict[str, Any]]  # (label, method, httpx request kwargs)
+
+
+INGEST_SOURCES = ["coinapi", "yahoo", "santiment"]
+# Provider rate limits sized for the stand-ins; at the production defaults (0.5-2 calls/sec)
+# ingest_fanout would measure the limiter. --env RATE_LIMIT_<PROVIDER>_PER_SEC=... overrides them.
+BENCH_RATE_LIMITS = {
+    f"RATE_LIMIT_{provider}_{key}": value
+    for provider in ("COINAPI", "SANTIMENT", "YAHOO")
+    for key, value in (("PER_SEC", "1000"), ("BURST", "100"))
+}
+
+
+def _ingest_fanout(_: int) -> Request:
+    return "POST /ingest/batch", "POST", {"url": "/ingest/batch", "json": {"universe": "market", "sources": INGEST_SOURCES}}
+
+
+def _trade_burst(_: int) -> Request:
+    order = {"ticker": f"T{random.randrange(50):04d}", "action": random.choice(["buy", "buy", "sell"]), "quantity": 0.1}
+    return "POST /trades", "POST", {"url": "/trades/", "json": order}
+
+
+DASHBOARD = [
+    ("GET /signals", {"url": "/signals/", "params": {"lookback_days": 7, "include_analytics": "true"}}),
+    ("GET /portfolio", {"url": "/portfolio/"}),
+    ("GET /portfolio/history", {"url": "/portfolio/history", "params": {"days": 30}}),
+    ("GET /admin/metrics", {"url": "/admin/metrics"}),
+]
+
+
+def _dashboard_storm(i: int) -> Request:
+    label, kwargs = DASHBOARD[i % len(DASHBOARD)]
+    return label, "GET", kwargs
+
+
+SCENARIOS: Dict[str, Callable[[int], Request]] = {
+    "ingest_fanout": _ingest_fanout,
+    "trade_burst": _trade_burst,
+    "dashboard_storm": _dashboard_storm,
+}
+
+
+async def _probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float]):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+
+
+async def run_scenario(url: str, name: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    make_request = SCENARIOS[name]
+    latencies: Dict[str, List[float]] = {}
+    statuses: Dict[str, Dict[str, int]] = {}
+    batches: Dict[str, Dict[str, int]] = {}  # NDJSON summary lines: per-batch outcomes behind a 200
+    health: List[float] = []
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency + 1)
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            label, method, kwargs = make_request(i)
+            started = time.perf_counter()
+            try:
+                # Read the whole body: NDJSON responses are only complete when the stream ends.
+                resp = await client.request(method, **kwargs)
+                status = str(resp.status_code)
+                if resp.status_code == 200 and resp.headers.get("content-type", "").startswith("application/x-ndjson"):
+                    summary = json.loads(resp.text.rstrip().rsplit("\n", 1)[-1])
+                    for outcome, n in summary.get("batches", {}).items():
+                        counts = batches.setdefault(label, {})
+                        counts[outcome] = counts.get(outcome, 0) + n
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+            counts = statuses.setdefault(label, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, stop, health))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    every = [v for values in latencies.values() for v in values]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_sec": round(elapsed, 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "errors": sum(n for counts in statuses.values() for status, n in counts.items() if status != "200"),
+        "latency": percentiles(every),
+        "endpoints": {
+            label: {"requests": len(values), "statuses": statuses[label], "latency": percentiles(values),
+                    **({"batches": batches[label]} if label in batches else {})}
+            for label, values in sorted(latencies.items())
+        },
+        "health_probe": percentiles(health),
+    }
+
+
+def _spawn(args: List[str], env: Optional[Dict[str, str]] = None, log=subprocess.DEVNULL) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *args], env={**os.environ, **(env or {})}, stdout=log, stderr=subprocess.STDOUT)
+
+
+def _wait_ready(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], capture_output=True, text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    profile = PROFILES[args.profile]
+    results: Dict[str, Any] = {
+        "meta": {
+            **_git_revision(),
+            "started_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "profile": args.profile,
+            "db_latency_ms": args.db_latency_ms,
+            "tokens": args.tokens,
+            "env": args.env,
+        },
+        "scenarios": {},
+    }
+    with ExitStack() as stack:
+        upstream = _spawn(["benchmarks.fake_upstream", "--port", str(UPSTREAM_PORT)])
+        stack.callback(_stop, upstream)
+        bigquery = _spawn(["benchmarks.fake_bigquery", "--port", str(BIGQUERY_PORT)])
+        stack.callback(_stop, bigquery)
+        database_url = stack.enter_context(bench_database(args.server_url, args.tokens))
+        if args.db_latency_ms:
+            url = make_url(database_url)
+            proxy = _spawn(["benchmarks.latency_proxy", "--listen", str(PROXY_PORT), "--target", f"{url.host}:{url.port or 5432}",
+                            "--delay-ms", str(args.db_latency_ms)])
+            stack.callback(_stop, proxy)
+            database_url = url.set(host="127.0.0.1", port=PROXY_PORT).render_as_string(hide_password=False)
+
+        for port, faults in ((UPSTREAM_PORT, profile["upstream"]), (BIGQUERY_PORT, profile["bigquery"])):
+            _wait_ready(f"http://127.0.0.1:{port}/_stats")
+            httpx.put(f"http://127.0.0.1:{port}/_faults", json=faults).raise_for_status()
+
+        app_env = {
+            "DATABASE_URL": database_url,
+            "COINAPI_BASE": f"http://127.0.0.1:{UPSTREAM_PORT}/v1",
+            "SANTIMENT_BASE": f"http://127.0.0.1:{UPSTREAM_PORT}",
+            "YAHOO_BASE": f"http://127.0.0.1:{UPSTREAM_PORT}",
+            "ML_SERVICE_BASE": f"http://127.0.0.1:{UPSTREAM_PORT}",
+            "BQ_API_ENDPOINT": f"http://127.0.0.1:{BIGQUERY_PORT}",
+            "GCP_PROJECT_ID": "comoda-bench",
+            "COINAPI_KEY": "bench",
+            "SANTIMENT_API_KEY": "bench",
+            "INGEST_SCHEDULER_ENABLED": "0",
+            "STREAM_FANOUT": "local",
+            **BENCH_RATE_LIMITS,
+            **dict(item.split("=", 1) for item in args.env),
+        }
+        log = stack.enter_context(open(args.app_log, "w")) if args.app_log else subprocess.DEVNULL
+        app = _spawn(["uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(APP_PORT), "--log-level", "warning"], app_env, log)
+        stack.callback(_stop, app)
+        app_url = f"http://127.0.0.1:{APP_PORT}"
+        _wait_ready(f"{app_url}/health")
+
+        for name in args.scenarios:
+            requests = args.requests or {"ingest_fanout": 20, "trade_burst": 1000, "dashboard_storm": 400}[name]
+            concurrency = args.concurrency or {"ingest_fanout": 5, "trade_burst": 50, "dashboard_storm": 50}[name]
+            print(f"{name}: {requests} requests, concurrency {concurrency}", file=sys.stderr)
+            results["scenarios"][name] = asyncio.run(run_scenario(app_url, name, requests, concurrency))
+        results["upstream"] = {
+            "fake_upstream": httpx.get(f"http://127.0.0.1:{UPSTREAM_PORT}/_stats").json()["served"],
+            "fake_bigquery": httpx.get(f"http://127.0.0.1:{BIGQUERY_PORT}/_stats").json()["served"],
+        }
+    return results
+
+
+def _metrics(scenario: Dict[str, Any]) -> Dict[str, Tuple[float, bool]]:
+    """Comparable numbers per scenario as {name: (value, higher_is_better)}."""
+    values = {"throughput_rps": (scenario["throughput_rps"], True)}
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        values[f"latency.{key}"] = (scenario["latency"].get(key), False)
+        values[f"health_probe.{key}"] = (scenario["health_probe"].get(key), False)
+        for label, endpoint in scenario["endpoints"].items():
+            values[f"{label}.{key}"] = (endpoint["latency"].get(key), False)
+    values["errors"] = (scenario["errors"], False)
+    return values
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float, min_delta_ms: float) -> Dict[str, Any]:
+    """
+    Relative change per metric; a change worse than `threshold` is a regression,
+    unless it is a latency that moved by less than `min_delta_ms` (noise on fast endpoints).
+    """
+    report: Dict[str, Any] = {"base": base["meta"].get("commit"), "head": head["meta"].get("commit"), "threshold": threshold,
+                              "warnings": [], "scenarios": {}, "regressions": []}
+    for key in ("profile", "db_latency_ms", "tokens", "env", "cpus"):
+        if base["meta"].get(key) != head["meta"].get(key):
+            report["warnings"].append(f"runs differ in {key}: {base['meta'].get(key)} vs {head['meta'].get(key)}")
+    for name in sorted(set(base["scenarios"]) & set(head["scenarios"])):
+        before, after = _metrics(base["scenarios"][name]), _metrics(head["scenarios"][name])
+        rows = {}
+        for metric, (old, higher_is_better) in before.items():
+            new = after.get(metric, (None, higher_is_better))[0]
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+            rows[metric] = {"base": old, "head": new, "change_pct": round(change * 100, 1)}
+            if metric.endswith("_ms") and abs(new - old) < min_delta_ms:
+                continue
+            if (-change if higher_is_better else change) > threshold and not (metric == "errors" and new == 0):
+                report["regressions"].append(f"{name} {metric}: {old} -> {new}")
+        report["scenarios"][name] = rows
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run scenarios and write a results file")
+    run_parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    run_parser.add_argument("--profile", choices=list(PROFILES), default="clean")
+    run_parser.add_argument("--requests", type=int, default=None, help="per scenario; default depends on the scenario")
+    run_parser.add_argument("--concurrency", type=int, default=None)
+    run_parser.add_argument("--tokens", type=int, default=500, help="size of the seeded token universe")
+    run_parser.add_argument("--server-url", default=None, help="Postgres server for the throwaway database; default: DATABASE_URL")
+    run_parser.add_argument("--db-latency-ms", type=float, default=0.0, help="put benchmarks.latency_proxy in front of Postgres")
+    run_parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app environment, repeatable")
+    run_parser.add_argument("--out", default=RESULTS_DIR, help="directory for the results file")
+    run_parser.add_argument("--app-log", default=None, help="write the app's output here")
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="relative change counted as a regression")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=5.0, help="latency changes smaller than this are never regressions")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.head) as f:
+            head = json.load(f)
+        report = compare(base, head, args.threshold, args.min_delta_ms)
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if report["regressions"] else 0)
+
+    # Unwind on SIGTERM too, so the stand-ins are stopped and the throwaway database dropped.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(143))
+    results = run(args)
+    os.makedirs(args.out, exist_ok=True)
+    commit = (results["meta"]["commit"] or "nogit")[:10] + ("-dirty" if results["meta"]["dirty"] else "")
+    path = os.path.join(args.out, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{commit}-{args.profile}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"results written to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from routers.ingest import router as ingest_router
 from routers.signals import router as signals_router
 from routers.trades import router as trades_router
+from routers.portfolio import router as portfolio_router
+from routers.stream import router as stream_router
 from routers.admin import router as admin_router
 
-from utils.logging import get_logger
-from utils.db_helpers import init_db
+from utils.logging import get_logger, bind_request_context
+from utils.metrics import MetricsMiddleware, render_metrics
+from utils.db_helpers import init_db, init_async_db, close_async_db, error_log_writer
+from services.http_clients import init_http_clients, close_http_clients
+from services.ingest_scheduler import scheduler, SCHEDULER_ENABLED
+from services.price_writer import price_writer
+from services.market_cache import trade_rules_cache, TRADE_RULES_CHANNEL
+from services.signals_service import invalidate_signals, signal_stream_refresher, SIGNALS_CHANNEL
+from services.market_stream import hub, STREAM_CHANNEL, STREAM_FANOUT
+from utils.pg_listener import pg_listener
 
 app = FastAPI(title="Comoda Backend API", version="0.1.0")
 
@@ -19,20 +30,61 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so recorded latency covers every other middleware.
+app.add_middleware(MetricsMiddleware)
 
 logger = get_logger(__name__)
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Every log line written while serving this request carries its request ID / Cloud Trace ID.
+    request_id = bind_request_context(request.headers.get("X-Request-ID"), request.headers.get("X-Cloud-Trace-Context"))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 @app.on_event("startup")
 async def startup_event():
     logger.info({"event": "startup", "message": "Initializing database and services"})
     init_db()
+    init_async_db()
+    await init_http_clients()
+    await price_writer.start()
+    pg_listener.subscribe(TRADE_RULES_CHANNEL, trade_rules_cache.invalidate, on_connect=trade_rules_cache.invalidate)
+    pg_listener.subscribe(SIGNALS_CHANNEL, invalidate_signals)
+    if STREAM_FANOUT == "postgres":
+        pg_listener.subscribe(STREAM_CHANNEL, hub.on_notify)
+    await pg_listener.start()
+    await hub.start()
+    await signal_stream_refresher.start()
+    if SCHEDULER_ENABLED:
+        await scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info({"event": "shutdown", "message": "Stopping scheduler, flushing buffers and closing outbound HTTP clients"})
+    await scheduler.stop()
+    await price_writer.stop()
+    await signal_stream_refresher.stop()
+    await hub.stop()
+    await pg_listener.stop()
+    await error_log_writer.stop()
+    await close_async_db()
+    await close_http_clients()
 
 @app.get("/health", tags=["health"])  # Simple health check
 async def health():
     return {"status": "ok"}
 
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus text exposition: request/upstream/DB/BigQuery/rate-limit latency histograms and pool gauges."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Include routers
 app.include_router(ingest_router, prefix="/ingest", tags=["ingest"])
 app.include_router(signals_router, prefix="/signals", tags=["signals"])
 app.include_router(trades_router, prefix="/trades", tags=["trades"])
+app.include_router(portfolio_router, prefix="/portfolio", tags=["portfolio"])
+app.include_router(stream_router, prefix="/stream", tags=["stream"])
 app.include_router(admin_router, prefix="/admin", tags=["admin"])
\ No newline at end of file
@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+class BacktestSignal(BaseModel):
+    ticker: str = Field(..., min_length=1, max_length=32)
+    date: str = Field(..., pattern=r"^\d{4}-\d{2}-\d{2}")
+    score: float = Field(..., ge=-1.0, le=1.0)
+
+class BacktestRequest(BaseModel):
+    start: datetime
+    end: Optional[datetime] = None  # default: now
+    bar: str = Field("1 hour", pattern=r"^\d+ (minute|hour|day)s?$")
+    # Default: every ticker with a score in the window.
+    tickers: Optional[List[str]] = Field(None, min_length=1, max_length=2000)
+    # Default: the ML service's scores (its lookback reaches back at most 365 days).
+    signals: Optional[List[BacktestSignal]] = Field(None, max_length=1000000)
+    initial_cash: float = Field(20000, gt=0)
+    entry_score: float = Field(0.5, ge=-1.0, le=1.0)
+    exit_score: float = Field(0.0, ge=-1.0, le=1.0)
+    # Overrides of the live trade_rules.
+    max_allocation_pct: Optional[float] = Field(None, gt=0, le=100)
+    slippage_pct: Optional[float] = Field(None, ge=0, le=100)
+    fees_pct: Optional[float] = Field(None, ge=0, le=100)
+    points: int = Field(500, ge=2, le=10000)
+
+    @model_validator(mode="after")
+    def _window(self):
+        if self.end is not None and self.end <= self.start:
+            raise ValueError("end must be after start")
+        return self
\ No newline at end of file
@@ -0,0 +1,15 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+class BatchIngestRequest(BaseModel):
+    tickers: Optional[List[str]] = Field(None, min_length=1, max_length=2000)
+    universe: Optional[str] = Field(None, pattern=r"^(portfolio|watchlist|market)$")
+    sources: List[str] = Field(default_factory=lambda: ["coinapi"])
+    # Rate-limit class for the provider calls; defaults to the universe, else interactive.
+    priority: Optional[str] = Field(None, pattern=r"^(interactive|portfolio|watchlist|market|backfill)$")
+
+    @model_validator(mode="after")
+    def _tickers_or_universe(self):
+        if not self.tickers and not self.universe:
+            raise ValueError("Either tickers or universe is required")
+        return self
\ No newline at end of file
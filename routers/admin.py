@@ -1,9 +1,24 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 
-from services.signals_service import SignalsService
-from services.bigquery_client import BigQueryClient
-from utils.logging import get_logger
-from utils.db_helpers import log_error
+from services.signals_service import SignalsService, signal_cache
+from services.bigquery_client import (
+    BQ_PAGE_SIZE, bigquery_stats, portfolio_metrics_page, query_portfolio_metrics, stream_portfolio_metrics,
+)
+from services.http_clients import http_pool_stats
+from services.market_cache import cache_stats
+from services.price_writer import price_writer
+from services.resilience import resilience_stats
+from services.ingest_service import SOURCE_LIMITERS
+from services.market_stream import hub
+from services.market_cache import trade_rules_cache
+from services import backtest
+from services.trade_rules import TradeRules
+from models.backtest import BacktestRequest
+from utils.logging import get_logger, log_stats
+from utils.db_helpers import db_pool_stats, error_log_writer, log_error
+from utils.streaming import InvalidCursor, decode_cursor, encode_cursor, ndjson_response
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -20,11 +35,113 @@ async def retrain_models():
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/metrics")
-async def get_metrics():
-    """Fetch derived metrics from BigQuery for dashboards."""
+async def get_metrics(
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Page through the full history, newest first"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams the full history page by page"),
+):
+    """
+    Fetch derived metrics from BigQuery for dashboards: the latest 100 rows
+    (cached, see BQ_CACHE_TTL_SEC), the full history by cursor, or all of it as NDJSON.
+    """
+    state = None
+    if cursor is not None:
+        try:
+            state = decode_cursor(cursor)
+            limit = limit or int(state.pop("limit"))
+        except (InvalidCursor, KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     try:
-        return {"metrics": BigQueryClient().query_portfolio_metrics()}
+        if format == "ndjson":
+            if limit or cursor:
+                raise HTTPException(status_code=400, detail="ndjson streams the full history; it can't be combined with pagination")
+            return ndjson_response(await stream_portfolio_metrics(BQ_PAGE_SIZE), "admin_metrics_stream")
+        if limit is None:
+            return {"metrics": await query_portfolio_metrics(), "bigquery": bigquery_stats()}
+        rows, next_state = await portfolio_metrics_page(limit, state)
+        next_cursor = encode_cursor({**next_state, "limit": limit}) if next_state else None
+        return {"metrics": rows, "next_cursor": next_cursor, "bigquery": bigquery_stats()}
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Metrics query failed")
         await log_error("admin_metrics", str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/http-pools")
+async def get_http_pools(provider: Optional[str] = Query(None, description="coinapi|santiment|yahoo|ml")):
+    """Connection-pool occupancy for outbound provider HTTP clients."""
+    return {"pools": http_pool_stats(provider)}
+
+@router.get("/db-pools")
+async def get_db_pools():
+    """Checked-out/idle/overflow connections for the sync and async DB engines."""
+    return db_pool_stats()
+
+@router.get("/price-writer")
+async def get_price_writer_stats():
+    """Buffered/written row counts and flush timings for the market_prices writer."""
+    return price_writer.stats()
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Hit/miss/staleness counters for the trade-rules, latest-price and ML signal caches."""
+    return {**cache_stats(), "signals": signal_cache.snapshot()}
+
+@router.get("/error-log")
+async def get_error_log_stats():
+    """Buffered, aggregated and dropped counts for the batched error_logs writer."""
+    return error_log_writer.snapshot()
+
+@router.get("/bigquery")
+async def get_bigquery_stats():
+    """Result-cache hit ratio and job/bytes-billed totals for BigQuery queries."""
+    return bigquery_stats()
+
+@router.get("/upstreams")
+async def get_upstreams(provider: Optional[str] = Query(None, description="coinapi|santiment|yahoo|ml")):
+    """Retry, hedging and circuit-breaker state per outbound provider."""
+    return {"upstreams": resilience_stats(provider)}
+
+@router.get("/rate-limits")
+async def get_rate_limits():
+    """Token-bucket state per provider (local or shared Postgres backend, with lease/fallback counters)."""
+    return {"rate_limits": {source: limiter.stats()[source] for source, limiter in SOURCE_LIMITERS.items()}}
+
+@router.get("/logging")
+async def get_logging_stats():
+    """Async log handler queue depth, dropped records and per-event sampling counts."""
+    return log_stats()
+
+@router.get("/stream")
+async def get_stream_stats():
+    """Stream subscribers, pending/coalesced/dropped updates and NOTIFY fan-out counters for this instance."""
+    return hub.stats()
+
+@router.post("/backtest")
+async def run_backtest(req: BacktestRequest):
+    """
+    Replay signal scores over historical market_prices with the trading rules
+    (live trade_rules unless overridden): summary statistics and a downsampled
+    equity/drawdown curve.
+    """
+    overrides = {k: v for k, v in req.model_dump(include={"max_allocation_pct", "slippage_pct", "fees_pct"}).items() if v is not None}
+    try:
+        rules = TradeRules.from_map({**await trade_rules_cache.get(), **overrides})
+        if req.signals is not None:
+            signals = [s.model_dump() for s in req.signals]
+        else:
+            signals = await backtest.fetch_signal_history(req.start)
+        return await backtest.run_async(
+            start=req.start, end=req.end or datetime.utcnow(), bar=req.bar, signals=signals, rules=rules,
+            tickers=req.tickers, initial_cash=req.initial_cash, entry_score=req.entry_score,
+            exit_score=req.exit_score, points=req.points,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Backtest failed")
+        await log_error("admin_backtest", str(e))
         raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
@@ -1,11 +1,14 @@
+import json
 from datetime import datetime
 from typing import Optional, List
 
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from services.coinapi_client import CoinAPIClient
-from services.santiment_client import SantimentClient
-from services.yahoo_client import YahooClient
+from models.ingestion import BatchIngestRequest
+
+from services.ingest_registry import IngestRegistry
+from services.ingest_service import IngestService
 from utils.logging import get_logger
 from utils.db_helpers import log_error
 
@@ -21,18 +24,14 @@ async def list_ingestions(
     sources: Optional[List[str]] = Query(None, description="Data sources: coinapi|santiment|yahoo"),
 ):
     """
-    List latest live data ingestions for tokens. Historical backfill is handled elsewhere.
-    Supports filtering by ticker, date range, universe, and sources.
+    List registered live ingestions for tokens. Historical backfill is handled elsewhere.
+    Supports filtering by ticker, last-ingested date range, universe, and sources.
     """
     try:
-        # Placeholder: fetch from Cloud SQL tables (ingestion logs or latest records)
-        return {
-            "ticker": ticker,
-            "start_date": start_date,
-            "end_date": end_date,
-            "universe": universe,
-            "sources": sources,
-        }
+        ingestions = await IngestRegistry().list(
+            ticker=ticker, universe=universe, sources=sources, start_date=start_date, end_date=end_date
+        )
+        return {"ingestions": ingestions, "count": len(ingestions)}
     except Exception as e:
         logger.exception("Failed to list ingestions")
         await log_error("ingest_list", str(e))
@@ -43,32 +42,67 @@ async def create_ingestion(
     ticker: str = Query(..., description="Token ticker/symbol"),
     universe: Optional[str] = Query("market", description="Token universe: portfolio|watchlist|market"),
     sources: Optional[List[str]] = Query(default=None, description="Data sources to pull"),
+    source_timeout: Optional[float] = Query(None, gt=0, le=60, description="Per-source deadline in seconds"),
+    request_timeout: Optional[float] = Query(None, gt=0, le=120, description="Overall request deadline in seconds"),
 ):
-    """Trigger live data ingestion from selected sources. No historical backfill here."""
+    """
+    Trigger live data ingestion from selected sources. No historical backfill here.
+    Sources are queried concurrently; each result carries its own status
+    (ok|timeout|error|rate_limited|circuit_open) and latency so one failing provider doesn't fail the request.
+    """
     try:
-        results = {}
         selected = sources or ["coinapi"]
-        if "coinapi" in selected:
-            results["coinapi"] = await CoinAPIClient().fetch_live_price(ticker)
-        if "santiment" in selected:
-            results["santiment"] = await SantimentClient().fetch_social_volume(ticker)
-        if "yahoo" in selected:
-            results["yahoo"] = await YahooClient().fetch_quote(ticker)
-        return {"ticker": ticker, "universe": universe, "results": results}
+        results = await IngestService().fetch_sources(
+            ticker, selected, source_timeout=source_timeout, request_timeout=request_timeout, priority="interactive"
+        )
+        ok = sum(1 for r in results.values() if r["status"] == "ok")
+        status = "ok" if ok == len(results) else ("partial" if ok else "failed")
+        return {"ticker": ticker, "universe": universe, "status": status, "results": results}
     except Exception as e:
         logger.exception("Failed to create ingestion")
         await log_error("ingest_create", str(e))
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/batch")
+async def create_batch_ingestion(
+    payload: BatchIngestRequest,
+    source_timeout: Optional[float] = Query(None, gt=0, le=60, description="Per-batch deadline in seconds"),
+):
+    """
+    Ingest a list of tickers or a whole universe. Tickers are grouped into
+    multi-symbol provider calls where supported; results stream back as NDJSON,
+    one line per completed batch followed by a summary line.
+    """
+    service = IngestService()
+    try:
+        tickers = list(payload.tickers or [])
+        if payload.universe and not tickers:
+            tickers = await service.resolve_universe(payload.universe)
+    except Exception as e:
+        logger.exception("Failed to resolve ingestion universe")
+        await log_error("ingest_batch", str(e), {"universe": payload.universe})
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    async def body():
+        priority = payload.priority or payload.universe or "interactive"
+        async for batch in service.stream_batch(tickers, payload.sources, source_timeout=source_timeout, priority=priority):
+            yield json.dumps(batch, default=str) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
 @router.put("/")
 async def update_ingestion(
     ticker: str,
-    universe: Optional[str] = None,
+    universe: Optional[str] = Query(None, pattern=r"^(portfolio|watchlist|market)$"),
+    sources: Optional[List[str]] = Query(None, description="Data sources: coinapi|santiment|yahoo"),
+    refresh_interval_sec: Optional[int] = Query(None, ge=5, le=86400, description="Overrides the universe cadence"),
+    enabled: Optional[bool] = Query(None),
 ):
-    """Update ingestion configuration for a token (e.g., change universe)."""
+    """Register or update scheduled ingestion for a token (universe, sources, cadence)."""
     try:
-        # Placeholder: update Cloud SQL row
-        return {"ticker": ticker, "universe": universe}
+        return await IngestRegistry().upsert(
+            ticker, universe=universe, sources=sources, refresh_interval_sec=refresh_interval_sec, enabled=enabled
+        )
     except Exception as e:
         logger.exception("Failed to update ingestion")
         await log_error("ingest_update", str(e))
@@ -80,8 +114,11 @@ async def delete_ingestion(
 ):
     """Remove token from ingestion universe (doesn't delete historical data)."""
     try:
-        # Placeholder: delete from Cloud SQL
+        if not await IngestRegistry().delete(ticker):
+            raise HTTPException(status_code=404, detail="Ingestion not found")
         return {"deleted": ticker}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to delete ingestion")
         await log_error("ingest_delete", str(e))
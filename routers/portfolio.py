@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.portfolio_service import PortfolioService
+from utils.logging import get_logger
+from utils.db_helpers import get_async_db, log_error
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+@router.get("/")
+async def get_portfolio(db: AsyncSession = Depends(get_async_db)):
+    """Mark-to-market valuation: cash, positions, average cost, realized/unrealized PnL and allocation %."""
+    try:
+        return await PortfolioService(db).get_valuation()
+    except Exception as e:
+        logger.exception("Portfolio valuation failed")
+        await log_error("portfolio_get", str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/history")
+async def get_portfolio_history(days: int = Query(30, ge=1, le=3650), db: AsyncSession = Depends(get_async_db)):
+    """Daily cash, market value and equity, marked at each day's last known price."""
+    try:
+        return {"days": days, "history": await PortfolioService(db).get_history(days)}
+    except Exception as e:
+        logger.exception("Portfolio history failed")
+        await log_error("portfolio_history", str(e), {"days": days})
+        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
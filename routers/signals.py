@@ -2,26 +2,62 @@ from typing import Optional
 from fastapi import APIRouter, HTTPException, Query
 
 from services.signals_service import SignalsService
-from services.bigquery_client import BigQueryClient
+from services.bigquery_client import query_signals_analytics
 from utils.logging import get_logger
 from utils.db_helpers import log_error
+from utils.streaming import InvalidCursor, decode_cursor, encode_cursor, ndjson_response
 
 router = APIRouter()
 logger = get_logger(__name__)
 
+MAX_PAGE_SIZE = 5000
+
+def _resume(cursor: str, query: list) -> tuple:
+    """(offset, limit) from a next_cursor, which must come from the same query."""
+    try:
+        state = decode_cursor(cursor)
+        if state.get("query") != query:
+            raise InvalidCursor("cursor does not belong to this query")
+        return max(int(state["offset"]), 0), int(state["limit"])
+    except (InvalidCursor, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/")
 async def get_signals(
     ticker: Optional[str] = Query(None),
     lookback_days: int = Query(7, ge=1, le=365),
     include_analytics: bool = Query(False, description="Also query BigQuery analytics"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; responses then carry next_cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams signals as the ML service sends them"),
 ):
     """Fetch signal scores from ML service; optionally join with BigQuery analytics."""
+    offset = 0
+    if cursor is not None:
+        offset, cursor_limit = _resume(cursor, [ticker, lookback_days])
+        limit = limit or cursor_limit
     try:
+        if format == "ndjson":
+            if include_analytics or limit or cursor:
+                raise HTTPException(status_code=400, detail="ndjson streams all signals; it can't be combined with analytics or pagination")
+            items = await SignalsService().stream_signals(ticker=ticker, lookback_days=lookback_days)
+            return ndjson_response(items, "signals_stream", encoded=True)
+
         signals = await SignalsService().fetch_signals(ticker=ticker, lookback_days=lookback_days)
         analytics = None
-        if include_analytics:
-            analytics = BigQueryClient().query_signals_analytics(ticker=ticker, lookback_days=lookback_days)
-        return {"signals": signals, "analytics": analytics}
+        if include_analytics and offset == 0:
+            analytics = await query_signals_analytics(ticker=ticker, lookback_days=lookback_days)
+        if limit is None or not isinstance(signals, list):
+            return {"signals": signals, "analytics": analytics}
+        # Pages are slices of the cached ML response; a retrain between pages may shift them.
+        page = signals[offset:offset + limit]
+        next_offset = offset + len(page)
+        next_cursor = None
+        if next_offset < len(signals):
+            next_cursor = encode_cursor({"query": [ticker, lookback_days], "offset": next_offset, "limit": limit})
+        return {"signals": page, "analytics": analytics, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to fetch signals")
         await log_error("signals_get", str(e))
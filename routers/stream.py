@@ -0,0 +1,139 @@
+import asyncio
+import json
+import re
+from typing import List, Optional, Set, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from services.ingest_service import IngestService
+from services.market_stream import ALL, STREAM_HEARTBEAT_SEC, StreamFull, Subscriber, hub
+from utils.logging import get_logger
+from utils.db_helpers import log_error
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+TYPES = ("price", "signal")
+UNIVERSE_PATTERN = r"^(portfolio|watchlist|market)$"
+
+async def _resolve(tickers: Optional[List[str]], universe: Optional[str]) -> Set[str]:
+    """Tickers to subscribe to; a universe is resolved to its current members."""
+    resolved = set(tickers or [])
+    if universe:
+        resolved.update(await IngestService().resolve_universe(universe))
+    return resolved
+
+def _types(types: Optional[List[str]]) -> Set[str]:
+    selected = set(types or TYPES)
+    if not selected <= set(TYPES):
+        raise HTTPException(status_code=400, detail=f"types must be among {', '.join(TYPES)}")
+    return selected
+
+@router.get("/events")
+async def stream_events(
+    tickers: Optional[List[str]] = Query(None, description=f"Tickers to follow; {ALL} for all"),
+    universe: Optional[str] = Query(None, pattern=UNIVERSE_PATTERN, description="Follow a universe's current members"),
+    types: Optional[List[str]] = Query(None, description="price|signal (default both)"),
+):
+    """
+    Server-Sent Events: one `data:` line per price tick or signal score, starting
+    with the latest known value of each. A slow client only gets the newest
+    value per ticker; comment lines keep idle connections open.
+    """
+    if not tickers and not universe:
+        raise HTTPException(status_code=400, detail="tickers or universe is required")
+    selected = _types(types)
+    try:
+        subscriber = hub.subscribe(await _resolve(tickers, universe), selected)
+    except StreamFull:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+    except Exception as e:
+        logger.exception("Failed to open event stream")
+        await log_error("stream_events", str(e), {"universe": universe})
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                batch = await subscriber.get(STREAM_HEARTBEAT_SEC)
+                yield "".join(f"data: {message}\n\n" for _, message in batch) if batch else ": ping\n\n"
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _control_message(raw: str) -> Tuple[str, Optional[List[str]], Optional[str]]:
+    """(action, tickers, universe) from a WebSocket control frame; ValueError with the detail to report otherwise."""
+    try:
+        request = json.loads(raw)
+        action, tickers, universe = request["action"], request.get("tickers"), request.get("universe")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("expected {\"action\", \"tickers\"|\"universe\"}") from None
+    if tickers is not None and not (isinstance(tickers, list) and all(isinstance(t, str) for t in tickers)):
+        raise ValueError("tickers must be a list of strings")
+    if universe is not None and not (isinstance(universe, str) and re.match(UNIVERSE_PATTERN, universe)):
+        raise ValueError("universe must be one of portfolio, watchlist, market")
+    return action, tickers, universe
+
+async def _send_updates(websocket: WebSocket, subscriber: Subscriber):
+    try:
+        while True:
+            for _, message in await subscriber.get(STREAM_HEARTBEAT_SEC):
+                await websocket.send_text(message)
+    except Exception:
+        pass  # connection closed; the receive loop sees the disconnect and cleans up
+
+@router.websocket("/ws")
+async def stream_ws(
+    websocket: WebSocket,
+    tickers: Optional[List[str]] = Query(None),
+    universe: Optional[str] = Query(None, pattern=UNIVERSE_PATTERN),
+    types: Optional[List[str]] = Query(None),
+):
+    """
+    WebSocket: the same updates as /stream/events, one JSON text frame each.
+    Clients may change their subscription by sending
+    {"action": "subscribe"|"unsubscribe", "tickers": [...], "universe": "..."}.
+    """
+    await websocket.accept()
+    try:
+        subscriber = hub.subscribe(await _resolve(tickers, universe), _types(types))
+    except StreamFull:
+        await websocket.close(code=1013, reason="Too many stream subscribers")
+        return
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    except Exception as e:
+        logger.exception("Failed to open WebSocket stream")
+        await log_error("stream_ws", str(e), {"universe": universe})
+        await websocket.close(code=1011)
+        return
+
+    sender = asyncio.create_task(_send_updates(websocket, subscriber))
+    try:
+        while True:
+            try:
+                action, tickers_requested, universe_requested = _control_message(await websocket.receive_text())
+            except ValueError as e:
+                await websocket.send_text(json.dumps({"type": "error", "detail": str(e)}))
+                continue
+            requested = await _resolve(tickers_requested, universe_requested)
+            if action == "subscribe":
+                hub.add_tickers(subscriber, requested)
+            elif action == "unsubscribe":
+                hub.remove_tickers(subscriber, requested)
+            else:
+                await websocket.send_text(json.dumps({"type": "error", "detail": f"unknown action {action!r}"}))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.exception("WebSocket stream failed")
+        await log_error("stream_ws", str(e))
+    finally:
+        sender.cancel()
+        hub.unsubscribe(subscriber)
\ No newline at end of file
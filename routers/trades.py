@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List
 from pydantic import BaseModel, Field
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from services.trade_executor import TradeExecutor
 from utils.logging import get_logger
-from utils.db_helpers import log_error
+from utils.db_helpers import get_async_db, log_error
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -14,15 +15,28 @@ class TradeRequest(BaseModel):
     action: str = Field(..., pattern="^(buy|sell)$")
     quantity: float = Field(..., gt=0)
 
+class TradeBatchRequest(BaseModel):
+    orders: List[TradeRequest] = Field(..., min_length=1, max_length=500)
+
 @router.post("/")
-async def execute_trade(payload: TradeRequest):
+async def execute_trade(payload: TradeRequest, db: AsyncSession = Depends(get_async_db)):
     """Execute a paper trade and auto-update cash and active positions."""
     try:
-        result = await TradeExecutor().execute_trade(
+        result = await TradeExecutor(db).execute_trade(
             ticker=payload.ticker, action=payload.action, quantity=payload.quantity
         )
         return result
     except Exception as e:
         logger.exception("Trade execution failed")
         await log_error("trade_execute", str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/batch")
+async def execute_trade_batch(payload: TradeBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """Execute several paper trades atomically, in order, in a single transaction."""
+    try:
+        return await TradeExecutor(db).execute_batch([o.model_dump() for o in payload.orders])
+    except Exception as e:
+        logger.exception("Trade batch execution failed")
+        await log_error("trade_batch", str(e), {"orders": len(payload.orders)})
         raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+Offline backtest of the trading rules against historical market_prices.
+
+Signal scores are replayed in memory with TradeExecutor's allocation, slippage
+and fee arithmetic (services/trade_rules), so rule changes can be evaluated
+without placing paper trades. At each rebalance (the first bar after the day a
+score is dated, so no look-ahead) held tickers scoring <= exit_score are sold
+in full, then unheld tickers scoring >= entry_score are bought, each spending
+max_allocation_pct of the remaining cash. Positions are marked to market at
+every bar:
+
+    python -m services.backtest --start 2025-01-01 --end 2026-01-01 --bar "1 minute"
+    python -m services.backtest --start 2025-01-01 --end 2025-07-01 --signals scores.json --max-allocation-pct 10
+
+Scores come from the ML service unless a JSON list of {ticker, date, score}
+is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from services.trade_rules import TradeRules, allocation_buys, sale_proceeds
+from utils.db_helpers import get_engine
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Bars x tickers held in memory (float32 prices: 4 bytes each).
+BACKTEST_MAX_CELLS = int(os.getenv("BACKTEST_MAX_CELLS", "150000000"))
+BACKTEST_CONCURRENCY = int(os.getenv("BACKTEST_CONCURRENCY", "1"))
+BACKTEST_FETCH_ROWS = 100000
+BAR_PATTERN = r"^\d+ (minute|hour|day)s?$"
+_BAR_UNITS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Last observation per ticker and bar. Daily rollups (left after raw ticks
+# expire) count as a price at the end of their day; raw ticks win a shared bar.
+BARS_SQL = text(
+    """
+    WITH obs AS (
+        SELECT ticker, ts, price, 1 AS raw FROM market_prices
+        WHERE ticker = ANY(:tickers) AND ts >= :start AND ts < :end
+        UNION ALL
+        SELECT ticker, CAST(day AS TIMESTAMP) + INTERVAL '1 day' - INTERVAL '1 microsecond', close, 0 FROM market_prices_daily
+        WHERE ticker = ANY(:tickers) AND day >= CAST(:start AS DATE) AND day < CAST(:end AS DATE)
+    )
+    SELECT DISTINCT ON (ticker, bar)
+           array_position(CAST(:tickers AS TEXT[]), ticker) - 1,
+           CAST(EXTRACT(EPOCH FROM date_bin(CAST(:bar AS INTERVAL), ts, :start) - :start) AS BIGINT) / :bar_sec AS bar,
+           CAST(price AS FLOAT8)
+    FROM obs
+    ORDER BY ticker, bar, raw DESC, ts DESC
+    """
+)
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def parse_bar(bar: str) -> timedelta:
+    if not re.match(BAR_PATTERN, bar):
+        raise ValueError(f"bar must look like '1 minute', '15 minutes', '1 hour' or '1 day', got {bar!r}")
+    count, unit = bar.split()
+    return int(count) * _BAR_UNITS[unit.rstrip("s")]
+
+
+def _ffill(prices: np.ndarray, block: int = 65536):
+    """Carry each ticker's last price forward over bars without one, in place; 0 before its first price."""
+    # Contiguous row blocks, so the index scratch stays small; each block starts from the one before.
+    columns = np.arange(prices.shape[1])
+    rows = np.arange(block, dtype=np.int32)[:, None]
+    for first in range(0, len(prices), block):
+        chunk = prices[first:first + block]
+        if first:
+            np.copyto(chunk[0], prices[first - 1], where=np.isnan(chunk[0]))
+        last = np.where(np.isnan(chunk), 0, rows[:len(chunk)])
+        np.maximum.accumulate(last, axis=0, out=last)
+        chunk[...] = chunk[last, columns]
+    np.nan_to_num(prices, copy=False, nan=0.0)
+
+
+def load_bars(start: datetime, end: datetime, bar: str, tickers: List[str]) -> np.ndarray:
+    """(bars, tickers) float32 last-price matrix for [start, end), forward-filled."""
+    step = parse_bar(bar)
+    n_bars = int((end - start) / step)
+    if n_bars <= 0:
+        raise ValueError("end must be at least one bar after start")
+    # Whole bars only: ticks in a trailing partial bar (end defaults to now) would index past the matrix.
+    end = start + n_bars * step
+    if n_bars * len(tickers) > BACKTEST_MAX_CELLS:
+        raise ValueError(f"{n_bars} bars x {len(tickers)} tickers exceeds BACKTEST_MAX_CELLS={BACKTEST_MAX_CELLS}")
+    prices = np.full((n_bars, len(tickers)), np.nan, dtype=np.float32)
+    params = {"tickers": tickers, "start": start, "end": end, "bar": bar, "bar_sec": int(step.total_seconds())}
+    with get_engine().connect() as conn:
+        # stream_results makes psycopg use a named (server-side) cursor.
+        result = conn.execution_options(stream_results=True, max_row_buffer=BACKTEST_FETCH_ROWS).execute(BARS_SQL, params)
+        for rows in result.partitions(BACKTEST_FETCH_ROWS):
+            chunk = np.array(rows, dtype=np.float64)
+            prices[chunk[:, 1].astype(np.intp), chunk[:, 0].astype(np.intp)] = chunk[:, 2]
+    _ffill(prices)
+    return prices
+
+
+def score_matrix(signals: Iterable[Dict[str, Any]], start: datetime, bar: str, n_bars: int,
+                 tickers: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (rebalance bar indices, scores) from {ticker, date, score} items: a score
+    dated D is acted on at the first bar starting on or after D + 1 day. NaN
+    where a ticker has no score at that rebalance.
+    """
+    step = parse_bar(bar)
+    column = {t: i for i, t in enumerate(tickers)}
+    by_bar: Dict[int, Dict[int, Tuple[str, float]]] = {}
+    for item in signals:
+        ticker, day, score = item.get("ticker"), item.get("date"), item.get("score")
+        if ticker not in column or day is None or score is None:
+            continue
+        effective = datetime.combine(date.fromisoformat(str(day)[:10]), datetime.min.time()) + timedelta(days=1)
+        index = max(-(-(effective - start) // step), 0)  # ceil: first bar starting at/after it
+        if index >= n_bars:
+            continue
+        previous = by_bar.setdefault(index, {}).get(column[ticker])
+        if previous is None or str(day) >= previous[0]:
+            by_bar[index][column[ticker]] = (str(day), float(score))
+    rebalances = np.array(sorted(by_bar), dtype=np.intp)
+    scores = np.full((len(rebalances), len(tickers)), np.nan)
+    for r, index in enumerate(rebalances):
+        columns = list(by_bar[index])
+        scores[r, columns] = [by_bar[index][c][1] for c in columns]
+    return rebalances, scores
+
+
+def run_backtest(prices: np.ndarray, rebalances: np.ndarray, scores: np.ndarray, rules: TradeRules,
+                 initial_cash: float = 20000.0, entry_score: float = 0.5, exit_score: float = 0.0) -> Dict[str, Any]:
+    """
+    Replay rebalances over a (bars, tickers) price matrix. The loop runs once
+    per rebalance with array operations over tickers; marking to market is one
+    matrix-vector product per holding period, over all of its bars at once.
+    """
+    n_bars, n_tickers = prices.shape
+    held = np.zeros(n_tickers)
+    cash = float(initial_cash)
+    equity = np.full(n_bars, cash)
+    traded_value = costs = 0.0
+    trades = 0
+    bounds = np.append(rebalances, n_bars)
+    for r, bar in enumerate(rebalances):
+        price = prices[bar].astype(np.float64)
+        score = scores[r]
+        priced = price > 0
+
+        exits = (held > 0) & priced & (score <= exit_score)
+        if exits.any():
+            proceeds = sale_proceeds(held[exits], price[exits], rules)
+            gross = price[exits] * held[exits]
+            cash += float(proceeds.sum())
+            traded_value += float(gross.sum())
+            costs += float((gross - proceeds).sum())
+            trades += int(exits.sum())
+            held[exits] = 0.0
+
+        entries = (held == 0) & priced & (score >= entry_score)
+        if entries.any():
+            quantities, spent = allocation_buys(price[entries], cash, rules)
+            held[entries] = quantities
+            cash -= float(spent.sum())
+            gross = price[entries] * quantities
+            traded_value += float(gross.sum())
+            costs += float((spent - gross).sum())
+            trades += int(entries.sum())
+
+        period = slice(bar, bounds[r + 1])
+        equity[period] = cash + prices[period] @ held.astype(np.float32) if held.any() else cash
+
+    peak = np.maximum.accumulate(equity)
+    drawdown = equity / peak - 1
+    return {
+        "equity": equity,
+        "drawdown": drawdown,
+        "final_equity": float(equity[-1]),
+        "total_return_pct": float((equity[-1] / initial_cash - 1) * 100),
+        "max_drawdown_pct": float(drawdown.min() * 100),
+        "turnover": traded_value / float(equity.mean()),
+        "traded_value": traded_value,
+        "costs": costs,
+        "trades": trades,
+        "rebalances": len(rebalances),
+        "cash": cash,
+        "positions": {int(i): float(held[i]) for i in np.flatnonzero(held)},
+    }
+
+
+def _utc_naive(ts: datetime) -> datetime:
+    # market_prices.ts is a naive UTC TIMESTAMP.
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def _curve(result: Dict[str, Any], start: datetime, step: timedelta, points: int) -> List[Dict[str, Any]]:
+    equity, drawdown = result["equity"], result["drawdown"]
+    indices = np.unique(np.linspace(0, len(equity) - 1, min(points, len(equity))).astype(np.intp))
+    return [
+        {"ts": (start + step * int(i)).isoformat(), "equity": round(float(equity[i]), 2), "drawdown_pct": round(float(drawdown[i]) * 100, 4)}
+        for i in indices
+    ]
+
+
+def backtest(start: datetime, end: datetime, bar: str, signals: List[Dict[str, Any]], rules: TradeRules,
+             tickers: Optional[List[str]] = None, initial_cash: float = 20000.0, entry_score: float = 0.5,
+             exit_score: float = 0.0, points: int = 500) -> Dict[str, Any]:
+    """Load bars, align scores and run; returns a JSON-ready summary with a downsampled equity/drawdown curve."""
+    step = parse_bar(bar)
+    start, end = _utc_naive(start), _utc_naive(end)
+    end = start + max(int((end - start) / step), 0) * step  # load_bars drops a trailing partial bar
+    tickers = sorted(set(tickers or (s["ticker"] for s in signals if isinstance(s, dict) and s.get("ticker"))))
+    if not tickers:
+        raise ValueError("no tickers to backtest")
+    started = time.perf_counter()
+    prices = load_bars(start, end, bar, tickers)
+    loaded = time.perf_counter()
+    rebalances, scores = score_matrix(signals, start, bar, len(prices), tickers)
+    result = run_backtest(prices, rebalances, scores, rules, initial_cash, entry_score, exit_score)
+    finished = time.perf_counter()
+    logger.info({"event": "backtest_completed", "bars": len(prices), "tickers": len(tickers), "trades": result["trades"],
+                 "load_ms": round((loaded - started) * 1000, 1), "run_ms": round((finished - loaded) * 1000, 1)})
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bar": bar,
+        "bars": len(prices),
+        "tickers": len(tickers),
+        "rules": rules.__dict__,
+        "initial_cash": initial_cash,
+        "final_equity": round(result["final_equity"], 2),
+        "total_return_pct": round(result["total_return_pct"], 4),
+        "max_drawdown_pct": round(result["max_drawdown_pct"], 4),
+        "turnover": round(result["turnover"], 4),
+        "traded_value": round(result["traded_value"], 2),
+        "costs": round(result["costs"], 2),
+        "trades": result["trades"],
+        "rebalances": result["rebalances"],
+        "cash": round(result["cash"], 2),
+        "positions": {tickers[i]: q for i, q in result["positions"].items()},
+        "timings_ms": {"load": round((loaded - started) * 1000, 1), "run": round((finished - loaded) * 1000, 1)},
+        "curve": _curve(result, start, step, points),
+    }
+
+
+async def fetch_signal_history(start: datetime) -> List[Dict[str, Any]]:
+    """Scores from the ML service covering `start` through today (its lookback is capped at 365 days)."""
+    from services.signals_service import SignalsService
+
+    lookback_days = min(max((datetime.utcnow() - _utc_naive(start)).days + 1, 1), 365)
+    signals = await SignalsService().fetch_signals(ticker=None, lookback_days=lookback_days)
+    return signals if isinstance(signals, list) else []
+
+
+async def run_async(**kwargs) -> Dict[str, Any]:
+    """backtest() in a worker thread, at most BACKTEST_CONCURRENCY at a time per process (CPU and memory bound)."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(BACKTEST_CONCURRENCY)
+    async with _semaphore:
+        return await asyncio.to_thread(backtest, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="default: now")
+    parser.add_argument("--bar", default="1 hour")
+    parser.add_argument("--tickers", default=None, help="comma-separated; default: every ticker with a score")
+    parser.add_argument("--signals", default=None, help="JSON file of {ticker, date, score}; default: the ML service")
+    parser.add_argument("--initial-cash", type=float, default=20000.0)
+    parser.add_argument("--entry-score", type=float, default=0.5)
+    parser.add_argument("--exit-score", type=float, default=0.0)
+    parser.add_argument("--points", type=int, default=50, help="equity curve points to print")
+    for name, default in TradeRules().__dict__.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=None, help=f"override trade_rules (default {default})")
+    args = parser.parse_args()
+
+    with get_engine().connect() as conn:
+        rules_map = {k: float(v) for k, v in conn.execute(text("SELECT key, value FROM trade_rules")).fetchall()}
+    overrides = {name: getattr(args, name) for name in TradeRules().__dict__ if getattr(args, name) is not None}
+    rules = TradeRules.from_map({**rules_map, **overrides})
+    if args.signals:
+        with open(args.signals) as f:
+            signals = json.load(f)
+    else:
+        signals = asyncio.run(fetch_signal_history(args.start))
+    result = backtest(
+        args.start, args.end or datetime.utcnow(), args.bar, signals, rules,
+        tickers=args.tickers.split(",") if args.tickers else None, initial_cash=args.initial_cash,
+        entry_score=args.entry_score, exit_score=args.exit_score, points=args.points,
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
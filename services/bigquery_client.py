@@ -1,19 +1,118 @@
+import asyncio
+import itertools
 import os
-from typing import Optional, List, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from google.api_core.exceptions import NotFound
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import bigquery
 
+from utils.metrics import BIGQUERY_QUERY_DURATION
+from utils.streaming import InvalidCursor
+from utils.ttl_cache import AsyncTTLCache
+
+# Query results are cached per (query, params); a refresh storm shares one job.
+BQ_CACHE_TTL_SEC = float(os.getenv("BQ_CACHE_TTL_SEC", "60"))
+BQ_CACHE_MAX_ENTRIES = int(os.getenv("BQ_CACHE_MAX_ENTRIES", "256"))
+# Dedicated threads so slow BigQuery jobs can't starve the default executor (DB/registry work).
+BQ_MAX_WORKERS = int(os.getenv("BQ_MAX_WORKERS", "4"))
+# Rows fetched per results page when paginating or streaming; memory holds one page at a time.
+BQ_PAGE_SIZE = int(os.getenv("BQ_PAGE_SIZE", "1000"))
+# API root override for an emulator (e.g. benchmarks/fake_bigquery.py); requests are then unauthenticated.
+BQ_API_ENDPOINT = os.getenv("BQ_API_ENDPOINT")
+
 class BigQueryClient:
     def __init__(self):
         self.project_id = os.getenv("GCP_PROJECT_ID")
         self.dataset = os.getenv("BQ_DATASET", "comoda_analytics")
-        self.client = bigquery.Client(project=self.project_id)
+        if BQ_API_ENDPOINT:
+            self.client = bigquery.Client(project=self.project_id, credentials=AnonymousCredentials(),
+                                          client_options={"api_endpoint": BQ_API_ENDPOINT})
+        else:
+            self.client = bigquery.Client(project=self.project_id)
+        self._stats_lock = threading.Lock()
+        self.stats = {"jobs": 0, "failed_jobs": 0, "bytes_billed": 0, "bytes_processed": 0, "cache_hit_jobs": 0}
+
+    def _record_job(self, started: float, job: Optional[bigquery.QueryJob] = None):
+        """Job totals and latency; `job` is None when the query failed."""
+        with self._stats_lock:
+            # Runs on executor threads; the metrics registry relies on this lock.
+            if job is None:
+                self.stats["failed_jobs"] += 1
+                BIGQUERY_QUERY_DURATION.observe(time.perf_counter() - started, "error")
+                return
+            BIGQUERY_QUERY_DURATION.observe(time.perf_counter() - started, "cache_hit" if job.cache_hit else "ok")
+            self.stats["jobs"] += 1
+            self.stats["bytes_billed"] += job.total_bytes_billed or 0
+            self.stats["bytes_processed"] += job.total_bytes_processed or 0
+            if job.cache_hit:
+                self.stats["cache_hit_jobs"] += 1
+
+    def _start_query(self, sql: str, job_config: Optional[bigquery.QueryJobConfig], page_size: int):
+        started = time.perf_counter()
+        try:
+            job = self.client.query(sql, job_config=job_config)
+            # Waits for the job and fetches only the first page.
+            rows = job.result(page_size=page_size)
+        except Exception:
+            self._record_job(started)
+            raise
+        self._record_job(started, job)
+        return job, rows
+
+    def _run_query(self, sql: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> List[Dict]:
+        started = time.perf_counter()
+        try:
+            job = self.client.query(sql, job_config=job_config)
+            rows = [dict(row) for row in job.result()]
+        except Exception:
+            self._record_job(started)
+            raise
+        self._record_job(started, job)
+        return rows
+
+    def _query_page(self, sql: str, limit: int, cursor: Optional[Dict[str, Any]]) -> Tuple[List[Dict], Optional[Dict[str, Any]]]:
+        """
+        One page of a query's results plus the cursor for the next. Later pages
+        read the first page's job results by offset (no new job, nothing billed)
+        until BigQuery expires them (~24h).
+        """
+        if cursor is None:
+            job, rows = self._start_query(sql, None, limit)
+            offset = 0
+        else:
+            try:
+                job = self.client.get_job(str(cursor["job"]), location=cursor.get("location"))
+                offset = int(cursor["offset"])
+            except (KeyError, TypeError, ValueError, NotFound):
+                raise InvalidCursor("unknown or expired cursor") from None
+            # Cursors are client-supplied: never page through some other job's results.
+            if job.job_type != "query" or job.query != sql:
+                raise InvalidCursor("cursor does not belong to this query")
+            rows = job.result(page_size=limit, max_results=limit, start_index=offset)
+        page = [dict(row) for row in itertools.islice(rows, limit)]
+        offset += len(page)
+        if page and offset < (rows.total_rows or 0):
+            return page, {"job": job.job_id, "location": job.location, "offset": offset}
+        return page, None
+
+    def _iter_pages(self, sql: str, page_size: int) -> Iterator[List[Dict]]:
+        _, rows = self._start_query(sql, None, page_size)
+        for page in rows.pages:
+            yield [dict(row) for row in page]
 
     def insert_signals(self, rows: List[Dict]):
+        # Batch load job rather than streaming inserts: free, and one request per call.
         table_id = f"{self.project_id}.{self.dataset}.signals"
-        errors = self.client.insert_rows_json(table_id, rows)
-        if errors:
-            raise RuntimeError(f"BigQuery insert errors: {errors}")
-        return {"inserted": len(rows)}
+        job = self.client.load_table_from_json(rows, table_id, job_config=bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        ))
+        job.result()
+        if job.errors:
+            raise RuntimeError(f"BigQuery load errors: {job.errors}")
+        return {"inserted": job.output_rows}
 
     def query_signals_analytics(self, ticker: Optional[str], lookback_days: int):
         table_id = f"{self.project_id}.{self.dataset}.signals"
@@ -25,21 +124,89 @@ class BigQueryClient:
         GROUP BY ticker
         ORDER BY n DESC
         """
-        job = self.client.query(sql, job_config=bigquery.QueryJobConfig(
+        return self._run_query(sql, bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("ticker", "STRING", ticker),
                 bigquery.ScalarQueryParameter("lookback_days", "INT64", lookback_days),
             ]
         ))
-        return [dict(row) for row in job]
 
     def query_portfolio_metrics(self):
         table_id = f"{self.project_id}.{self.dataset}.portfolio_metrics"
         sql = f"SELECT * FROM `{table_id}` ORDER BY ts DESC LIMIT 100"
-        job = self.client.query(sql)
-        return [dict(row) for row in job]
+        return self._run_query(sql)
+
+    def _portfolio_metrics_history_sql(self) -> str:
+        return f"SELECT * FROM `{self.project_id}.{self.dataset}.portfolio_metrics` ORDER BY ts DESC"
+
+    def portfolio_metrics_page(self, limit: int, cursor: Optional[Dict[str, Any]]):
+        return self._query_page(self._portfolio_metrics_history_sql(), limit, cursor)
+
+    def iter_portfolio_metrics(self, page_size: int = BQ_PAGE_SIZE) -> Iterator[List[Dict]]:
+        return self._iter_pages(self._portfolio_metrics_history_sql(), page_size)
+
+
+_client: Optional[BigQueryClient] = None
+_client_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=BQ_MAX_WORKERS, thread_name_prefix="bigquery")
+query_cache = AsyncTTLCache(ttl=BQ_CACHE_TTL_SEC, max_entries=BQ_CACHE_MAX_ENTRIES)
+
+
+def get_bigquery_client() -> BigQueryClient:
+    """Process-wide client; credential discovery happens once, on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = BigQueryClient()
+    return _client
+
+
+async def _in_executor(method: str, *args: Any) -> List[Dict]:
+    loop = asyncio.get_running_loop()
+    # Client construction can itself block (metadata server lookups), so it runs here too.
+    return await loop.run_in_executor(_executor, lambda: getattr(get_bigquery_client(), method)(*args))
+
+
+async def query_signals_analytics(ticker: Optional[str], lookback_days: int) -> List[Dict]:
+    return await query_cache.get_or_load(
+        ("signals_analytics", ticker, lookback_days),
+        lambda: _in_executor("query_signals_analytics", ticker, lookback_days),
+    )
+
+
+async def query_portfolio_metrics() -> List[Dict]:
+    return await query_cache.get_or_load(("portfolio_metrics",), lambda: _in_executor("query_portfolio_metrics"))
+
+
+async def portfolio_metrics_page(limit: int, cursor: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict], Optional[Dict[str, Any]]]:
+    """Full portfolio_metrics history, newest first, `limit` rows at a time. First pages are cached like other queries."""
+    if cursor is None:
+        return await query_cache.get_or_load(("portfolio_metrics_page", limit), lambda: _in_executor("portfolio_metrics_page", limit, None))
+    return await _in_executor("portfolio_metrics_page", limit, cursor)
+
+
+async def stream_portfolio_metrics(page_size: int = BQ_PAGE_SIZE) -> AsyncIterator[List[Dict]]:
+    """
+    Full portfolio_metrics history as batches of rows. The query runs and its
+    first page is fetched before this returns (so failures raise here); later
+    pages are fetched only as the consumer asks for them.
+    """
+    loop = asyncio.get_running_loop()
+    pages = await loop.run_in_executor(_executor, lambda: get_bigquery_client().iter_portfolio_metrics(page_size))
+    first = await loop.run_in_executor(_executor, next, pages, None)
+
+    async def batches() -> AsyncIterator[List[Dict]]:
+        page = first
+        while page is not None:
+            yield page
+            page = await loop.run_in_executor(_executor, next, pages, None)
+
+    return batches()
+
 
-    def export_cloudsql_to_bq_example(self):
-        """Example: batch export data from Cloud SQL to BigQuery (placeholder)."""
-        # This would typically use Dataflow or manual ETL with pandas/pyarrow.
-        return {"status": "not_implemented"}
\ No newline at end of file
+def bigquery_stats() -> Dict[str, Any]:
+    return {
+        "cache": query_cache.snapshot(),
+        "jobs": dict(_client.stats) if _client is not None else None,
+    }
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""
+Incremental Cloud SQL -> BigQuery export.
+
+Each run exports, per table, the rows whose watermark column falls in
+(last watermark, now - EXPORT_SETTLE_SEC]. Rows are streamed out of Postgres
+through a server-side cursor in EXPORT_BATCH_ROWS chunks, written as Parquet
+row groups to a spooled temp file, and handed to a sink as one file: a
+BigQuery load job, or a local directory for testing without GCP:
+
+    python -m services.cloudsql_export --sink local --out ./export
+    python -m services.cloudsql_export --sink bigquery --tables trades,positions
+
+The watermark only advances after the sink accepts the file, so a failed run
+is simply retried (at-least-once: a crash between the load and the watermark
+update re-exports that window). positions is exported as change snapshots
+keyed by updated_at; take the latest row per ticker downstream.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from utils.db_helpers import get_engine, init_db
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "50000"))
+# Rows younger than this are left for the next run, so transactions that commit
+# slightly out of timestamp order aren't skipped by the watermark.
+EXPORT_SETTLE_SEC = float(os.getenv("EXPORT_SETTLE_SEC", "60"))
+# Caps one file/load job during a backfill; the run loops window by window.
+EXPORT_MAX_WINDOW_HOURS = float(os.getenv("EXPORT_MAX_WINDOW_HOURS", "24"))
+EXPORT_LOCAL_DIR = os.getenv("EXPORT_LOCAL_DIR", "./export")
+# Spooled temp files stay in memory up to this size, then spill to disk.
+_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    select: str
+    column: str
+    schema: pa.Schema
+
+
+# NUMERIC columns are exported as FLOAT64, matching how the app reads them.
+EXPORT_TABLES: Dict[str, ExportSpec] = {
+    "trades": ExportSpec(
+        select="SELECT id, ticker, action, quantity::float8, price::float8, executed_at FROM trades",
+        column="executed_at",
+        schema=pa.schema([
+            ("id", pa.int64()), ("ticker", pa.string()), ("action", pa.string()),
+            ("quantity", pa.float64()), ("price", pa.float64()), ("executed_at", pa.timestamp("us")),
+        ]),
+    ),
+    "positions": ExportSpec(
+        select="SELECT ticker, quantity::float8, updated_at FROM positions",
+        column="updated_at",
+        schema=pa.schema([("ticker", pa.string()), ("quantity", pa.float64()), ("updated_at", pa.timestamp("us"))]),
+    ),
+    "market_prices": ExportSpec(
+        select="SELECT ticker, price::float8, ts, source FROM market_prices",
+        column="ts",
+        schema=pa.schema([
+            ("ticker", pa.string()), ("price", pa.float64()), ("ts", pa.timestamp("us")), ("source", pa.string()),
+        ]),
+    ),
+}
+
+
+class LocalFileSink:
+    """Keeps each exported file under <directory>/<table>/; stands in for BigQuery locally."""
+
+    def __init__(self, directory: str = EXPORT_LOCAL_DIR):
+        self.directory = directory
+
+    def load(self, table: str, fileobj, lower: datetime, upper: datetime, rows: int) -> str:
+        os.makedirs(os.path.join(self.directory, table), exist_ok=True)
+        path = os.path.join(self.directory, table, f"{table}-{lower:%Y%m%dT%H%M%S%f}-{upper:%Y%m%dT%H%M%S%f}.parquet")
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out)
+        return path
+
+
+class BigQuerySink:
+    """Appends each file to <project>.<dataset>.<table> with a Parquet load job (no streaming-insert cost)."""
+
+    def __init__(self, client=None, dataset: Optional[str] = None):
+        from google.cloud import bigquery
+        from services.bigquery_client import get_bigquery_client
+
+        self._bigquery = bigquery
+        bq = get_bigquery_client()
+        self.client = client or bq.client
+        self.project_id = bq.project_id
+        self.dataset = dataset or bq.dataset
+
+    def load(self, table: str, fileobj, lower: datetime, upper: datetime, rows: int) -> str:
+        table_id = f"{self.project_id}.{self.dataset}.{table}"
+        job = self.client.load_table_from_file(
+            fileobj,
+            table_id,
+            job_config=self._bigquery.LoadJobConfig(
+                source_format=self._bigquery.SourceFormat.PARQUET,
+                write_disposition=self._bigquery.WriteDisposition.WRITE_APPEND,
+            ),
+            rewind=True,
+        )
+        job.result()
+        return job.job_id
+
+
+def _get_watermark(conn: Connection, table: str) -> Optional[datetime]:
+    return conn.execute(text("SELECT watermark FROM export_watermarks WHERE table_name=:t"), {"t": table}).scalar()
+
+
+def _set_watermark(conn: Connection, table: str, watermark: datetime, rows: int):
+    conn.execute(
+        text(
+            """
+            INSERT INTO export_watermarks (table_name, watermark, rows_exported, updated_at)
+            VALUES (:t, :w, :n, NOW())
+            ON CONFLICT (table_name) DO UPDATE
+                SET watermark = EXCLUDED.watermark,
+                    rows_exported = export_watermarks.rows_exported + EXCLUDED.rows_exported,
+                    updated_at = NOW()
+            """
+        ),
+        {"t": table, "w": watermark, "n": rows},
+    )
+
+
+def _write_parquet(conn: Connection, spec: ExportSpec, lower: datetime, upper: datetime, fileobj, batch_rows: int) -> int:
+    """Stream the window into `fileobj` one Arrow batch (= one row group) at a time."""
+    sql = text(f"{spec.select} WHERE {spec.column} > :lower AND {spec.column} <= :upper")
+    # stream_results makes psycopg use a named (server-side) cursor.
+    result = conn.execution_options(stream_results=True, max_row_buffer=batch_rows).execute(sql, {"lower": lower, "upper": upper})
+    rows = 0
+    writer = None
+    try:
+        for chunk in result.partitions(batch_rows):
+            columns = list(zip(*chunk))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(col, type=spec.schema.field(i).type) for i, col in enumerate(columns)], schema=spec.schema
+            )
+            if writer is None:
+                writer = pq.ParquetWriter(fileobj, spec.schema, compression="snappy")
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        result.close()
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def export_table(table: str, sink, batch_rows: int = EXPORT_BATCH_ROWS, settle_sec: float = EXPORT_SETTLE_SEC,
+                 max_window: timedelta = timedelta(hours=EXPORT_MAX_WINDOW_HOURS)) -> Dict[str, Any]:
+    spec = EXPORT_TABLES[table]
+    engine = get_engine()
+    summary = {"table": table, "rows": 0, "files": 0, "watermark": None}
+    with engine.connect() as conn:
+        target = conn.execute(text("SELECT (NOW() AT TIME ZONE 'UTC') - make_interval(secs => :s)"), {"s": settle_sec}).scalar()
+        watermark = _get_watermark(conn, table)
+        if watermark is None:
+            first = conn.execute(text(f"SELECT MIN({spec.column}) FROM {table}")).scalar()
+            if first is None:
+                return summary
+            watermark = first - timedelta(microseconds=1)
+        conn.rollback()
+
+    while watermark < target:
+        upper = min(target, watermark + max_window)
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES) as fileobj:
+            with engine.connect() as conn:
+                rows = _write_parquet(conn, spec, watermark, upper, fileobj, batch_rows)
+                if not rows:
+                    # Skip straight over gaps instead of scanning them window by window.
+                    following = conn.execute(
+                        text(f"SELECT MIN({spec.column}) FROM {table} WHERE {spec.column} > :u"), {"u": upper}
+                    ).scalar()
+                    if following is not None and following <= target:
+                        upper = following - timedelta(microseconds=1)
+            if rows:
+                fileobj.seek(0)
+                ref = sink.load(table, fileobj, watermark, upper, rows)
+                summary["files"] += 1
+                logger.info({"event": "export_loaded", "table": table, "rows": rows, "lower": str(watermark), "upper": str(upper), "ref": ref})
+        with engine.begin() as conn:
+            _set_watermark(conn, table, upper, rows)
+        summary["rows"] += rows
+        watermark = upper
+    summary["watermark"] = str(watermark)
+    return summary
+
+
+def run_export(tables: Optional[List[str]] = None, sink=None, **kwargs) -> List[Dict[str, Any]]:
+    sink = sink or BigQuerySink()
+    return [export_table(table, sink, **kwargs) for table in (tables or list(EXPORT_TABLES))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", default=",".join(EXPORT_TABLES), help="comma-separated subset of " + ", ".join(EXPORT_TABLES))
+    parser.add_argument("--sink", choices=("bigquery", "local"), default="bigquery")
+    parser.add_argument("--out", default=EXPORT_LOCAL_DIR, help="directory for --sink local")
+    parser.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS)
+    args = parser.parse_args()
+
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    unknown = set(tables) - set(EXPORT_TABLES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+    init_db()
+    sink = LocalFileSink(args.out) if args.sink == "local" else BigQuerySink()
+    for summary in run_export(tables, sink, batch_rows=args.batch_rows):
+        print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,48 @@
+import math
 import os
-import httpx
+from functools import partial
+from typing import Dict, List, Optional
+from services.resilience import resilient_request
 from utils.rate_limit import MultiRateLimiter
 
-COINAPI_BASE = "https://rest.coinapi.io/v1"
+COINAPI_BASE = os.getenv("COINAPI_BASE", "https://rest.coinapi.io/v1")
 
 rate_limiter = MultiRateLimiter({
-    "coinapi": {"rate_per_sec": 1.0, "burst": 5},  # Adjust per official limits
+    "coinapi": {
+        # Adjust per official limits
+        "rate_per_sec": float(os.getenv("RATE_LIMIT_COINAPI_PER_SEC", "1.0")),
+        "burst": int(os.getenv("RATE_LIMIT_COINAPI_BURST", "5")),
+        # Plan credits (0 = unlimited); low-priority ingestion is throttled as they run out.
+        "daily_quota": int(os.getenv("QUOTA_COINAPI_DAILY", "0")),
+        "monthly_quota": int(os.getenv("QUOTA_COINAPI_MONTHLY", "0")),
+    },
 })
 
 class CoinAPIClient:
     def __init__(self):
         self.api_key = os.getenv("COINAPI_KEY", "")
 
+    @staticmethod
+    async def _acquire(credits: int = 1, timeout: Optional[float] = None):
+        await rate_limiter.acquire("coinapi", timeout=timeout, cost=credits)
+
     async def fetch_live_price(self, ticker: str):
-        await rate_limiter.acquire("coinapi")
         headers = {"X-CoinAPI-Key": self.api_key}
         url = f"{COINAPI_BASE}/trades/latest?symbol_id={ticker}"
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(url, headers=headers)
-            resp.raise_for_status()
-            return resp.json()
\ No newline at end of file
+        resp = await resilient_request("coinapi", "GET", url, headers=headers, acquire=self._acquire)
+        return resp.json()
+
+    async def fetch_latest_prices(self, tickers: List[str]) -> Dict[str, list]:
+        """Latest trades for several symbols in one call (filter_symbol_id), grouped by symbol."""
+        headers = {"X-CoinAPI-Key": self.api_key}
+        params = {"filter_symbol_id": ",".join(tickers), "limit": max(len(tickers) * 10, 100)}
+        # CoinAPI bills one credit per 100 data points returned.
+        credits = math.ceil(params["limit"] / 100)
+        resp = await resilient_request("coinapi", "GET", f"{COINAPI_BASE}/trades/latest", headers=headers, params=params,
+                                       acquire=partial(self._acquire, credits))
+        grouped: Dict[str, list] = {ticker: [] for ticker in tickers}
+        for trade in resp.json():
+            symbol = trade.get("symbol_id")
+            if symbol in grouped:
+                grouped[symbol].append(trade)
+        return grouped
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+from utils.logging import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Per-provider pool/timeout defaults. Every value can be overridden with
+# HTTP_<PROVIDER>_<SETTING> (e.g. HTTP_COINAPI_TIMEOUT=10, HTTP_ML_HTTP2=1).
+PROVIDER_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "coinapi": {"timeout": 15.0, "connect_timeout": 5.0, "max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 30.0, "http2": False},
+    "santiment": {"timeout": 15.0, "connect_timeout": 5.0, "max_connections": 10, "max_keepalive": 5, "keepalive_expiry": 30.0, "http2": False},
+    "yahoo": {"timeout": 15.0, "connect_timeout": 5.0, "max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 30.0, "http2": False},
+    "ml": {"timeout": 30.0, "connect_timeout": 5.0, "max_connections": 50, "max_keepalive": 20, "keepalive_expiry": 60.0, "http2": False},
+}
+
+
+def _env_override(provider: str, key: str, default: Any) -> Any:
+    raw = os.getenv(f"HTTP_{provider.upper()}_{key.upper()}")
+    if raw is None:
+        return default
+    if isinstance(default, bool):
+        return raw.lower() in ("1", "true", "yes")
+    return type(default)(raw)
+
+
+def provider_config(provider: str) -> Dict[str, Any]:
+    defaults = PROVIDER_DEFAULTS.get(provider, PROVIDER_DEFAULTS["ml"])
+    return {key: _env_override(provider, key, value) for key, value in defaults.items()}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HTTPClientRegistry:
+    """Long-lived, pooled httpx.AsyncClient per outbound provider."""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._configs: Dict[str, Dict[str, Any]] = {}
+
+    def _build(self, provider: str) -> httpx.AsyncClient:
+        cfg = provider_config(provider)
+        if cfg["http2"] and not _http2_available():
+            logger.warning({"event": "http2_unavailable", "provider": provider, "message": "h2 not installed, using HTTP/1.1"})
+            cfg["http2"] = False
+        self._configs[provider] = cfg
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(cfg["timeout"], connect=cfg["connect_timeout"]),
+            limits=httpx.Limits(
+                max_connections=cfg["max_connections"],
+                max_keepalive_connections=cfg["max_keepalive"],
+                keepalive_expiry=cfg["keepalive_expiry"],
+            ),
+            http2=cfg["http2"],
+        )
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._build(provider)
+            self._clients[provider] = client
+        return client
+
+    async def startup(self):
+        for provider in PROVIDER_DEFAULTS:
+            self.get(provider)
+        logger.info({"event": "http_clients_started", "providers": list(self._clients)})
+
+    async def shutdown(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+        logger.info({"event": "http_clients_closed", "providers": list(clients)})
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Connection-pool occupancy per provider (best effort on httpcore internals)."""
+        out: Dict[str, Dict[str, Any]] = {}
+        for provider, client in self._clients.items():
+            cfg = self._configs.get(provider, {})
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+            requests = list(getattr(pool, "_requests", []) or [])
+            idle = sum(1 for c in connections if c.is_idle())
+            out[provider] = {
+                "connections": len(connections),
+                "idle": idle,
+                "active": len(connections) - idle,
+                "in_flight": len(requests),
+                "queued_requests": sum(1 for r in requests if r.is_queued()),
+                "max_connections": cfg.get("max_connections"),
+                "max_keepalive": cfg.get("max_keepalive"),
+                "http2": cfg.get("http2"),
+                "closed": client.is_closed,
+            }
+        return out
+
+
+registry = HTTPClientRegistry()
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    return registry.get(provider)
+
+
+async def init_http_clients():
+    await registry.startup()
+
+
+async def close_http_clients():
+    await registry.shutdown()
+
+
+def http_pool_stats(provider: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    stats = registry.stats()
+    if provider is not None:
+        return {provider: stats.get(provider, {})}
+    return stats
+
+
+metrics.gauge_callback(
+    "http_pool_connections", "Outbound connection-pool occupancy by provider", ("provider", "state"),
+    lambda: [((provider, state), pool[state]) for provider, pool in http_pool_stats().items()
+             for state in ("connections", "idle", "active", "in_flight", "queued_requests")],
+)
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from utils.db_helpers import get_db_session
+
+_COLUMNS = "ticker, universe, sources, refresh_interval_sec, enabled, last_ingested_at"
+
+
+def _row_to_dict(row) -> Dict:
+    return {
+        "ticker": row[0],
+        "universe": row[1],
+        "sources": list(row[2] or []),
+        "refresh_interval_sec": row[3],
+        "enabled": row[4],
+        "last_ingested_at": row[5],
+    }
+
+
+class IngestRegistry:
+    """Persisted ingestion configuration (ingestion_registry table)."""
+
+    def _list(self, ticker: Optional[str], universe: Optional[str], sources: Optional[List[str]],
+              start_date: Optional[datetime], end_date: Optional[datetime]) -> List[Dict]:
+        with get_db_session() as db:
+            rows = db.execute(
+                text(
+                    f"""
+                    SELECT {_COLUMNS} FROM ingestion_registry
+                    WHERE (CAST(:ticker AS TEXT) IS NULL OR ticker = :ticker)
+                      AND (CAST(:universe AS TEXT) IS NULL OR universe = :universe)
+                      AND (CAST(:sources AS TEXT[]) IS NULL OR sources && CAST(:sources AS TEXT[]))
+                      AND (CAST(:start AS TIMESTAMP) IS NULL OR last_ingested_at >= :start)
+                      AND (CAST(:end AS TIMESTAMP) IS NULL OR last_ingested_at <= :end)
+                    ORDER BY ticker
+                    """
+                ),
+                {"ticker": ticker, "universe": universe, "sources": sources, "start": start_date, "end": end_date},
+            ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def _upsert(self, ticker: str, universe: Optional[str], sources: Optional[List[str]],
+                refresh_interval_sec: Optional[int], enabled: Optional[bool]) -> Dict:
+        with get_db_session() as db:
+            row = db.execute(
+                text(
+                    f"""
+                    INSERT INTO ingestion_registry (ticker, universe, sources, refresh_interval_sec, enabled)
+                    VALUES (:ticker, COALESCE(:universe, 'market'), COALESCE(CAST(:sources AS TEXT[]), ARRAY['coinapi']),
+                            :interval, COALESCE(:enabled, TRUE))
+                    ON CONFLICT (ticker) DO UPDATE SET
+                        universe = COALESCE(:universe, ingestion_registry.universe),
+                        sources = COALESCE(CAST(:sources AS TEXT[]), ingestion_registry.sources),
+                        refresh_interval_sec = COALESCE(:interval, ingestion_registry.refresh_interval_sec),
+                        enabled = COALESCE(:enabled, ingestion_registry.enabled),
+                        updated_at = NOW()
+                    RETURNING {_COLUMNS}
+                    """
+                ),
+                {"ticker": ticker, "universe": universe, "sources": sources, "interval": refresh_interval_sec, "enabled": enabled},
+            ).fetchone()
+            db.commit()
+        return _row_to_dict(row)
+
+    def _delete(self, ticker: str) -> bool:
+        with get_db_session() as db:
+            deleted = db.execute(text("DELETE FROM ingestion_registry WHERE ticker = :t"), {"t": ticker}).rowcount
+            db.commit()
+        return bool(deleted)
+
+    def _due(self, default_intervals: Dict[str, int]) -> List[Dict]:
+        with get_db_session() as db:
+            rows = db.execute(
+                text(
+                    f"""
+                    SELECT {_COLUMNS} FROM ingestion_registry
+                    WHERE enabled
+                      AND (last_ingested_at IS NULL
+                           OR last_ingested_at <= NOW() - make_interval(secs => COALESCE(
+                                refresh_interval_sec,
+                                CASE universe WHEN 'portfolio' THEN :portfolio WHEN 'watchlist' THEN :watchlist ELSE :market END)))
+                    ORDER BY last_ingested_at NULLS FIRST
+                    """
+                ),
+                default_intervals,
+            ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def _mark_ingested(self, tickers: List[str]):
+        if not tickers:
+            return
+        with get_db_session() as db:
+            db.execute(
+                text("UPDATE ingestion_registry SET last_ingested_at = NOW() WHERE ticker = ANY(:tickers)"),
+                {"tickers": tickers},
+            )
+            db.commit()
+
+    async def list(self, ticker: Optional[str] = None, universe: Optional[str] = None, sources: Optional[List[str]] = None,
+                   start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[Dict]:
+        return await asyncio.to_thread(self._list, ticker, universe, sources, start_date, end_date)
+
+    async def upsert(self, ticker: str, universe: Optional[str] = None, sources: Optional[List[str]] = None,
+                     refresh_interval_sec: Optional[int] = None, enabled: Optional[bool] = None) -> Dict:
+        return await asyncio.to_thread(self._upsert, ticker, universe, sources, refresh_interval_sec, enabled)
+
+    async def delete(self, ticker: str) -> bool:
+        return await asyncio.to_thread(self._delete, ticker)
+
+    async def due(self, default_intervals: Dict[str, int]) -> List[Dict]:
+        return await asyncio.to_thread(self._due, default_intervals)
+
+    async def mark_ingested(self, tickers: List[str]):
+        await asyncio.to_thread(self._mark_ingested, tickers)
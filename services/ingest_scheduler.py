@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from services.ingest_registry import IngestRegistry
+from services.ingest_service import IngestService, source_budget
+from utils.db_helpers import get_engine
+from utils.logging import get_logger
+from utils.price_storage import run_maintenance
+
+logger = get_logger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("INGEST_SCHEDULER_ENABLED", "1").lower() in ("1", "true", "yes")
+TICK_SEC = float(os.getenv("INGEST_SCHEDULER_TICK_SEC", "5"))
+LEADER_RETRY_SEC = float(os.getenv("INGEST_LEADER_RETRY_SEC", "30"))
+# Arbitrary but fixed key for pg_try_advisory_lock; all instances must agree.
+LEADER_LOCK_KEY = int(os.getenv("INGEST_LEADER_LOCK_KEY", "7243001"))
+# How often the leader creates upcoming market_prices partitions and applies retention.
+MAINTENANCE_INTERVAL_SEC = float(os.getenv("MARKET_PRICES_MAINTENANCE_SEC", "3600"))
+
+UNIVERSE_PRIORITY = ["portfolio", "watchlist", "market"]
+DEFAULT_INTERVALS: Dict[str, int] = {
+    "portfolio": int(os.getenv("INGEST_INTERVAL_PORTFOLIO_SEC", "30")),
+    "watchlist": int(os.getenv("INGEST_INTERVAL_WATCHLIST_SEC", "120")),
+    "market": int(os.getenv("INGEST_INTERVAL_MARKET_SEC", "600")),
+}
+# Minimum fraction of a source's rate-limit bucket that must be free before a
+# universe may use it; lower-priority universes back off first when budget is scarce.
+MIN_BUDGET: Dict[str, float] = {"portfolio": 0.0, "watchlist": 0.25, "market": 0.5}
+
+
+class IngestScheduler:
+    """In-process refresher for the ingestion registry, active on the leader instance only."""
+
+    def __init__(self, tick_sec: float = TICK_SEC):
+        self.tick_sec = tick_sec
+        self.registry = IngestRegistry()
+        self.service = IngestService()
+        self._task: Optional[asyncio.Task] = None
+        self._lock_conn = None
+        self._last_maintenance: Optional[float] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_conn is not None
+
+    def _try_acquire_leadership(self) -> bool:
+        conn = get_engine().connect()
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": LEADER_LOCK_KEY}).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if acquired:
+            # The lock lives as long as this session; keep the connection checked out.
+            self._lock_conn = conn
+        else:
+            conn.close()
+        return bool(acquired)
+
+    def _check_leadership(self) -> bool:
+        try:
+            self._lock_conn.execute(text("SELECT 1"))
+            self._lock_conn.commit()
+            return True
+        except Exception:
+            self._release_leadership()
+            return False
+
+    def _release_leadership(self):
+        conn, self._lock_conn = self._lock_conn, None
+        if conn is None:
+            return
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": LEADER_LOCK_KEY})
+            conn.commit()
+        except Exception:
+            pass
+        finally:
+            conn.close()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info({"event": "ingest_scheduler_started", "tick_sec": self.tick_sec})
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(self._release_leadership)
+        logger.info({"event": "ingest_scheduler_stopped"})
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.is_leader:
+                    if not await asyncio.to_thread(self._try_acquire_leadership):
+                        await asyncio.sleep(LEADER_RETRY_SEC)
+                        continue
+                    logger.info({"event": "ingest_leader_acquired"})
+                elif not await asyncio.to_thread(self._check_leadership):
+                    logger.warning({"event": "ingest_leader_lost"})
+                    continue
+                await self.run_once()
+                await self._maybe_maintain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error({"event": "ingest_scheduler_error", "detail": str(e)})
+            await asyncio.sleep(self.tick_sec)
+
+    async def _maybe_maintain(self):
+        if self._last_maintenance is not None and time.monotonic() - self._last_maintenance < MAINTENANCE_INTERVAL_SEC:
+            return
+        self._last_maintenance = time.monotonic()
+
+        def maintain():
+            with get_engine().begin() as conn:
+                return run_maintenance(conn)
+
+        await asyncio.to_thread(maintain)
+
+    async def run_once(self) -> Dict[str, int]:
+        """Refresh every due registry entry, highest-priority universe first."""
+        due = await self.registry.due(DEFAULT_INTERVALS)
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[str]] = defaultdict(list)
+        for entry in due:
+            groups[(entry["universe"], tuple(sorted(entry["sources"])))].append(entry["ticker"])
+
+        refreshed: Dict[str, int] = {}
+        for universe in UNIVERSE_PRIORITY:
+            for (group_universe, sources), tickers in groups.items():
+                if group_universe != universe:
+                    continue
+                allowed = [s for s in sources if source_budget(s, universe) >= MIN_BUDGET.get(universe, 0.0)]
+                if not allowed:
+                    logger.info({"event": "ingest_deferred", "universe": universe, "tickers": len(tickers), "sources": list(sources)})
+                    continue
+                refreshed[universe] = refreshed.get(universe, 0) + await self._refresh(tickers, allowed, universe)
+        return refreshed
+
+    async def _refresh(self, tickers: List[str], sources: List[str], universe: str) -> int:
+        # Prices are queued for market_prices by IngestService as batches complete.
+        # Only tickers a batch actually delivered count; the rest stay due.
+        succeeded = set()
+        async for batch in self.service.stream_batch(tickers, sources, priority=universe):
+            if batch.get("status") == "ok":
+                succeeded.update(batch["ingested"])
+        await self.registry.mark_ingested(sorted(succeeded))
+        return len(succeeded)
+
+
+scheduler = IngestScheduler()
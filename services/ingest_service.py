@@ -0,0 +1,289 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import text
+
+from services import coinapi_client, santiment_client, yahoo_client
+from services.coinapi_client import CoinAPIClient
+from services.market_cache import latest_price_cache
+from services.market_stream import hub
+from services.price_writer import price_writer
+from services.resilience import CircuitOpenError, circuit_open
+from utils.rate_limit import RateLimitExceeded, rate_priority
+from services.santiment_client import SantimentClient
+from services.yahoo_client import YahooClient
+from utils.db_helpers import get_db_session
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+SOURCE_TIMEOUT_SEC = float(os.getenv("INGEST_SOURCE_TIMEOUT_SEC", "10"))
+REQUEST_TIMEOUT_SEC = float(os.getenv("INGEST_REQUEST_TIMEOUT_SEC", "20"))
+
+SOURCE_FETCHERS: Dict[str, Callable[[str], Awaitable[Any]]] = {
+    "coinapi": lambda ticker: CoinAPIClient().fetch_live_price(ticker),
+    "santiment": lambda ticker: SantimentClient().fetch_social_volume(ticker),
+    "yahoo": lambda ticker: YahooClient().fetch_quote(ticker),
+}
+
+# Sources with a multi-symbol endpoint: one upstream call per chunk of tickers.
+BATCH_FETCHERS: Dict[str, Callable[[List[str]], Awaitable[Dict[str, Any]]]] = {
+    "coinapi": lambda tickers: CoinAPIClient().fetch_latest_prices(tickers),
+    "yahoo": lambda tickers: YahooClient().fetch_quotes(tickers),
+}
+BATCH_SIZES: Dict[str, int] = {
+    "coinapi": int(os.getenv("INGEST_COINAPI_BATCH_SIZE", "25")),
+    "yahoo": int(os.getenv("INGEST_YAHOO_BATCH_SIZE", "50")),
+}
+# Sources without one are fetched per ticker with bounded concurrency, so
+# callers queue here instead of all sitting on the rate limiter at once.
+PER_TICKER_CONCURRENCY: Dict[str, int] = {
+    "santiment": int(os.getenv("INGEST_SANTIMENT_CONCURRENCY", "2")),
+}
+
+
+def _describe_error(exc: BaseException) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"HTTP {exc.response.status_code}"
+    return str(exc) or type(exc).__name__
+
+
+# Rate limiter guarding each source, used by the scheduler to gauge remaining budget.
+SOURCE_LIMITERS = {
+    "coinapi": coinapi_client.rate_limiter,
+    "santiment": santiment_client.rate_limiter,
+    "yahoo": yahoo_client.rate_limiter,
+}
+
+
+def source_budget(source: str, priority: Optional[str] = None) -> float:
+    if circuit_open(source):
+        return 0.0
+    limiter = SOURCE_LIMITERS.get(source)
+    return limiter.budget(source, priority) if limiter is not None else 1.0
+
+
+PRICE_SOURCES = ("coinapi", "yahoo")
+
+
+def extract_price(source: str, data: Any) -> Optional[float]:
+    """Pull a last-trade/quote price out of a per-ticker provider payload."""
+    try:
+        if source == "coinapi":
+            trades = data if isinstance(data, list) else [data]
+            return float(trades[0]["price"]) if trades and trades[0] else None
+        if source == "yahoo":
+            if isinstance(data, dict) and "quoteResponse" in data:
+                data = (data["quoteResponse"].get("result") or [None])[0]
+            return float(data["regularMarketPrice"]) if data and data.get("regularMarketPrice") is not None else None
+    except (KeyError, TypeError, ValueError, IndexError):
+        return None
+    return None
+
+
+async def record_prices(source: str, results: Dict[str, Any], block: bool = True) -> List[str]:
+    """
+    Feed extracted per-ticker prices to the latest-price cache, stream subscribers
+    and the market_prices buffer, and return the tickers that had a price. With
+    block=False a full buffer drops the rows instead of waiting for the writer.
+    """
+    prices = [(ticker, price) for ticker, data in results.items() if (price := extract_price(source, data)) is not None]
+    for ticker, price in prices:
+        latest_price_cache.update(ticker, price)
+    if prices:
+        ts = datetime.utcnow()
+        hub.publish("price", [{"ticker": ticker, "price": price, "ts": ts.isoformat(), "source": source} for ticker, price in prices])
+        if block:
+            await price_writer.submit_many(prices, source=source, ts=ts)
+        else:
+            price_writer.submit_many_nowait(prices, source=source, ts=ts)
+    return [ticker for ticker, _ in prices]
+
+
+def ingested_tickers(source: str, results: Dict[str, Any], priced: List[str]) -> List[str]:
+    """Tickers an ok batch actually delivered data for: those priced, or for sources without prices (santiment) a non-empty payload."""
+    if source in PRICE_SOURCES:
+        return priced
+    return [ticker for ticker, data in results.items() if data]
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _load_universe(universe: str) -> List[str]:
+    with get_db_session() as db:
+        rows = db.execute(
+            text(
+                """
+                SELECT ticker FROM tokens WHERE universe = :u
+                UNION
+                SELECT ticker FROM positions WHERE :u = 'portfolio' AND quantity > 0
+                ORDER BY ticker
+                """
+            ),
+            {"u": universe},
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+def _classify_error(exc: BaseException) -> str:
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+        return "rate_limited"
+    if isinstance(exc, RateLimitExceeded):
+        return "rate_limited"
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    return "error"
+
+
+class IngestService:
+    async def _fetch_source(self, source: str, ticker: str, timeout: float) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            data = await asyncio.wait_for(SOURCE_FETCHERS[source](ticker), timeout=timeout)
+            status, error = "ok", None
+        except Exception as e:
+            data, status, error = None, _classify_error(e), _describe_error(e)
+            logger.warning({"event": "ingest_source_failed", "source": source, "ticker": ticker, "status": status, "error": error})
+        if status == "ok":
+            # Recording is our side, not the upstream's: it must neither stall this
+            # interactive call on a full writer buffer nor change the source's status.
+            try:
+                await record_prices(source, {ticker: data}, block=False)
+            except Exception as e:
+                logger.exception({"event": "ingest_record_failed", "source": source, "ticker": ticker, "error": str(e)})
+        result: Dict[str, Any] = {
+            "status": status,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "data": data,
+        }
+        if error is not None:
+            result["error"] = error
+        return result
+
+    async def fetch_sources(
+        self,
+        ticker: str,
+        sources: List[str],
+        source_timeout: Optional[float] = None,
+        request_timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Query the selected sources concurrently; one slow or failing source never fails the rest."""
+        source_timeout = source_timeout or SOURCE_TIMEOUT_SEC
+        request_timeout = request_timeout or REQUEST_TIMEOUT_SEC
+        unknown = [s for s in sources if s not in SOURCE_FETCHERS]
+        selected = [s for s in dict.fromkeys(sources) if s in SOURCE_FETCHERS]
+
+        started = time.perf_counter()
+        with rate_priority(priority):
+            tasks = {
+                source: asyncio.create_task(self._fetch_source(source, ticker, min(source_timeout, request_timeout)))
+                for source in selected
+            }
+        done, pending = await asyncio.wait(tasks.values(), timeout=request_timeout) if tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+
+        results: Dict[str, Dict[str, Any]] = {}
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        for source, task in tasks.items():
+            if task in done:
+                results[source] = task.result()
+            else:
+                results[source] = {"status": "timeout", "latency_ms": elapsed_ms, "data": None, "error": "request deadline exceeded"}
+        for source in unknown:
+            results[source] = {"status": "error", "latency_ms": 0.0, "data": None, "error": "unknown source"}
+        return results
+
+
+    async def resolve_universe(self, universe: str) -> List[str]:
+        return await asyncio.to_thread(_load_universe, universe)
+
+    async def _run_batch(self, source: str, tickers: List[str], fetch: Callable[[], Awaitable[Dict[str, Any]]], timeout: float) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            results = await asyncio.wait_for(fetch(), timeout=timeout)
+            status, error = "ok", None
+        except Exception as e:
+            results, status, error = {}, _classify_error(e), _describe_error(e)
+            logger.warning({"event": "ingest_batch_failed", "source": source, "tickers": len(tickers), "status": status, "error": error})
+        batch: Dict[str, Any] = {
+            "source": source,
+            "tickers": tickers,
+            "status": status,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "results": results,
+        }
+        if error is not None:
+            batch["error"] = error
+        return batch
+
+    def _batch_jobs(self, tickers: List[str], sources: List[str], timeout: float) -> List[Awaitable[Dict[str, Any]]]:
+        jobs: List[Awaitable[Dict[str, Any]]] = []
+        for source in dict.fromkeys(sources):
+            if source in BATCH_FETCHERS:
+                for chunk in _chunks(tickers, BATCH_SIZES[source]):
+                    jobs.append(self._run_batch(source, chunk, partial(BATCH_FETCHERS[source], chunk), timeout))
+            elif source in SOURCE_FETCHERS:
+                semaphore = asyncio.Semaphore(PER_TICKER_CONCURRENCY.get(source, 1))
+                for ticker in tickers:
+                    jobs.append(self._run_limited(semaphore, source, ticker, timeout))
+        return jobs
+
+    async def _run_limited(self, semaphore: asyncio.Semaphore, source: str, ticker: str, timeout: float) -> Dict[str, Any]:
+        async with semaphore:
+            batch = await self._run_batch(source, [ticker], partial(SOURCE_FETCHERS[source], ticker), timeout)
+        if batch["status"] == "ok":
+            batch["results"] = {ticker: batch["results"]}
+        return batch
+
+    async def stream_batch(
+        self,
+        tickers: List[str],
+        sources: List[str],
+        source_timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ingest many tickers, coalescing into multi-symbol upstream calls where the
+        provider supports it. Yields one result per completed batch (ok ones list
+        the tickers that delivered data under "ingested"), then a summary.
+        """
+        tickers = list(dict.fromkeys(t.strip() for t in tickers if t and t.strip()))
+        timeout = source_timeout or SOURCE_TIMEOUT_SEC
+        started = time.perf_counter()
+        counts: Dict[str, int] = {}
+        for source in sources:
+            if source not in SOURCE_FETCHERS:
+                counts["error"] = counts.get("error", 0) + 1
+                yield {"source": source, "tickers": tickers, "status": "error", "latency_ms": 0.0, "results": {}, "error": "unknown source"}
+
+        # Tasks copy the context they're created in, so the priority sticks to their provider calls.
+        with rate_priority(priority):
+            tasks = [asyncio.ensure_future(job) for job in self._batch_jobs(tickers, sources, timeout)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                batch = await next_done
+                if batch["status"] == "ok":
+                    priced = await record_prices(batch["source"], batch["results"])
+                    batch["ingested"] = ingested_tickers(batch["source"], batch["results"], priced)
+                counts[batch["status"]] = counts.get(batch["status"], 0) + 1
+                yield batch
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield {
+            "event": "done",
+            "tickers": len(tickers),
+            "batches": counts,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
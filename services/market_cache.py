@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from utils.db_helpers import get_async_session
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+TRADE_RULES_CHANNEL = "trade_rules_changed"
+# Upper bound on rules staleness if a NOTIFY is missed (listener down/reconnecting).
+TRADE_RULES_CACHE_TTL_SEC = float(os.getenv("TRADE_RULES_CACHE_TTL_SEC", "300"))
+# A cached price older than this (by tick timestamp) is treated as a miss and re-read from the DB.
+PRICE_CACHE_MAX_AGE_SEC = float(os.getenv("PRICE_CACHE_MAX_AGE_SEC", "60"))
+
+DEFAULT_TRADE_RULES = {"max_allocation_pct": 5.0, "slippage_pct": 0.1, "fees_pct": 0.05}
+
+
+async def _load_trade_rules() -> Dict[str, float]:
+    async with get_async_session() as db:
+        rows = (await db.execute(text("SELECT key, value FROM trade_rules"))).fetchall()
+    return {r[0]: float(r[1]) for r in rows}
+
+
+async def _load_latest_price(ticker: str) -> Optional[Tuple[float, datetime]]:
+    async with get_async_session() as db:
+        row = (await db.execute(text("SELECT price, ts FROM latest_prices WHERE ticker=:t"), {"t": ticker})).fetchone()
+        if row is None:
+            row = (await db.execute(text("SELECT price, ts FROM market_prices WHERE ticker=:t ORDER BY ts DESC LIMIT 1"), {"t": ticker})).fetchone()
+    return (float(row[0]), row[1]) if row else None
+
+
+async def _load_latest_prices(tickers: List[str]) -> Dict[str, Tuple[float, datetime]]:
+    async with get_async_session() as db:
+        rows = (await db.execute(
+            text("SELECT ticker, price, ts FROM latest_prices WHERE ticker = ANY(:tickers)"), {"tickers": tickers}
+        )).fetchall()
+    return {r[0]: (float(r[1]), r[2]) for r in rows}
+
+
+class TradeRulesCache:
+    """Process-local copy of trade_rules, dropped on NOTIFY trade_rules_changed."""
+
+    def __init__(self, ttl: float = TRADE_RULES_CACHE_TTL_SEC):
+        self.ttl = ttl
+        self._rules: Optional[Dict[str, float]] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def invalidate(self, *_: Any):
+        self._rules = None
+        self._version += 1
+        self.stats["invalidations"] += 1
+
+    async def get(self) -> Dict[str, float]:
+        rules = self._rules
+        if rules is not None and time.monotonic() - self._loaded_at < self.ttl:
+            self.stats["hits"] += 1
+            return rules
+        async with self._lock:
+            if self._rules is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self.stats["misses"] += 1
+                version = self._version
+                rules = {**DEFAULT_TRADE_RULES, **await _load_trade_rules()}
+                self._rules = rules
+                # An invalidation that raced the load means `rules` may predate the change.
+                self._loaded_at = time.monotonic() if version == self._version else 0.0
+            else:
+                self.stats["hits"] += 1
+                rules = self._rules
+            return rules
+
+
+class LatestPriceCache:
+    """Latest price per ticker fed by ingestion, with a staleness bound on reads."""
+
+    def __init__(self, max_age: float = PRICE_CACHE_MAX_AGE_SEC):
+        self.max_age = max_age
+        self._prices: Dict[str, Tuple[float, datetime]] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "updates": 0}
+        self._max_age_served = 0.0
+
+    def update(self, ticker: str, price: float, ts: Optional[datetime] = None):
+        ts = ts or datetime.utcnow()
+        current = self._prices.get(ticker)
+        if current is None or current[1] <= ts:
+            self._prices[ticker] = (float(price), ts)
+            self.stats["updates"] += 1
+
+    def _fresh(self, ticker: str) -> Optional[float]:
+        entry = self._prices.get(ticker)
+        if entry is not None:
+            age = (datetime.utcnow() - entry[1]).total_seconds()
+            if age <= self.max_age:
+                self.stats["hits"] += 1
+                self._max_age_served = max(self._max_age_served, age)
+                return entry[0]
+            self.stats["stale"] += 1
+        else:
+            self.stats["misses"] += 1
+        return None
+
+    async def get(self, ticker: str) -> Optional[float]:
+        price = self._fresh(ticker)
+        if price is not None:
+            return price
+        loaded = await _load_latest_price(ticker)
+        if loaded is None:
+            return None
+        self.update(ticker, *loaded)
+        return loaded[0]
+
+    async def get_many(self, tickers: List[str]) -> Dict[str, float]:
+        """Fresh cached prices, with a single DB round trip for all misses."""
+        prices: Dict[str, float] = {}
+        missing = []
+        for ticker in dict.fromkeys(tickers):
+            price = self._fresh(ticker)
+            if price is None:
+                missing.append(ticker)
+            else:
+                prices[ticker] = price
+        if missing:
+            for ticker, (price, ts) in (await _load_latest_prices(missing)).items():
+                self.update(ticker, price, ts)
+                prices[ticker] = price
+        return prices
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        ages = [(now - ts).total_seconds() for _, ts in self._prices.values()]
+        return {
+            **self.stats,
+            "tickers": len(self._prices),
+            "max_age_sec": self.max_age,
+            "max_age_served_sec": round(self._max_age_served, 3),
+            "oldest_entry_age_sec": round(max(ages), 3) if ages else None,
+            "stale_entries": sum(1 for a in ages if a > self.max_age),
+        }
+
+
+trade_rules_cache = TradeRulesCache()
+latest_price_cache = LatestPriceCache()
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {
+        "trade_rules": {**trade_rules_cache.stats, "ttl_sec": trade_rules_cache.ttl, "loaded": trade_rules_cache._rules is not None},
+        "latest_prices": latest_price_cache.snapshot(),
+    }
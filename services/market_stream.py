@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from utils.db_helpers import get_async_session
+from utils.logging import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Distinct (type, ticker) updates a subscriber may have pending; a newer update for
+# a pending key replaces it (coalesced), a new key past this drops the oldest one.
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+STREAM_HEARTBEAT_SEC = float(os.getenv("STREAM_HEARTBEAT_SEC", "15"))
+# postgres: updates are re-published to other instances via NOTIFY; local: this instance only.
+STREAM_FANOUT = os.getenv("STREAM_FANOUT", "postgres").lower()
+STREAM_NOTIFY_INTERVAL_SEC = float(os.getenv("STREAM_NOTIFY_INTERVAL_SEC", "0.05"))
+STREAM_CHANNEL = "market_stream"
+# NOTIFY payloads are capped at 8000 bytes.
+NOTIFY_MAX_BYTES = 7900
+
+INSTANCE_ID = uuid.uuid4().hex[:12]
+ALL = "*"
+
+Key = Tuple[str, str]  # (type, ticker)
+
+
+class StreamFull(Exception):
+    pass
+
+
+class Subscriber:
+    """One client's subscription and its pending updates, keyed so a slow reader only ever gets the latest value."""
+
+    __slots__ = ("tickers", "types", "maxsize", "dropped", "coalesced", "delivered", "_pending", "_wakeup")
+
+    def __init__(self, tickers: Set[str], types: Set[str], maxsize: int = STREAM_QUEUE_SIZE):
+        self.tickers = tickers
+        self.types = types
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self._pending: Dict[Key, str] = {}
+        self._wakeup = asyncio.Event()
+
+    def offer(self, key: Key, message: str):
+        pending = self._pending
+        if key in pending:
+            self.coalesced += 1
+        elif not pending:
+            # get() only waits once it has found nothing pending, so only this transition needs a wakeup.
+            pending[key] = message
+            self._wakeup.set()
+            return
+        elif len(pending) >= self.maxsize:
+            del pending[next(iter(pending))]
+            self.dropped += 1
+        pending[key] = message
+
+    async def get(self, timeout: float = STREAM_HEARTBEAT_SEC) -> List[Tuple[Key, str]]:
+        """Everything pending, waiting up to `timeout` for something to arrive ([] on timeout)."""
+        if not self._pending:
+            self._wakeup.clear()
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                return []
+        batch, self._pending = self._pending, {}
+        self.delivered += len(batch)
+        return list(batch.items())
+
+
+class StreamHub:
+    """
+    In-process pub/sub for price ticks and signal scores. Each update is encoded
+    once and handed to the subscribers of its ticker; with STREAM_FANOUT=postgres
+    local updates are also batched into NOTIFYs so every instance's hub sees them.
+    """
+
+    def __init__(self, fanout: str = STREAM_FANOUT, max_subscribers: int = STREAM_MAX_SUBSCRIBERS):
+        self.fanout = fanout
+        self.max_subscribers = max_subscribers
+        # Subscribers by (type, ticker), and by type for those following every ticker.
+        self._by_key: Dict[Key, Set[Subscriber]] = {}
+        self._all: Dict[str, Set[Subscriber]] = {}
+        self._subscribers: Set[Subscriber] = set()
+        # Last update per (type, ticker): sent to new subscribers and used to skip unchanged signals.
+        self._latest: Dict[Key, str] = {}
+        self._outbox: List[Dict[str, Any]] = []
+        self._outbox_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"published": 0, "unchanged": 0, "remote": 0, "notifies": 0, "notify_failures": 0, "rejected": 0}
+        # Counters of subscribers that have gone away, so totals don't drop with them.
+        self._closed = {"delivered": 0, "coalesced": 0, "dropped": 0}
+
+    def subscribe(self, tickers: Iterable[str], types: Iterable[str], maxsize: int = STREAM_QUEUE_SIZE) -> Subscriber:
+        if len(self._subscribers) >= self.max_subscribers:
+            self._stats["rejected"] += 1
+            raise StreamFull(f"{self.max_subscribers} subscribers")
+        subscriber = Subscriber(set(), set(types), maxsize)
+        self._subscribers.add(subscriber)
+        self.add_tickers(subscriber, tickers)
+        return subscriber
+
+    def add_tickers(self, subscriber: Subscriber, tickers: Iterable[str]):
+        added = [t for t in tickers if t not in subscriber.tickers]
+        for ticker in added:
+            subscriber.tickers.add(ticker)
+            for kind in subscriber.types:
+                if ticker == ALL:
+                    self._all.setdefault(kind, set()).add(subscriber)
+                else:
+                    self._by_key.setdefault((kind, ticker), set()).add(subscriber)
+        # Start from the current value of everything newly subscribed.
+        for (kind, ticker), message in self._latest.items():
+            if kind in subscriber.types and (ALL in added or ticker in added):
+                subscriber.offer((kind, ticker), message)
+
+    def remove_tickers(self, subscriber: Subscriber, tickers: Iterable[str]):
+        for ticker in tickers:
+            subscriber.tickers.discard(ticker)
+            for kind in subscriber.types:
+                index, key = (self._all, kind) if ticker == ALL else (self._by_key, (kind, ticker))
+                subscribers = index.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del index[key]
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber not in self._subscribers:
+            return
+        self.remove_tickers(subscriber, list(subscriber.tickers))
+        self._subscribers.discard(subscriber)
+        self._closed["delivered"] += subscriber.delivered
+        self._closed["coalesced"] += subscriber.coalesced
+        self._closed["dropped"] += subscriber.dropped
+
+    def has_subscribers(self, kind: str) -> bool:
+        return any(kind in s.types for s in self._subscribers)
+
+    def publish(self, kind: str, items: Iterable[Dict[str, Any]], only_changed: bool = False, remote: bool = False) -> int:
+        """Fan `items` (dicts with a "ticker") out to subscribers; returns how many were published."""
+        published = []
+        for item in items:
+            ticker = item.get("ticker")
+            if not ticker:
+                continue
+            message = {"type": kind, **item}
+            encoded = json.dumps(message, default=str, separators=(",", ":"))
+            key = (kind, ticker)
+            if only_changed and self._latest.get(key) == encoded:
+                self._stats["unchanged"] += 1
+                continue
+            self._latest[key] = encoded
+            for subscriber in self._by_key.get(key, ()):
+                subscriber.offer(key, encoded)
+            for subscriber in self._all.get(kind, ()):
+                subscriber.offer(key, encoded)
+            published.append(message)
+        self._stats["remote" if remote else "published"] += len(published)
+        if published and not remote and self.fanout == "postgres" and self._task is not None:
+            self._outbox.extend(published)
+            self._outbox_ready.set()
+        return len(published)
+
+    def on_notify(self, channel: str, payload: str):
+        """pg_listener callback: publish updates NOTIFY'd by other instances."""
+        message = json.loads(payload)
+        if message.get("origin") == INSTANCE_ID:
+            return
+        by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        for item in message.get("items", []):
+            by_kind.setdefault(item.pop("type", None), []).append(item)
+        for kind, items in by_kind.items():
+            if kind:
+                self.publish(kind, items, remote=True)
+
+    async def start(self):
+        if self._task is None and self.fanout == "postgres":
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _notify_payloads(self, items: List[Dict[str, Any]]) -> List[str]:
+        payloads, chunk, size = [], [], 0
+        head = len(json.dumps({"origin": INSTANCE_ID, "items": []}))
+        for item in items:
+            encoded = json.dumps(item, default=str, separators=(",", ":"))
+            if head + len(encoded) + 1 > NOTIFY_MAX_BYTES:
+                continue  # too large to fan out; other instances just miss it
+            if chunk and head + size + len(encoded) + 1 > NOTIFY_MAX_BYTES:
+                payloads.append(chunk)
+                chunk, size = [], 0
+            chunk.append(encoded)
+            size += len(encoded) + 1
+        if chunk:
+            payloads.append(chunk)
+        return [f'{{"origin":"{INSTANCE_ID}","items":[{",".join(chunk)}]}}' for chunk in payloads]
+
+    async def _run(self):
+        # Updates are batched for STREAM_NOTIFY_INTERVAL_SEC so a burst of ticks costs a few NOTIFYs, not one each.
+        while True:
+            await self._outbox_ready.wait()
+            await asyncio.sleep(STREAM_NOTIFY_INTERVAL_SEC)
+            self._outbox_ready.clear()
+            items, self._outbox = self._outbox, []
+            payloads = self._notify_payloads(items)
+            try:
+                async with get_async_session() as db:
+                    for payload in payloads:
+                        await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": STREAM_CHANNEL, "payload": payload})
+                    await db.commit()
+                self._stats["notifies"] += len(payloads)
+            except Exception as e:
+                # Other instances' subscribers miss these updates; the next ones go through.
+                self._stats["notify_failures"] += 1
+                logger.warning({"event": "stream_notify_failed", "items": len(items), "detail": str(e)})
+
+    def stats(self) -> Dict[str, Any]:
+        live = {"delivered": 0, "coalesced": 0, "dropped": 0}
+        pending = 0
+        for subscriber in self._subscribers:
+            live["delivered"] += subscriber.delivered
+            live["coalesced"] += subscriber.coalesced
+            live["dropped"] += subscriber.dropped
+            pending += len(subscriber._pending)
+        return {
+            **self._stats,
+            **{k: v + self._closed[k] for k, v in live.items()},
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "pending": pending,
+            "keys": len(self._by_key),
+            "fanout": self.fanout,
+            "instance": INSTANCE_ID,
+        }
+
+
+hub = StreamHub()
+
+metrics.gauge_callback(
+    "stream_subscribers", "Open WebSocket/SSE stream subscribers on this instance", (),
+    lambda: [((), len(hub._subscribers))],
+)
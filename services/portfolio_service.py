@@ -0,0 +1,200 @@
+from datetime import timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Held positions with their cost basis and mark: the latest market price, else
+# the last trade price (as in history). Positions with neither are marked at
+# average cost (zero unrealized PnL) rather than dropped from the total.
+VALUATION_SQL = text(
+    """
+    SELECT p.ticker, p.quantity, cb.quantity, cb.cost,
+           COALESCE(lp.price, t.price), COALESCE(lp.ts, t.executed_at)
+    FROM positions p
+    LEFT JOIN cost_basis cb USING (ticker)
+    LEFT JOIN latest_prices lp USING (ticker)
+    LEFT JOIN LATERAL (
+        SELECT price, executed_at FROM trades
+        WHERE trades.ticker = p.ticker
+        ORDER BY executed_at DESC, id DESC LIMIT 1
+    ) t ON lp.price IS NULL
+    WHERE p.quantity > 0
+    """
+)
+TOTALS_SQL = text(
+    """
+    SELECT (SELECT cash_available FROM portfolio ORDER BY id LIMIT 1),
+           (SELECT COALESCE(SUM(realized_pnl), 0) FROM cost_basis)
+    """
+)
+# History is built from change events: each ticker's position snapshot (trades.position_after)
+# going into the window plus the last one of each day in it, forward-filled per
+# day in NumPy; cash likewise from trades.cash_after. Offsets are days from the window start.
+HISTORY_WINDOW = "WITH bounds AS (SELECT CAST(NOW() AS DATE) - CAST(:days - 1 AS INTEGER) AS start)"
+HISTORY_POSITIONS_SQL = text(
+    HISTORY_WINDOW + """
+    SELECT cb.ticker, 0, FALSE, t.position_after, t.price
+    FROM cost_basis cb CROSS JOIN bounds
+    JOIN LATERAL (
+        SELECT position_after, price FROM trades
+        WHERE ticker = cb.ticker AND executed_at < bounds.start
+        ORDER BY executed_at DESC, id DESC LIMIT 1
+    ) t ON TRUE
+    UNION ALL
+    SELECT * FROM (
+        SELECT DISTINCT ON (ticker, CAST(executed_at AS DATE))
+               ticker, CAST(executed_at AS DATE) - bounds.start, TRUE, position_after, price
+        FROM trades CROSS JOIN bounds
+        WHERE executed_at >= bounds.start
+        ORDER BY ticker, CAST(executed_at AS DATE), executed_at DESC, id DESC
+    ) w
+    """
+)
+HISTORY_CASH_SQL = text(
+    HISTORY_WINDOW + """
+    SELECT bounds.start, 0, FALSE, (
+        SELECT cash_after FROM trades WHERE executed_at < bounds.start ORDER BY executed_at DESC, id DESC LIMIT 1
+    ) FROM bounds
+    UNION ALL
+    SELECT * FROM (
+        SELECT DISTINCT ON (CAST(executed_at AS DATE))
+               bounds.start, CAST(executed_at AS DATE) - bounds.start, TRUE, cash_after
+        FROM trades CROSS JOIN bounds
+        WHERE executed_at >= bounds.start
+        ORDER BY CAST(executed_at AS DATE), executed_at DESC, id DESC
+    ) w
+    """
+)
+# Last price at or before each held (ticker, day): raw ticks, then daily rollups.
+# Index probes rather than a scan, as the window may hold millions of ticks; tickers
+# never priced (no latest_prices row, which every tick passes through) are skipped.
+HISTORY_PRICES_SQL = text(
+    HISTORY_WINDOW + """
+    SELECT c.i, COALESCE(mp.price, md.close)
+    FROM unnest(CAST(:tickers AS TEXT[]), CAST(:offsets AS INTEGER[])) WITH ORDINALITY AS c(ticker, day, i)
+    CROSS JOIN bounds
+    JOIN latest_prices lp ON lp.ticker = c.ticker
+    LEFT JOIN LATERAL (
+        SELECT price FROM market_prices
+        WHERE ticker = c.ticker AND ts < bounds.start + c.day + 1
+        ORDER BY ts DESC LIMIT 1
+    ) mp ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT close FROM market_prices_daily
+        WHERE ticker = c.ticker AND day <= bounds.start + c.day
+        ORDER BY day DESC LIMIT 1
+    ) md ON TRUE
+    """
+)
+
+def _column(rows: List[Any], i: int) -> np.ndarray:
+    return np.array([np.nan if r[i] is None else float(r[i]) for r in rows], dtype=np.float64)
+
+
+def _events(rows: List[Any], rows_index: np.ndarray, value: int, shape: tuple) -> np.ndarray:
+    """(row, day offset, in_window, *values) events -> row x day matrix, carried forward over days."""
+    matrix = np.full(shape, np.nan)
+    offsets = np.array([r[1] for r in rows], dtype=np.intp)
+    in_window = np.array([r[2] for r in rows], dtype=bool)
+    values = _column(rows, value)
+    # Carry-in first, so a trade on the window's first day overrides it.
+    for mask in (~in_window, in_window):
+        matrix[rows_index[mask], offsets[mask]] = values[mask]
+    last = np.where(np.isnan(matrix), 0, np.arange(shape[1]))
+    np.maximum.accumulate(last, axis=1, out=last)
+    return matrix[np.arange(shape[0])[:, None], last]
+
+
+class PortfolioService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_valuation(self) -> Dict[str, Any]:
+        """Mark-to-market value, realized/unrealized PnL, average cost and allocation per position."""
+        rows = (await self.db.execute(VALUATION_SQL)).fetchall()
+        cash, realized = (await self.db.execute(TOTALS_SQL)).one()
+        cash, realized = float(cash or 0), float(realized)
+
+        quantity = _column(rows, 1)
+        basis_quantity, basis_cost, price = _column(rows, 2), _column(rows, 3), _column(rows, 4)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_cost = np.where(basis_quantity > 0, basis_cost / basis_quantity, np.nan)
+        priced = ~np.isnan(price)
+        mark = np.where(priced, price, avg_cost)
+        market_value = np.nan_to_num(quantity * mark)
+        cost = np.nan_to_num(quantity * avg_cost)
+        unrealized = np.where(np.isnan(avg_cost), 0.0, market_value - cost)
+        invested = float(market_value.sum())
+        equity = cash + invested
+        allocation = market_value / equity * 100 if equity > 0 else np.zeros_like(market_value)
+
+        positions = [
+            {
+                "ticker": rows[i][0],
+                "quantity": float(quantity[i]),
+                "avg_cost": None if np.isnan(avg_cost[i]) else round(float(avg_cost[i]), 6),
+                "price": None if not priced[i] else float(price[i]),
+                "price_ts": rows[i][5],
+                "market_value": round(float(market_value[i]), 2),
+                "unrealized_pnl": round(float(unrealized[i]), 2),
+                "allocation_pct": round(float(allocation[i]), 4),
+            }
+            for i in np.argsort(-market_value, kind="stable")
+        ]
+        return {
+            "cash_available": round(cash, 2),
+            "market_value": round(invested, 2),
+            "equity": round(equity, 2),
+            "cost_basis": round(float(cost.sum()), 2),
+            "realized_pnl": round(realized, 2),
+            "unrealized_pnl": round(float(unrealized.sum()), 2),
+            "cash_allocation_pct": round(cash / equity * 100, 4) if equity > 0 else 0.0,
+            "positions": positions,
+        }
+
+    async def get_history(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Daily cash, market value and equity for the last `days` days, from the first trade on."""
+        cash_rows = (await self.db.execute(HISTORY_CASH_SQL, {"days": days})).fetchall()
+        cash = _events(cash_rows, np.zeros(len(cash_rows), dtype=np.intp), 3, (1, days))[0]
+        traded = ~np.isnan(cash)
+        if not traded.any():
+            return []
+
+        rows = (await self.db.execute(HISTORY_POSITIONS_SQL, {"days": days})).fetchall()
+        market_value = np.zeros(days)
+        if rows:
+            tickers, ticker_index = np.unique([r[0] for r in rows], return_inverse=True)
+            shape = (len(tickers), days)
+            position = _events(rows, ticker_index, 3, shape)
+            price = _events(rows, ticker_index, 4, shape)  # last trade price, the fallback mark
+            held_rows, held_days = np.nonzero(position > 0)
+            if len(held_rows):
+                marks = (await self.db.execute(HISTORY_PRICES_SQL, {
+                    "days": days, "tickers": tickers[held_rows].tolist(), "offsets": held_days.tolist(),
+                })).fetchall()
+                ordinal = np.array([r[0] for r in marks], dtype=np.intp) - 1
+                mark = _column(marks, 1)
+                found = ~np.isnan(mark)
+                price[held_rows[ordinal[found]], held_days[ordinal[found]]] = mark[found]
+            market_value = np.nansum(np.where(position > 0, position * price, 0.0), axis=0)
+
+        start = cash_rows[0][0]
+        day_offsets = np.flatnonzero(traded)
+        equity = (cash + market_value)[day_offsets]
+        change = np.diff(equity, prepend=equity[0])
+        return [
+            {
+                "date": (start + timedelta(days=int(day))).isoformat(),
+                "cash_available": round(float(cash[day]), 2),
+                "market_value": round(float(market_value[day]), 2),
+                "equity": round(float(equity[i]), 2),
+                "change": round(float(change[i]), 2),
+            }
+            for i, day in enumerate(day_offsets)
+        ]
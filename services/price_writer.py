@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from utils.db_helpers import get_engine
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+PRICE_BUFFER_MAX_ROWS = int(os.getenv("PRICE_BUFFER_MAX_ROWS", "50000"))
+PRICE_FLUSH_ROWS = int(os.getenv("PRICE_FLUSH_ROWS", "2000"))
+PRICE_FLUSH_INTERVAL_SEC = float(os.getenv("PRICE_FLUSH_INTERVAL_SEC", "1.0"))
+PRICE_WRITE_MODE = os.getenv("PRICE_WRITE_MODE", "copy")  # copy | insert
+PRICE_SHUTDOWN_TIMEOUT_SEC = float(os.getenv("PRICE_SHUTDOWN_TIMEOUT_SEC", "8"))
+PRICE_RETRY_MAX_SEC = 30.0
+
+PriceRow = Tuple[str, float, datetime, Optional[str]]
+_STOP: Any = object()
+
+
+def write_price_rows(rows: List[PriceRow], mode: str = PRICE_WRITE_MODE):
+    """Write a batch of (ticker, price, ts, source) rows in one round trip."""
+    if not rows:
+        return
+    if mode == "copy":
+        raw = get_engine().raw_connection()
+        try:
+            with raw.cursor() as cur:
+                with cur.copy("COPY market_prices (ticker, price, ts, source) FROM STDIN") as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            raw.commit()
+        finally:
+            raw.close()
+        return
+    # SQLAlchemy turns executemany into multi-row INSERT ... VALUES for psycopg.
+    with get_engine().begin() as conn:
+        conn.execute(
+            text("INSERT INTO market_prices (ticker, price, ts, source) VALUES (:t, :p, :ts, :s)"),
+            [{"t": t, "p": p, "ts": ts, "s": s} for t, p, ts, s in rows],
+        )
+
+
+class PriceWriter:
+    """
+    Write-behind buffer for market_prices. Producers block on submit() once the
+    buffer is full (backpressure); a background task flushes on size or time.
+    """
+
+    def __init__(self, max_rows: int = PRICE_BUFFER_MAX_ROWS, flush_rows: int = PRICE_FLUSH_ROWS,
+                 flush_interval: float = PRICE_FLUSH_INTERVAL_SEC, mode: str = PRICE_WRITE_MODE):
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.mode = mode
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._stats: Dict[str, Any] = {"rows_written": 0, "flushes": 0, "flush_failures": 0, "rows_dropped": 0, "last_flush_ms": None, "last_batch_rows": 0}
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_rows)
+        return self._queue
+
+    @property
+    def stopping(self) -> asyncio.Event:
+        if self._stopping is None:
+            self._stopping = asyncio.Event()
+        return self._stopping
+
+    async def start(self):
+        if self._task is None:
+            self.stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = PRICE_SHUTDOWN_TIMEOUT_SEC):
+        """
+        Flush everything buffered, then stop the background flusher. Never waits
+        longer than `timeout`, even with the buffer full and the DB down; rows a
+        failed flush can't write by then are logged and dropped.
+        """
+        task, self._task = self._task, None
+        if task is None:
+            task = asyncio.create_task(self._run())
+        self.stopping.set()
+        try:
+            # A full buffer needs no sentinel: the flusher exits once it has drained it.
+            self.queue.put_nowait(_STOP)
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error({"event": "price_flush_shutdown_timeout", "rows_unflushed": self.queue.qsize()})
+
+    async def submit(self, ticker: str, price: float, ts: Optional[datetime] = None, source: Optional[str] = None):
+        await self.queue.put((ticker, float(price), ts or datetime.utcnow(), source))
+
+    async def submit_many(self, rows: Iterable[Tuple[str, float]], source: Optional[str] = None, ts: Optional[datetime] = None):
+        ts = ts or datetime.utcnow()
+        for ticker, price in rows:
+            await self.submit(ticker, price, ts=ts, source=source)
+
+    def submit_many_nowait(self, rows: Iterable[Tuple[str, float]], source: Optional[str] = None, ts: Optional[datetime] = None) -> int:
+        """Like submit_many() but never blocks: rows that don't fit are dropped and counted. Returns the number dropped."""
+        ts = ts or datetime.utcnow()
+        dropped = 0
+        for ticker, price in rows:
+            try:
+                self.queue.put_nowait((ticker, float(price), ts, source))
+            except asyncio.QueueFull:
+                dropped += 1
+        if dropped:
+            self._stats["rows_dropped"] += dropped
+            logger.warning({"event": "price_buffer_full", "rows_dropped": dropped, "source": source})
+        return dropped
+
+    def _drain(self, limit: int) -> List[PriceRow]:
+        batch: List[PriceRow] = []
+        while len(batch) < limit:
+            try:
+                row = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if row is _STOP:
+                self.queue.put_nowait(_STOP)
+                break
+            batch.append(row)
+        return batch
+
+    async def _run(self):
+        while True:
+            if self.stopping.is_set() and self.queue.empty():
+                return
+            row = await self.queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_rows:
+                batch.extend(self._drain(self.flush_rows - len(batch)))
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.flush_rows or remaining <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    self.queue.put_nowait(_STOP)
+                    break
+                batch.append(row)
+            await self._flush_with_retry(batch)
+
+    async def _flush_with_retry(self, batch: List[PriceRow]):
+        # Retrying in place keeps the batch out of the queue, so a slow or
+        # unavailable DB fills the buffer and pushes back on producers.
+        delay = 0.5
+        try:
+            while not await self._flush(batch):
+                if self.stopping.is_set():
+                    logger.error({"event": "price_flush_dropped", "rows": len(batch), "reason": "shutdown"})
+                    return
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, PRICE_RETRY_MAX_SEC)
+        except asyncio.CancelledError:
+            logger.error({"event": "price_flush_dropped", "rows": len(batch), "reason": "shutdown_timeout"})
+            raise
+
+    async def _flush(self, batch: List[PriceRow]) -> bool:
+        if not batch:
+            return True
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(write_price_rows, batch, self.mode)
+        except Exception as e:
+            self._stats["flush_failures"] += 1
+            logger.error({"event": "price_flush_failed", "rows": len(batch), "detail": str(e)})
+            return False
+        self._stats["rows_written"] += len(batch)
+        self._stats["flushes"] += 1
+        self._stats["last_batch_rows"] = len(batch)
+        self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "buffered": self.queue.qsize(), "capacity": self.max_rows, "mode": self.mode}
+
+
+price_writer = PriceWriter()
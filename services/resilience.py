@@ -0,0 +1,327 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from services.http_clients import _env_override, get_http_client
+from utils.logging import get_logger
+from utils.metrics import UPSTREAM_ATTEMPT_DURATION, UPSTREAM_REQUEST_DURATION
+
+logger = get_logger(__name__)
+
+# Per-provider retry/breaker/hedging defaults, overridable like the pool settings
+# with HTTP_<PROVIDER>_<SETTING> (e.g. HTTP_COINAPI_MAX_ATTEMPTS=2, HTTP_ML_HEDGE_AFTER=0.5).
+#   attempt_timeout  cap on one attempt; deadline caps the whole call incl. backoff
+#   retry_budget     retries allowed per first attempt (token bucket, at most 10 banked)
+#   breaker_*        consecutive failures that open the circuit, and how long it stays open
+#   hedge_after      idempotent GETs send a second copy after this many seconds (0 = off)
+RESILIENCE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "coinapi": {"max_attempts": 3, "attempt_timeout": 5.0, "deadline": 15.0, "backoff_base": 0.2, "backoff_max": 5.0,
+                "retry_budget": 0.2, "breaker_threshold": 5, "breaker_open_sec": 30.0, "hedge_after": 0.0},
+    "santiment": {"max_attempts": 3, "attempt_timeout": 8.0, "deadline": 15.0, "backoff_base": 0.5, "backoff_max": 5.0,
+                  "retry_budget": 0.2, "breaker_threshold": 5, "breaker_open_sec": 30.0, "hedge_after": 0.0},
+    "yahoo": {"max_attempts": 3, "attempt_timeout": 5.0, "deadline": 15.0, "backoff_base": 0.2, "backoff_max": 5.0,
+              "retry_budget": 0.2, "breaker_threshold": 5, "breaker_open_sec": 30.0, "hedge_after": 0.0},
+    "ml": {"max_attempts": 2, "attempt_timeout": 10.0, "deadline": 30.0, "backoff_base": 0.2, "backoff_max": 2.0,
+           "retry_budget": 0.2, "breaker_threshold": 10, "breaker_open_sec": 15.0, "hedge_after": 0.0},
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRY_BUDGET_CAP = 10.0
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def resilience_config(provider: str) -> Dict[str, Any]:
+    defaults = RESILIENCE_DEFAULTS.get(provider, RESILIENCE_DEFAULTS["ml"])
+    return {key: _env_override(provider, key, value) for key, value in defaults.items()}
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting the provider while its circuit is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} circuit open, retry in {retry_in:.1f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open for `open_sec` -> one half-open probe."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, open_sec: float):
+        self.threshold = threshold
+        self.open_sec = open_sec
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opens = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_in(self) -> float:
+        return max(self._opened_at + self.open_sec - time.monotonic(), 0.0) if self.state == self.OPEN else 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.retry_in() > 0:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+            self.opens += 1
+
+    def release(self):
+        """An attempt was cancelled before it had an outcome; free the probe slot."""
+        self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "opens": self.opens, "retry_in_sec": round(self.retry_in(), 2)}
+
+
+class RetryBudget:
+    """Caps retries (and hedges) to a fraction of first attempts, so retries can't multiply an outage."""
+
+    def __init__(self, ratio: float, cap: float = RETRY_BUDGET_CAP):
+        self.ratio = ratio
+        self.cap = cap
+        self.tokens = cap
+
+    def deposit(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    raw = resp.headers.get("Retry-After")
+    if not raw:
+        return None
+    try:
+        return max(float(raw), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(raw)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _failed(resp: httpx.Response) -> bool:
+    return resp.status_code >= 500
+
+
+class ResilientClient:
+    """Retries, circuit breaking and optional hedging around one provider's pooled client."""
+
+    def __init__(self, provider: str, config: Optional[Dict[str, Any]] = None):
+        self.provider = provider
+        self.config = config or resilience_config(provider)
+        self.breaker = CircuitBreaker(int(self.config["breaker_threshold"]), self.config["breaker_open_sec"])
+        self.budget = RetryBudget(self.config["retry_budget"])
+        self.stats = {
+            "requests": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+            "short_circuited": 0, "budget_exhausted": 0, "failures": 0,
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, base * 2^(n-1)], capped.
+        return random.uniform(0, min(self.config["backoff_max"], self.config["backoff_base"] * 2 ** (attempt - 1)))
+
+    async def _attempt(self, method: str, url: str, acquire: Optional[Callable[..., Awaitable[Any]]],
+                       timeout: float, kwargs: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        started = None
+        try:
+            if acquire is not None:
+                waiting = time.perf_counter()
+                await acquire(timeout=timeout)
+                # The token wait is part of this attempt, so the call's deadline still holds.
+                timeout = max(timeout - (time.perf_counter() - waiting), 0.001)
+            self.stats["attempts"] += 1
+            started = time.perf_counter()
+            client = get_http_client(self.provider)
+            if stream:
+                # Only the headers are awaited here; the caller reads (and closes) the body.
+                call = client.send(client.build_request(method, url, timeout=timeout, **kwargs), stream=True)
+            else:
+                call = client.request(method, url, timeout=timeout, **kwargs)
+            resp = await asyncio.wait_for(call, timeout)
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            self.breaker.record_failure()
+            if started is not None:
+                outcome = "timeout" if isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)) else "error"
+                UPSTREAM_ATTEMPT_DURATION.observe(time.perf_counter() - started, self.provider, outcome)
+            raise
+        except BaseException:
+            # Cancelled, or no rate-limit token in time: no verdict on the provider.
+            self.breaker.release()
+            raise
+        UPSTREAM_ATTEMPT_DURATION.observe(time.perf_counter() - started, self.provider, f"{resp.status_code // 100}xx")
+        # 429 means we're being throttled, not that the provider is unhealthy.
+        if _failed(resp):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return resp
+
+    async def _send(self, method: str, url: str, acquire, timeout: float, hedge: bool, kwargs: Dict[str, Any],
+                    stream: bool = False) -> httpx.Response:
+        hedge_after = self.config["hedge_after"]
+        if not hedge or hedge_after <= 0 or hedge_after >= timeout:
+            return await self._attempt(method, url, acquire, timeout, kwargs, stream)
+        first = asyncio.ensure_future(self._attempt(method, url, acquire, timeout, kwargs))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done or not self.breaker.allow():
+            return await first
+        if not self.budget.withdraw():
+            self.stats["budget_exhausted"] += 1
+            return await first
+        self.stats["hedges"] += 1
+        second = asyncio.ensure_future(self._attempt(method, url, acquire, timeout - hedge_after, kwargs))
+        pending = {first, second}
+        outcome: Optional[asyncio.Future] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    outcome = task
+                    if task.exception() is None and not _failed(task.result()) and task.result().status_code != 429:
+                        if task is second:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            # Both failed: surface the later outcome.
+            return outcome.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def request(self, method: str, url: str, *, acquire: Optional[Callable[..., Awaitable[Any]]] = None,
+                      idempotent: Optional[bool] = None, stream: bool = False, **kwargs: Any) -> httpx.Response:
+        """
+        Send with retries and return a successful response; the last error
+        (httpx.HTTPStatusError / transport error / timeout) is raised otherwise.
+        `acquire(timeout=...)` runs before every attempt (e.g. a rate-limiter
+        token) and is given the attempt's timeout, but not while the circuit is open. With `stream=True` the body is left unread
+        (retries cover failures up to the response headers, never hedged) and
+        the caller must close the response.
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            resp = await self._request(method.upper(), url, acquire, idempotent, stream, kwargs)
+            outcome = "ok"
+            return resp
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        finally:
+            UPSTREAM_REQUEST_DURATION.observe(time.perf_counter() - started, self.provider, outcome)
+
+    async def _request(self, method: str, url: str, acquire, idempotent: Optional[bool], stream: bool,
+                       kwargs: Dict[str, Any]) -> httpx.Response:
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        cfg = self.config
+        deadline = time.monotonic() + cfg["deadline"]
+        self.stats["requests"] += 1
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.breaker.allow():
+                self.stats["short_circuited"] += 1
+                raise CircuitOpenError(self.provider, self.breaker.retry_in())
+            timeout = min(cfg["attempt_timeout"], max(deadline - time.monotonic(), 0.001))
+            retry_after = None
+            try:
+                resp = await self._send(method, url, acquire, timeout, idempotent and not stream, kwargs, stream)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                error: BaseException = e
+                # Without idempotency only retry when the request never reached the server.
+                retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+            else:
+                if stream and resp.is_error:
+                    await resp.aclose()
+                if resp.status_code not in RETRYABLE_STATUS:
+                    resp.raise_for_status()
+                    return resp
+                try:
+                    resp.raise_for_status()
+                except httpx.HTTPStatusError as e:
+                    error = e
+                retry_after = _retry_after(resp)
+                retryable = idempotent or resp.status_code == 429
+
+            delay = self._backoff(attempt)
+            if retry_after is not None:
+                delay = retry_after + delay / 2
+            if not retryable or attempt >= cfg["max_attempts"] or time.monotonic() + delay >= deadline:
+                self.stats["failures"] += 1
+                raise error
+            if not self.budget.withdraw():
+                self.stats["budget_exhausted"] += 1
+                self.stats["failures"] += 1
+                raise error
+            self.stats["retries"] += 1
+            logger.info({"event": "upstream_retry", "provider": self.provider, "attempt": attempt,
+                         "delay_sec": round(delay, 3), "error": str(error) or type(error).__name__})
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "breaker": self.breaker.snapshot(), "retry_budget_tokens": round(self.budget.tokens, 2), "config": self.config}
+
+
+_clients: Dict[str, ResilientClient] = {}
+
+
+def get_resilient_client(provider: str) -> ResilientClient:
+    client = _clients.get(provider)
+    if client is None:
+        client = _clients[provider] = ResilientClient(provider)
+    return client
+
+
+async def resilient_request(provider: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    return await get_resilient_client(provider).request(method, url, **kwargs)
+
+
+def circuit_open(provider: str) -> bool:
+    client = _clients.get(provider)
+    return client is not None and client.breaker.retry_in() > 0
+
+
+def resilience_stats(provider: Optional[str] = None) -> Dict[str, Any]:
+    if provider is not None:
+        return {provider: get_resilient_client(provider).snapshot()}
+    return {name: client.snapshot() for name, client in _clients.items()}
@@ -1,22 +1,31 @@
 import os
-import httpx
+from typing import Optional
+
+from services.resilience import resilient_request
 from utils.rate_limit import MultiRateLimiter
 
-SANTIMENT_BASE = "https://api.santiment.net"
+SANTIMENT_BASE = os.getenv("SANTIMENT_BASE", "https://api.santiment.net")
 
 rate_limiter = MultiRateLimiter({
-    "santiment": {"rate_per_sec": 0.5, "burst": 2},  # Example limits
+    "santiment": {
+        # Example limits
+        "rate_per_sec": float(os.getenv("RATE_LIMIT_SANTIMENT_PER_SEC", "0.5")),
+        "burst": int(os.getenv("RATE_LIMIT_SANTIMENT_BURST", "2")),
+        "daily_quota": int(os.getenv("QUOTA_SANTIMENT_DAILY", "0")),
+        "monthly_quota": int(os.getenv("QUOTA_SANTIMENT_MONTHLY", "0")),
+    },
 })
 
 class SantimentClient:
     def __init__(self):
         self.api_key = os.getenv("SANTIMENT_API_KEY", "")
 
+    @staticmethod
+    async def _acquire(timeout: Optional[float] = None):
+        await rate_limiter.acquire("santiment", timeout=timeout)
+
     async def fetch_social_volume(self, ticker: str):
-        await rate_limiter.acquire("santiment")
         headers = {"Authorization": f"Apikey {self.api_key}"}
         url = f"{SANTIMENT_BASE}/labs/sanapi/social_volume?slug={ticker}"
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(url, headers=headers)
-            resp.raise_for_status()
-            return resp.json()
\ No newline at end of file
+        resp = await resilient_request("santiment", "GET", url, headers=headers, acquire=self._acquire)
+        return resp.json()
\ No newline at end of file
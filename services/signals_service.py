@@ -1,21 +1,132 @@
+import asyncio
 import os
-import httpx
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import text
+
+from services.market_stream import hub
+from services.resilience import resilient_request
+from utils.db_helpers import get_async_session
+from utils.logging import get_logger
+from utils.streaming import NDJSON_MEDIA_TYPE, split_json_array, split_ndjson
+from utils.ttl_cache import AsyncTTLCache
+
+logger = get_logger(__name__)
 
 ML_SERVICE_BASE = os.getenv("ML_SERVICE_BASE", "http://ml:8080")
+# Scores only change when the model rescoring runs, so identical requests share one ML call.
+SIGNALS_CACHE_TTL_SEC = float(os.getenv("SIGNALS_CACHE_TTL_SEC", "30"))
+# Past the TTL an entry is still served this long while it refreshes in the background.
+SIGNALS_CACHE_STALE_SEC = float(os.getenv("SIGNALS_CACHE_STALE_SEC", "300"))
+SIGNALS_CACHE_MAX_ENTRIES = int(os.getenv("SIGNALS_CACHE_MAX_ENTRIES", "512"))
+# NOTIFY'd after a retrain so every instance drops its cached scores.
+SIGNALS_CHANNEL = "signals_changed"
+
+# How often scores are re-read for stream subscribers (0 disables); loads go through the cache.
+SIGNALS_STREAM_REFRESH_SEC = float(os.getenv("SIGNALS_STREAM_REFRESH_SEC", str(SIGNALS_CACHE_TTL_SEC)))
+
+signal_cache = AsyncTTLCache(ttl=SIGNALS_CACHE_TTL_SEC, max_entries=SIGNALS_CACHE_MAX_ENTRIES, stale_ttl=SIGNALS_CACHE_STALE_SEC)
+
+
+def invalidate_signals(*_):
+    signal_cache.invalidate()
+
+
+def publish_signals(signals: Any):
+    """Push each ticker's newest score to stream subscribers; scores already sent are skipped."""
+    if not isinstance(signals, list):
+        return
+    newest: Dict[str, Dict[str, Any]] = {}
+    for item in signals:
+        if isinstance(item, dict) and item.get("ticker"):
+            current = newest.get(item["ticker"])
+            if current is None or str(item.get("date", "")) >= str(current.get("date", "")):
+                newest[item["ticker"]] = item
+    hub.publish("signal", newest.values(), only_changed=True)
+
+
+class SignalStreamRefresher:
+    """
+    Re-reads the latest scores (through the shared cache) while this instance
+    has signal subscribers, so they get new scores without anyone polling /signals.
+    """
+
+    def __init__(self, interval: float = SIGNALS_STREAM_REFRESH_SEC):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not hub.has_subscribers("signal"):
+                continue
+            try:
+                await SignalsService().fetch_signals(ticker=None, lookback_days=1)
+            except Exception as e:
+                logger.warning({"event": "signals_stream_refresh_failed", "detail": str(e)})
+
 
 class SignalsService:
     async def fetch_signals(self, ticker: Optional[str], lookback_days: int = 7):
+        return await signal_cache.get_or_load((ticker or None, lookback_days), lambda: self._fetch_signals(ticker, lookback_days))
+
+    async def _fetch_signals(self, ticker: Optional[str], lookback_days: int):
+        params: dict = {"lookback_days": lookback_days}
+        if ticker:
+            params["ticker"] = str(ticker)
+        resp = await resilient_request("ml", "GET", f"{ML_SERVICE_BASE}/signals", params=params)
+        signals = resp.json()
+        publish_signals(signals)
+        return signals
+
+    async def stream_signals(self, ticker: Optional[str], lookback_days: int = 7) -> AsyncIterator[List[bytes]]:
+        """
+        Proxy the ML response incrementally as raw JSON items (batches per upstream
+        read), without the cache: it would need the whole list in memory. Waits for
+        the response headers before returning, so upstream errors raise here.
+        """
         params: dict = {"lookback_days": lookback_days}
         if ticker:
             params["ticker"] = str(ticker)
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(f"{ML_SERVICE_BASE}/signals", params=params)
-            resp.raise_for_status()
-            return resp.json()
+        resp = await resilient_request(
+            "ml", "GET", f"{ML_SERVICE_BASE}/signals", params=params, stream=True,
+            headers={"Accept": f"{NDJSON_MEDIA_TYPE}, application/json;q=0.9"},
+        )
+        split = split_ndjson if resp.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE) else split_json_array
+
+        async def items() -> AsyncIterator[List[bytes]]:
+            try:
+                async for batch in split(resp.aiter_bytes()):
+                    yield batch
+            finally:
+                await resp.aclose()
+
+        return items()
 
     async def trigger_retraining(self):
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post(f"{ML_SERVICE_BASE}/admin/retrain")
-            resp.raise_for_status()
-            return resp.json()
\ No newline at end of file
+        resp = await resilient_request("ml", "POST", f"{ML_SERVICE_BASE}/admin/retrain")
+        invalidate_signals()
+        try:
+            async with get_async_session() as db:
+                await db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": SIGNALS_CHANNEL})
+                await db.commit()
+        except Exception as e:
+            # Other instances fall back to their TTL.
+            logger.warning({"event": "signals_notify_failed", "detail": str(e)})
+        return resp.json()
+
+
+signal_stream_refresher = SignalStreamRefresher()
@@ -1,52 +1,197 @@
-from typing import Dict
-from utils.db_helpers import get_db_session
+import time
+from typing import Dict, List, Optional
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.db_helpers import get_async_session
+from services.market_cache import latest_price_cache, trade_rules_cache
+from services.trade_rules import TradeRules, apply_order
 from utils.logging import get_logger
+from utils.portfolio_storage import apply_fill
+from utils.metrics import DB_TRANSACTION_DURATION
 
 logger = get_logger(__name__)
 
+DEFAULT_PRICE = 100.0  # placeholder when no market price has been ingested yet
+
+# Every trade locks the portfolio row first, so all cash/position changes are
+# serialized on it and positions can be read and rewritten safely afterwards.
+LOCK_PORTFOLIO_SQL = text("SELECT id, cash_available FROM portfolio ORDER BY id LIMIT 1 FOR UPDATE")
+
+# Position, cost basis (utils/portfolio_storage.apply_fill, in SQL) and the trade
+# row with its position/cash snapshot, in one statement. :amount is the cash
+# spent (buy) or received (sell).
+BUY_SQL = text(
+    """
+    WITH pos AS (
+        INSERT INTO positions (ticker, quantity) VALUES (:t, :q)
+        ON CONFLICT (ticker) DO UPDATE SET quantity = positions.quantity + EXCLUDED.quantity
+        RETURNING quantity
+    ), basis AS (
+        INSERT INTO cost_basis (ticker, quantity, cost) VALUES (:t, :q, :amount)
+        ON CONFLICT (ticker) DO UPDATE
+            SET quantity = cost_basis.quantity + EXCLUDED.quantity, cost = cost_basis.cost + EXCLUDED.cost, updated_at = NOW()
+    )
+    INSERT INTO trades (ticker, action, quantity, price, position_after, cash_after)
+    SELECT :t, 'buy', :q, :p, quantity, :cash FROM pos
+    """
+)
+SELL_SQL = text(
+    """
+    WITH pos AS (
+        UPDATE positions SET quantity = GREATEST(positions.quantity - :q, 0) WHERE ticker = :t
+        RETURNING quantity
+    ), basis AS (
+        UPDATE cost_basis SET
+            quantity = quantity - LEAST(:q, quantity),
+            cost = cost - cost * LEAST(:q, quantity) / quantity,
+            realized_pnl = realized_pnl + (:amount / :q - cost / quantity) * LEAST(:q, quantity),
+            updated_at = NOW()
+        WHERE ticker = :t AND quantity > 0 AND :q > 0
+    )
+    INSERT INTO trades (ticker, action, quantity, price, position_after, cash_after)
+    VALUES (:t, 'sell', :q, :p, COALESCE((SELECT quantity FROM pos), 0), :cash)
+    """
+)
+UPSERT_COST_BASIS_SQL = text(
+    """
+    INSERT INTO cost_basis (ticker, quantity, cost, realized_pnl)
+    SELECT * FROM unnest(CAST(:tickers AS TEXT[]), CAST(:quantities AS NUMERIC[]),
+                         CAST(:costs AS NUMERIC[]), CAST(:realized AS NUMERIC[]))
+    ON CONFLICT (ticker) DO UPDATE
+        SET quantity = EXCLUDED.quantity, cost = EXCLUDED.cost, realized_pnl = EXCLUDED.realized_pnl, updated_at = NOW()
+    """
+)
+
 class TradeExecutor:
+    def __init__(self, db: Optional[AsyncSession] = None):
+        # Routers pass the request-scoped session; otherwise one is opened per call.
+        self.db = db
+
     async def execute_trade(self, ticker: str, action: str, quantity: float) -> Dict:
         """Execute paper trades applying rules from Cloud SQL, and update portfolio."""
-        with get_db_session() as db:
-            # Fetch current portfolio and rules
-            rules = db.execute(text("SELECT key, value FROM trade_rules")).fetchall()
-            rules_map = {r[0]: float(r[1]) for r in rules}
-            max_alloc_pct = float(rules_map.get("max_allocation_pct", 5.0))
-            slippage_pct = float(rules_map.get("slippage_pct", 0.1))
-            fees_pct = float(rules_map.get("fees_pct", 0.05))
-
-            portfolio = db.execute(text("SELECT cash_available FROM portfolio LIMIT 1")).fetchone()
-            cash_available = float(portfolio[0]) if portfolio else 20000.0
-
-            # Fetch last price from a market data table (or external source placeholder)
-            price_row = db.execute(text("SELECT price FROM market_prices WHERE ticker=:t ORDER BY ts DESC LIMIT 1"), {"t": ticker}).fetchone()
-            price = float(price_row[0]) if price_row else 100.0
-
-            # Calculate cost with slippage and fees
-            direction = 1 if action == "buy" else -1
-            trade_cost = price * quantity * (1 + slippage_pct/100 + fees_pct/100) if direction == 1 else price * quantity
-
-            # Enforce max allocation
-            max_alloc_value = cash_available * (max_alloc_pct / 100.0)
-            if direction == 1 and trade_cost > max_alloc_value:
-                trade_cost = max_alloc_value
-                quantity = max(trade_cost / price, 0)
-
-            # Update cash and positions (simplified)
-            if direction == 1:
-                new_cash = max(cash_available - trade_cost, 0)
-                db.execute(text("UPDATE portfolio SET cash_available=:c"), {"c": new_cash})
-                db.execute(text("INSERT INTO positions (ticker, quantity) VALUES (:t, :q) ON CONFLICT (ticker) DO UPDATE SET quantity = positions.quantity + EXCLUDED.quantity"), {"t": ticker, "q": quantity})
-            else:
-                proceeds = price * quantity * (1 - fees_pct/100)
-                new_cash = cash_available + proceeds
-                db.execute(text("UPDATE portfolio SET cash_available=:c"), {"c": new_cash})
-                db.execute(text("UPDATE positions SET quantity = GREATEST(positions.quantity - :q, 0) WHERE ticker=:t"), {"t": ticker, "q": quantity})
-
-            # Log trade
-            db.execute(text("INSERT INTO trades (ticker, action, quantity, price) VALUES (:t, :a, :q, :p)"), {"t": ticker, "a": action, "q": quantity, "p": price})
-            db.commit()
-
-            logger.info({"event": "trade_executed", "ticker": ticker, "action": action, "qty": quantity, "price": price})
-            return {"ticker": ticker, "action": action, "quantity": quantity, "price": price, "cash_available": new_cash}
\ No newline at end of file
+        if self.db is not None:
+            return await self._execute_trade(self.db, ticker, action, quantity)
+        async with get_async_session() as db:
+            return await self._execute_trade(db, ticker, action, quantity)
+
+    async def execute_batch(self, orders: List[Dict]) -> Dict:
+        """Execute orders in sequence within one transaction: one rules/price read, set-based writes."""
+        if self.db is not None:
+            return await self._execute_batch(self.db, orders)
+        async with get_async_session() as db:
+            return await self._execute_batch(db, orders)
+
+    async def _execute_trade(self, db: AsyncSession, ticker: str, action: str, quantity: float) -> Dict:
+        # Rules and last price come from process-local caches (see services/market_cache)
+        rules = TradeRules.from_map(await trade_rules_cache.get())
+
+        cached_price = await latest_price_cache.get(ticker)
+        price = cached_price if cached_price is not None else DEFAULT_PRICE
+
+        try:
+            started = time.perf_counter()
+            portfolio = (await db.execute(LOCK_PORTFOLIO_SQL)).fetchone()
+            portfolio_id = portfolio[0] if portfolio else None
+            cash_available = float(portfolio[1]) if portfolio else 20000.0
+
+            quantity, new_cash = apply_order(action, quantity, price, cash_available, rules)
+
+            # Update cash, then position, cost basis and trade log in one statement
+            await db.execute(text("UPDATE portfolio SET cash_available=:c WHERE id=:id"), {"c": new_cash, "id": portfolio_id})
+            await db.execute(BUY_SQL if action == "buy" else SELL_SQL, {
+                "t": ticker, "q": quantity, "p": price, "amount": abs(new_cash - cash_available), "cash": new_cash,
+            })
+            await db.commit()
+            DB_TRANSACTION_DURATION.observe(time.perf_counter() - started, "trade")
+        except Exception:
+            await db.rollback()
+            raise
+
+        logger.info({"event": "trade_executed", "ticker": ticker, "action": action, "qty": quantity, "price": price})
+        return {"ticker": ticker, "action": action, "quantity": quantity, "price": price, "cash_available": new_cash}
+
+    async def _execute_batch(self, db: AsyncSession, orders: List[Dict]) -> Dict:
+        rules = TradeRules.from_map(await trade_rules_cache.get())
+
+        tickers = [o["ticker"] for o in orders]
+        prices = await latest_price_cache.get_many(tickers)
+
+        try:
+            started = time.perf_counter()
+            portfolio = (await db.execute(LOCK_PORTFOLIO_SQL)).fetchone()
+            portfolio_id = portfolio[0] if portfolio else None
+            cash = float(portfolio[1]) if portfolio else 20000.0
+            held_rows = (await db.execute(
+                text(
+                    """
+                    SELECT t.ticker, p.quantity, cb.quantity, cb.cost, cb.realized_pnl
+                    FROM unnest(CAST(:tickers AS TEXT[])) AS t(ticker)
+                    LEFT JOIN positions p USING (ticker)
+                    LEFT JOIN cost_basis cb USING (ticker)
+                    """
+                ), {"tickers": list(dict.fromkeys(tickers))}
+            )).fetchall()
+            held = {r[0]: float(r[1]) for r in held_rows if r[1] is not None}
+            existing = set(held)
+            basis = {r[0]: (float(r[2]), float(r[3]), float(r[4])) for r in held_rows if r[2] is not None}
+
+            results = []
+            positions_after = []
+            for order in orders:
+                ticker, action = order["ticker"], order["action"]
+                price = prices.get(ticker, DEFAULT_PRICE)
+                cash_before = cash
+                quantity, cash = apply_order(action, float(order["quantity"]), price, cash, rules)
+                current = held.get(ticker, 0.0)
+                held[ticker] = current + quantity if action == "buy" else max(current - quantity, 0.0)
+                if action == "buy" or ticker in basis:
+                    basis[ticker] = apply_fill(basis.get(ticker, (0.0, 0.0, 0.0)), action, quantity, abs(cash - cash_before))
+                positions_after.append(held[ticker])
+                results.append({"ticker": ticker, "action": action, "quantity": quantity, "price": price, "cash_available": cash})
+
+            # Like the single-trade path, selling an unheld ticker doesn't create a position row.
+            touched = [t for t in dict.fromkeys(tickers) if t in existing or held[t] > 0]
+            await db.execute(text("UPDATE portfolio SET cash_available=:c WHERE id=:id"), {"c": cash, "id": portfolio_id})
+            await db.execute(
+                text(
+                    """
+                    INSERT INTO positions (ticker, quantity)
+                    SELECT * FROM unnest(CAST(:tickers AS TEXT[]), CAST(:quantities AS NUMERIC[]))
+                    ON CONFLICT (ticker) DO UPDATE SET quantity = EXCLUDED.quantity
+                    """
+                ),
+                {"tickers": touched, "quantities": [held[t] for t in touched]},
+            )
+            basis_tickers = [t for t in dict.fromkeys(tickers) if t in basis]
+            await db.execute(UPSERT_COST_BASIS_SQL, {
+                "tickers": basis_tickers,
+                "quantities": [basis[t][0] for t in basis_tickers],
+                "costs": [basis[t][1] for t in basis_tickers],
+                "realized": [basis[t][2] for t in basis_tickers],
+            })
+            await db.execute(
+                text(
+                    """
+                    INSERT INTO trades (ticker, action, quantity, price, position_after, cash_after)
+                    SELECT * FROM unnest(CAST(:tickers AS TEXT[]), CAST(:actions AS TEXT[]),
+                                         CAST(:quantities AS NUMERIC[]), CAST(:prices AS NUMERIC[]),
+                                         CAST(:positions AS NUMERIC[]), CAST(:cash AS NUMERIC[]))
+                    """
+                ),
+                {
+                    "tickers": [r["ticker"] for r in results],
+                    "actions": [r["action"] for r in results],
+                    "quantities": [r["quantity"] for r in results],
+                    "prices": [r["price"] for r in results],
+                    "positions": positions_after,
+                    "cash": [r["cash_available"] for r in results],
+                },
+            )
+            await db.commit()
+            DB_TRANSACTION_DURATION.observe(time.perf_counter() - started, "batch")
+        except Exception:
+            await db.rollback()
+            raise
+
+        logger.info({"event": "trade_batch_executed", "orders": len(results), "tickers": len(touched), "cash_available": cash})
+        return {"trades": results, "cash_available": cash}
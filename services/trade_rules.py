@@ -0,0 +1,52 @@
+from dataclasses import dataclass, fields
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class TradeRules:
+    """Allocation, slippage and fee rules (the trade_rules table), in percent."""
+
+    max_allocation_pct: float = 5.0
+    slippage_pct: float = 0.1
+    fees_pct: float = 0.05
+
+    @classmethod
+    def from_map(cls, rules: Dict[str, float]) -> "TradeRules":
+        return cls(**{f.name: float(rules.get(f.name, f.default)) for f in fields(cls)})
+
+
+def apply_order(action: str, quantity: float, price: float, cash_available: float, rules: TradeRules) -> Tuple[float, float]:
+    """Return (filled quantity, new cash) for one order against the current cash balance."""
+    # Calculate cost with slippage and fees
+    direction = 1 if action == "buy" else -1
+    trade_cost = price * quantity * (1 + rules.slippage_pct/100 + rules.fees_pct/100) if direction == 1 else price * quantity
+
+    # Enforce max allocation
+    max_alloc_value = cash_available * (rules.max_allocation_pct / 100.0)
+    if direction == 1 and trade_cost > max_alloc_value:
+        trade_cost = max_alloc_value
+        quantity = max(trade_cost / price, 0)
+
+    if direction == 1:
+        return quantity, max(cash_available - trade_cost, 0)
+    proceeds = price * quantity * (1 - rules.fees_pct/100)
+    return quantity, cash_available + proceeds
+
+
+def sale_proceeds(quantities: np.ndarray, prices: np.ndarray, rules: TradeRules) -> np.ndarray:
+    """Cash received per sell order; apply_order's sell arithmetic over arrays."""
+    return prices * quantities * (1 - rules.fees_pct/100)
+
+
+def allocation_buys(prices: np.ndarray, cash_available: float, rules: TradeRules) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (quantities, cash spent) for buy orders executed in sequence, each sized to
+    spend exactly max_allocation_pct of the cash left, slippage and fees
+    included: the largest order apply_order fills without capping. The
+    sequence has a closed form, cash * a * (1 - a)**i for the i-th order.
+    """
+    a = rules.max_allocation_pct / 100.0
+    spent = cash_available * a * (1 - a) ** np.arange(len(prices))
+    return spent / (prices * (1 + rules.slippage_pct/100 + rules.fees_pct/100)), spent
@@ -1,17 +1,33 @@
-import httpx
+import os
+from typing import Dict, List, Optional
+from services.resilience import resilient_request
 from utils.rate_limit import MultiRateLimiter
 
-YAHOO_BASE = "https://query1.finance.yahoo.com"
+YAHOO_BASE = os.getenv("YAHOO_BASE", "https://query1.finance.yahoo.com")
 
 rate_limiter = MultiRateLimiter({
-    "yahoo": {"rate_per_sec": 2.0, "burst": 10},  # Example limits
+    "yahoo": {
+        # Example limits
+        "rate_per_sec": float(os.getenv("RATE_LIMIT_YAHOO_PER_SEC", "2.0")),
+        "burst": int(os.getenv("RATE_LIMIT_YAHOO_BURST", "10")),
+        "daily_quota": int(os.getenv("QUOTA_YAHOO_DAILY", "0")),
+        "monthly_quota": int(os.getenv("QUOTA_YAHOO_MONTHLY", "0")),
+    },
 })
 
 class YahooClient:
+    @staticmethod
+    async def _acquire(timeout: Optional[float] = None):
+        await rate_limiter.acquire("yahoo", timeout=timeout)
+
     async def fetch_quote(self, ticker: str):
-        await rate_limiter.acquire("yahoo")
         url = f"{YAHOO_BASE}/v7/finance/quote?symbols={ticker}"
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            return resp.json()
\ No newline at end of file
+        resp = await resilient_request("yahoo", "GET", url, acquire=self._acquire)
+        return resp.json()
+
+    async def fetch_quotes(self, tickers: List[str]) -> Dict[str, dict]:
+        """Quotes for several symbols in one /v7/finance/quote call, keyed by symbol."""
+        resp = await resilient_request("yahoo", "GET", f"{YAHOO_BASE}/v7/finance/quote", params={"symbols": ",".join(tickers)}, acquire=self._acquire)
+        quotes = (resp.json().get("quoteResponse") or {}).get("result") or []
+        by_symbol = {q.get("symbol"): q for q in quotes}
+        return {ticker: by_symbol.get(ticker) for ticker in tickers}
\ No newline at end of file
@@ -1,26 +1,150 @@
+import atexit
 import json
 import logging
+import logging.handlers
 import os
-from typing import Any, Dict
+import queue
+import random
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+# Records are queued by the calling thread and formatted/written by a background
+# listener thread; when the queue is full records are dropped (and counted).
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Per-event sampling of INFO/DEBUG dict records, e.g. "trade_executed=0.1,upstream_retry=0.25".
+# Kept records carry "sample_rate" so counts can be scaled back up. Warnings and errors are never sampled.
+LOG_SAMPLE_RATES: Dict[str, float] = {
+    event.strip(): float(rate)
+    for event, _, rate in (item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(","))
+    if event.strip() and rate.strip()
+}
+GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+trace_id_var: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+_RESERVED = ("level", "logger")
+stats = {"dropped": 0, "sampled_out": 0}
+
+
+def _dumps(payload: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, default=str)
+
+
+def bind_request_context(request_id: Optional[str] = None, trace_header: Optional[str] = None) -> str:
+    """Set the request ID (and Cloud Trace ID from X-Cloud-Trace-Context) for log records in this context."""
+    request_id = request_id or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    trace_id_var.set(trace_header.split("/", 1)[0] if trace_header else None)
+    return request_id
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
-        payload: Dict[str, Any] = {
-            "level": record.levelname,
-            "message": record.getMessage(),
-            "logger": record.name,
-        }
+        payload: Dict[str, Any] = {}
+        if isinstance(record.msg, dict):
+            # logger.info({"event": ...}) becomes top-level fields rather than a str()-ed message.
+            payload.update(record.msg)
+            payload.setdefault("message", record.msg.get("event", ""))
+        else:
+            payload["message"] = record.getMessage()
+        payload["level"] = record.levelname
+        payload["logger"] = record.name
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            payload["trace_id"] = trace_id
+            if GCP_PROJECT_ID:
+                payload["logging.googleapis.com/trace"] = f"projects/{GCP_PROJECT_ID}/traces/{trace_id}"
         if record.exc_info:
-            payload["exception"] = self.formatException(record.exc_info)
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
         if hasattr(record, "extra_data"):
-            payload.update(getattr(record, "extra_data"))
-        return json.dumps(payload)
+            payload.update({k: v for k, v in getattr(record, "extra_data").items() if k not in _RESERVED})
+        return _dumps(payload)
+
+
+class SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, dict):
+            return True
+        rate = LOG_SAMPLE_RATES.get(record.msg.get("event"))
+        if rate is None or rate >= 1.0:
+            return True
+        if random.random() >= rate:
+            stats["sampled_out"] += 1
+            return False
+        record.msg = {**record.msg, "sample_rate": rate}
+        return True
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """Captures request context on the calling thread; formatting happens on the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records are created per call and only this handler sees them first, so no copy.
+        record.request_id = request_id_var.get()
+        record.trace_id = trace_id_var.get()
+        if isinstance(record.msg, dict):
+            record.msg = dict(record.msg)
+        if record.exc_info:
+            # Tracebacks reference live frames; render them before handing off.
+            record.exc_text = _formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats["dropped"] += 1
+
+
+_formatter = JsonFormatter()
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+_queue_handler = ContextQueueHandler(_queue)
+_queue_handler.addFilter(SamplingFilter())
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(_formatter)
+_listener = logging.handlers.QueueListener(_queue, _stream_handler, respect_handler_level=True)
+_listener_started = False
+
+
+def _start_listener():
+    global _listener_started
+    if not _listener_started:
+        _listener.start()
+        _listener_started = True
+        # Flush whatever is still queued at interpreter exit.
+        atexit.register(stop_listener)
+
+
+def stop_listener():
+    global _listener_started
+    if _listener_started:
+        _listener.stop()
+        _listener_started = False
+
 
 def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.handlers:
-        handler = logging.StreamHandler()
-        handler.setFormatter(JsonFormatter())
-        logger.addHandler(handler)
+        _start_listener()
+        logger.addHandler(_queue_handler)
     logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
-    return logger
\ No newline at end of file
+    return logger
+
+
+def log_stats() -> Dict[str, Any]:
+    return {**stats, "queued": _queue.qsize(), "queue_size": LOG_QUEUE_SIZE, "sample_rates": LOG_SAMPLE_RATES, "encoder": "orjson" if orjson else "json"}
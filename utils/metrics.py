@@ -0,0 +1,170 @@
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+# Minimal in-process metrics registry rendered in the Prometheus text format
+# (GET /metrics). Observations are plain dict/list updates so recording costs
+# well under a microsecond; they are not thread-safe, so observe from the event
+# loop or under a lock (see BigQueryClient._run_query).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_label_str(self.labelnames, k)} {v}" for k, v in self._values.items())
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = buckets
+        # Per label set: non-cumulative bucket counts (last slot is +Inf), then sum, then count.
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class GaugeCallback:
+    """Gauge read at scrape time from an existing stats function (pool occupancy etc.)."""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], collect: Callable[[], Iterable[Tuple[Labels, Any]]]):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines.extend(f"{self.name}{_label_str(self.labelnames, k)} {float(v)}" for k, v in self.collect() if v is not None)
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help: str, labelnames: Tuple[str, ...], collect) -> GaugeCallback:
+        return self._register(GaugeCallback(name, help, labelnames, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Status is a label here rather than a separate counter: _count already gives responses per status.
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by route template and status code", ("method", "route", "status"))
+UPSTREAM_ATTEMPT_DURATION = metrics.histogram(
+    "upstream_attempt_duration_seconds", "Latency of single provider HTTP attempts", ("provider", "outcome"))
+UPSTREAM_REQUEST_DURATION = metrics.histogram(
+    "upstream_request_duration_seconds", "Provider call latency including retries and backoff", ("provider", "outcome"))
+DB_TRANSACTION_DURATION = metrics.histogram(
+    "db_transaction_duration_seconds", "Trade transaction latency (lock through commit)", ("operation",))
+BIGQUERY_QUERY_DURATION = metrics.histogram(
+    "bigquery_query_duration_seconds", "BigQuery job latency including result fetch", ("outcome",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+RATE_LIMIT_WAIT = metrics.histogram(
+    "rate_limit_wait_seconds", "Time spent waiting for a provider rate-limit token", ("source", "priority", "outcome"))
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task/stream overhead). Requests
+    are labelled with the matched route template, not the raw path, so IDs in
+    URLs don't create new series; unmatched paths are reported as "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, scope["method"], path, status)
+
+
+def render_metrics() -> str:
+    return metrics.render()
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+import psycopg
+
+from .db_helpers import DATABASE_URL
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+RECONNECT_MAX_SEC = 30.0
+
+NotifyCallback = Callable[[str, str], None]
+
+
+def _libpq_url(url: str) -> str:
+    return url.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+class PgListener:
+    """Single LISTEN connection dispatching NOTIFY payloads to in-process callbacks."""
+
+    def __init__(self, url: str = DATABASE_URL):
+        self.url = _libpq_url(url)
+        self._callbacks: Dict[str, List[NotifyCallback]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        # Called after every (re)connect so subscribers can resync anything missed while disconnected.
+        self._on_connect: List[Callable[[], None]] = []
+
+    def subscribe(self, channel: str, callback: NotifyCallback, on_connect: Optional[Callable[[], None]] = None):
+        self._callbacks.setdefault(channel, []).append(callback)
+        if on_connect is not None:
+            self._on_connect.append(on_connect)
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    async def start(self):
+        if self._task is None and self._callbacks:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.url, autocommit=True) as conn:
+                    for channel in self._callbacks:
+                        await conn.execute(f'LISTEN "{channel}"')
+                    self._connected.set()
+                    delay = 1.0
+                    logger.info({"event": "pg_listener_connected", "channels": list(self._callbacks)})
+                    for hook in self._on_connect:
+                        hook()
+                    async for notify in conn.notifies():
+                        for callback in self._callbacks.get(notify.channel, []):
+                            try:
+                                callback(notify.channel, notify.payload)
+                            except Exception as e:
+                                logger.error({"event": "pg_listener_callback_failed", "channel": notify.channel, "detail": str(e)})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning({"event": "pg_listener_disconnected", "detail": str(e), "retry_in_sec": delay})
+            self._connected.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SEC)
+
+
+pg_listener = PgListener()
@@ -0,0 +1,114 @@
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .logging import get_logger
+from .price_storage import _table_exists
+
+logger = get_logger(__name__)
+
+BACKFILL_CHUNK_ROWS = 10000
+
+# Average-cost basis per ticker, kept current by TradeExecutor inside the trade
+# transaction. trades.position_after / cash_after snapshot the book after each
+# trade so valuation history is index lookups rather than a replay.
+COST_BASIS_DDL = """
+ALTER TABLE trades ADD COLUMN IF NOT EXISTS position_after NUMERIC;
+ALTER TABLE trades ADD COLUMN IF NOT EXISTS cash_after NUMERIC;
+CREATE INDEX IF NOT EXISTS idx_trades_ticker_executed_at ON trades (ticker, executed_at);
+CREATE TABLE IF NOT EXISTS cost_basis (
+    ticker TEXT PRIMARY KEY,
+    quantity NUMERIC NOT NULL DEFAULT 0,
+    cost NUMERIC NOT NULL DEFAULT 0,
+    realized_pnl NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+"""
+
+Basis = Tuple[float, float, float]  # (quantity, cost, realized_pnl)
+
+
+def apply_fill(basis: Basis, action: str, quantity: float, amount: float) -> Basis:
+    """
+    Average-cost update for one fill; `amount` is the cash spent (buy) or
+    received (sell). Only the held part of a sell is realized, mirroring the
+    GREATEST(quantity - q, 0) clamp on positions. Same arithmetic as the
+    cost_basis UPDATE in services/trade_executor.
+    """
+    held, cost, realized = basis
+    if action == "buy":
+        return held + quantity, cost + amount, realized
+    if held <= 0 or quantity <= 0:
+        return held, cost, realized
+    sold = min(quantity, held)
+    return held - sold, cost - cost * sold / held, realized + (amount / quantity - cost / held) * sold
+
+
+def _backfill(conn: Connection):
+    """
+    Replay existing trades once to seed cost_basis and the per-trade snapshots.
+    Fill amounts use the current trade_rules, and cash is anchored to today's
+    balance, so figures for trades executed under other rules are approximate.
+    """
+    rules = {k: float(v) for k, v in conn.execute(text("SELECT key, value FROM trade_rules")).fetchall()}
+    slippage_pct, fees_pct = rules.get("slippage_pct", 0.1), rules.get("fees_pct", 0.05)
+    basis: Dict[str, Basis] = {}
+    ids: List[int] = []
+    positions: List[float] = []
+    deltas: List[float] = []
+    rows = conn.execute(text("SELECT id, ticker, action, quantity, price FROM trades ORDER BY executed_at, id"))
+    for trade_id, ticker, action, quantity, price in rows:
+        quantity, price = float(quantity), float(price)
+        if action == "buy":
+            amount = price * quantity * (1 + slippage_pct / 100 + fees_pct / 100)
+            delta = -amount
+        else:
+            amount = price * quantity * (1 - fees_pct / 100)
+            delta = amount
+        basis[ticker] = apply_fill(basis.get(ticker, (0.0, 0.0, 0.0)), action, quantity, amount)
+        ids.append(trade_id)
+        positions.append(basis[ticker][0])
+        deltas.append(delta)
+    if not ids:
+        return
+
+    cash = float(conn.execute(text("SELECT cash_available FROM portfolio ORDER BY id LIMIT 1")).scalar() or 0)
+    # Walk back from the current balance: cash after trade i = cash now - deltas of later trades.
+    cash_after = [0.0] * len(ids)
+    for i in range(len(ids) - 1, -1, -1):
+        cash_after[i] = cash
+        cash -= deltas[i]
+    for start in range(0, len(ids), BACKFILL_CHUNK_ROWS):
+        end = start + BACKFILL_CHUNK_ROWS
+        conn.execute(text(
+            """
+            UPDATE trades SET position_after = s.position_after, cash_after = s.cash_after
+            FROM unnest(CAST(:ids AS INTEGER[]), CAST(:positions AS NUMERIC[]), CAST(:cash AS NUMERIC[]))
+                AS s(id, position_after, cash_after)
+            WHERE trades.id = s.id
+            """
+        ), {"ids": ids[start:end], "positions": positions[start:end], "cash": cash_after[start:end]})
+    tickers = list(basis)
+    conn.execute(text(
+        """
+        INSERT INTO cost_basis (ticker, quantity, cost, realized_pnl)
+        SELECT * FROM unnest(CAST(:tickers AS TEXT[]), CAST(:quantities AS NUMERIC[]),
+                             CAST(:costs AS NUMERIC[]), CAST(:realized AS NUMERIC[]))
+        ON CONFLICT (ticker) DO NOTHING
+        """
+    ), {
+        "tickers": tickers,
+        "quantities": [basis[t][0] for t in tickers],
+        "costs": [basis[t][1] for t in tickers],
+        "realized": [basis[t][2] for t in tickers],
+    })
+    logger.info({"event": "cost_basis_backfilled", "trades": len(ids), "tickers": len(tickers)})
+
+
+def create_cost_basis_tables(conn: Connection):
+    """cost_basis + per-trade snapshot columns, idempotent; seeded from trades history on first creation."""
+    backfill = not _table_exists(conn, "cost_basis")
+    conn.execute(text(COST_BASIS_DDL))
+    if backfill:
+        _backfill(conn)
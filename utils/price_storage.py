@@ -0,0 +1,212 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Partitioning only applies when market_prices is first created; an existing
+# plain table is left as is (migrate it explicitly if needed).
+MARKET_PRICES_PARTITIONED = os.getenv("MARKET_PRICES_PARTITIONED", "0").lower() in ("1", "true", "yes")
+PARTITION_DAYS_AHEAD = int(os.getenv("MARKET_PRICES_PARTITION_DAYS_AHEAD", "3"))
+# 0 disables retention; raw ticks older than this are rolled up into market_prices_daily and removed.
+RETENTION_DAYS = int(os.getenv("MARKET_PRICES_RETENTION_DAYS", "0"))
+
+
+def _table_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": name}).scalar()
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('market_prices'))"
+    )).scalar())
+
+
+def create_price_tables(conn: Connection):
+    """market_prices (+ latest-price index/table, daily rollups), idempotent."""
+    if not _table_exists(conn, "market_prices"):
+        partition_clause = " PARTITION BY RANGE (ts)" if MARKET_PRICES_PARTITIONED else ""
+        conn.execute(text(
+            f"""
+            CREATE TABLE market_prices (
+                ticker TEXT NOT NULL,
+                price NUMERIC NOT NULL,
+                ts TIMESTAMP NOT NULL DEFAULT NOW(),
+                source TEXT
+            ){partition_clause}
+            """
+        ))
+        if MARKET_PRICES_PARTITIONED:
+            conn.execute(text("CREATE TABLE market_prices_default PARTITION OF market_prices DEFAULT"))
+    conn.execute(text("ALTER TABLE market_prices ADD COLUMN IF NOT EXISTS source TEXT"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_market_prices_ticker_ts ON market_prices (ticker, ts DESC)"))
+    # Cheap on an append-only table; serves the exporter's ts range scans.
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_market_prices_ts_brin ON market_prices USING BRIN (ts)"))
+    if is_partitioned(conn):
+        ensure_partitions(conn)
+
+    backfill_latest = not _table_exists(conn, "latest_prices")
+    conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS latest_prices (
+            ticker TEXT PRIMARY KEY,
+            price NUMERIC NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            source TEXT
+        );
+        CREATE TABLE IF NOT EXISTS market_prices_daily (
+            ticker TEXT NOT NULL,
+            day DATE NOT NULL,
+            open NUMERIC NOT NULL,
+            high NUMERIC NOT NULL,
+            low NUMERIC NOT NULL,
+            close NUMERIC NOT NULL,
+            samples INTEGER NOT NULL,
+            open_ts TIMESTAMP,
+            close_ts TIMESTAMP,
+            PRIMARY KEY (ticker, day)
+        );
+        -- When the first/last ticks were seen, so late ticks can be merged into a day.
+        ALTER TABLE market_prices_daily ADD COLUMN IF NOT EXISTS open_ts TIMESTAMP;
+        ALTER TABLE market_prices_daily ADD COLUMN IF NOT EXISTS close_ts TIMESTAMP;
+        -- Statement-level trigger: one set-based upsert per INSERT/COPY batch.
+        CREATE OR REPLACE FUNCTION market_prices_update_latest() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO latest_prices (ticker, price, ts, source)
+            SELECT DISTINCT ON (ticker) ticker, price, ts, source
+            FROM new_rows
+            ORDER BY ticker, ts DESC
+            ON CONFLICT (ticker) DO UPDATE
+                SET price = EXCLUDED.price, ts = EXCLUDED.ts, source = EXCLUDED.source
+                WHERE latest_prices.ts <= EXCLUDED.ts;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        CREATE OR REPLACE TRIGGER trg_market_prices_latest
+            AFTER INSERT ON market_prices
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION market_prices_update_latest();
+        """
+    ))
+    if backfill_latest:
+        conn.execute(text(
+            """
+            INSERT INTO latest_prices (ticker, price, ts, source)
+            SELECT DISTINCT ON (ticker) ticker, price, ts, source
+            FROM market_prices
+            ORDER BY ticker, ts DESC
+            ON CONFLICT (ticker) DO NOTHING
+            """
+        ))
+
+
+def _partition_name(day: date) -> str:
+    return f"market_prices_p{day:%Y%m%d}"
+
+
+def _create_partition(conn: Connection, name: str, day: date):
+    bounds = {"start": day, "end": day + timedelta(days=1)}
+    strays = conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM market_prices_default WHERE ts >= :start AND ts < :end)"
+    ), bounds).scalar()
+    if strays:
+        # Postgres refuses a new partition while the default one holds rows in its
+        # range: move them across with the default detached, then reattach it.
+        conn.execute(text("ALTER TABLE market_prices DETACH PARTITION market_prices_default"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF market_prices "
+        f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    ))
+    if strays:
+        moved = conn.execute(text(
+            f"""
+            WITH moved AS (
+                DELETE FROM market_prices_default WHERE ts >= :start AND ts < :end
+                RETURNING ticker, price, ts, source
+            )
+            INSERT INTO {name} (ticker, price, ts, source) SELECT ticker, price, ts, source FROM moved
+            """
+        ), bounds).rowcount
+        conn.execute(text("ALTER TABLE market_prices ATTACH PARTITION market_prices_default DEFAULT"))
+        logger.info({"event": "market_prices_default_rows_moved", "partition": name, "rows": moved})
+
+
+def ensure_partitions(conn: Connection, days_ahead: int = PARTITION_DAYS_AHEAD) -> List[str]:
+    """Create daily partitions from today through `days_ahead`; a day that fails is logged and skipped."""
+    created = []
+    today = datetime.utcnow().date()
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        name = _partition_name(day)
+        if _table_exists(conn, name):
+            continue
+        try:
+            with conn.begin_nested():
+                _create_partition(conn, name, day)
+        except Exception as e:
+            logger.error({"event": "market_prices_partition_failed", "partition": name, "detail": str(e)})
+            continue
+        created.append(name)
+    return created
+
+
+def _rollup(conn: Connection, where: str, params: Dict) -> int:
+    # Late ticks for an already rolled-up day are merged in rather than lost.
+    # Rows from before open_ts/close_ts existed keep their open and close.
+    return conn.execute(text(
+        f"""
+        INSERT INTO market_prices_daily AS d (ticker, day, open, high, low, close, samples, open_ts, close_ts)
+        SELECT ticker, CAST(ts AS DATE),
+               (ARRAY_AGG(price ORDER BY ts))[1], MAX(price), MIN(price),
+               (ARRAY_AGG(price ORDER BY ts DESC))[1], COUNT(*), MIN(ts), MAX(ts)
+        FROM market_prices
+        WHERE {where}
+        GROUP BY ticker, CAST(ts AS DATE)
+        ON CONFLICT (ticker, day) DO UPDATE SET
+            high = GREATEST(d.high, EXCLUDED.high),
+            low = LEAST(d.low, EXCLUDED.low),
+            samples = d.samples + EXCLUDED.samples,
+            open = CASE WHEN EXCLUDED.open_ts < d.open_ts THEN EXCLUDED.open ELSE d.open END,
+            open_ts = CASE WHEN EXCLUDED.open_ts < d.open_ts THEN EXCLUDED.open_ts ELSE d.open_ts END,
+            close = CASE WHEN EXCLUDED.close_ts >= d.close_ts THEN EXCLUDED.close ELSE d.close END,
+            close_ts = CASE WHEN EXCLUDED.close_ts >= d.close_ts THEN EXCLUDED.close_ts ELSE d.close_ts END
+        """
+    ), params).rowcount
+
+
+def apply_retention(conn: Connection, retention_days: int = RETENTION_DAYS) -> Dict[str, int]:
+    """Roll up and remove raw ticks older than `retention_days` (whole UTC days)."""
+    if retention_days <= 0:
+        return {"rolled_up": 0, "dropped_partitions": 0, "deleted_rows": 0}
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    result = {"rolled_up": 0, "dropped_partitions": 0, "deleted_rows": 0}
+    if is_partitioned(conn):
+        names = conn.execute(text(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass('market_prices') AND c.relname LIKE 'market_prices_p%'
+            """
+        )).scalars().all()
+        for name in sorted(names):
+            day = datetime.strptime(name[len("market_prices_p"):], "%Y%m%d").date()
+            if day >= cutoff:
+                continue
+            result["rolled_up"] += _rollup(conn, "ts >= :start AND ts < :end", {"start": day, "end": day + timedelta(days=1)})
+            conn.execute(text(f"DROP TABLE {name}"))
+            result["dropped_partitions"] += 1
+    # Plain table, or stragglers that landed in the default partition.
+    result["rolled_up"] += _rollup(conn, "ts < :cutoff", {"cutoff": cutoff})
+    result["deleted_rows"] = conn.execute(text("DELETE FROM market_prices WHERE ts < :cutoff"), {"cutoff": cutoff}).rowcount
+    return result
+
+
+def run_maintenance(conn: Connection) -> Dict[str, int]:
+    created = ensure_partitions(conn) if is_partitioned(conn) else []
+    result = {"created_partitions": len(created), **apply_retention(conn)}
+    logger.info({"event": "market_prices_maintenance", **result})
+    return result
@@ -1,39 +1,578 @@
 import asyncio
+import math
+import os
 import time
-from typing import Dict
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import text
+
+from .db_helpers import get_async_session
+from .logging import get_logger
+from .metrics import RATE_LIMIT_WAIT
+
+logger = get_logger(__name__)
+
+# "local": per-process buckets. "postgres": one bucket per source shared by every
+# instance (rate_limit_buckets table), leased out in small chunks.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local").lower()
+# Tokens leased per DB round trip: about this many seconds of the source's rate (>= 1).
+RATE_LIMIT_LEASE_SEC = float(os.getenv("RATE_LIMIT_LEASE_SEC", "1"))
+# Leased tokens not used within this window are dropped rather than hoarded.
+RATE_LIMIT_LEASE_TTL_SEC = float(os.getenv("RATE_LIMIT_LEASE_TTL_SEC", "2"))
+# After a shared-store error, limit locally for this long before trying it again.
+RATE_LIMIT_FALLBACK_SEC = float(os.getenv("RATE_LIMIT_FALLBACK_SEC", "10"))
+# Callers give up (RateLimitExceeded) instead of queueing longer than this.
+RATE_LIMIT_ACQUIRE_TIMEOUT_SEC = float(os.getenv("RATE_LIMIT_ACQUIRE_TIMEOUT_SEC", "30"))
+# How often quota usage is merged with the shared counters (postgres backend only).
+QUOTA_SYNC_SEC = float(os.getenv("QUOTA_SYNC_SEC", "5"))
+
+# Priority classes, highest first. Waiters for a provider's bucket are served by
+# weighted fair queueing, so interactive work gets 16x the share of a backfill
+# but nothing starves outright.
+PRIORITY_WEIGHTS: Dict[str, float] = {"interactive": 16, "portfolio": 8, "watchlist": 4, "market": 2, "backfill": 1}
+# Fraction of a daily/monthly quota kept back from each class: market work stops
+# once 70% of the quota is spent, interactive work only when it is gone.
+QUOTA_RESERVE: Dict[str, float] = {"interactive": 0.0, "portfolio": 0.05, "watchlist": 0.15, "market": 0.30, "backfill": 0.50}
+DEFAULT_PRIORITY = "market"
+
+_priority: ContextVar[str] = ContextVar("rate_limit_priority", default=DEFAULT_PRIORITY)
+
+
+@contextmanager
+def rate_priority(priority: Optional[str]) -> Iterator[None]:
+    """Priority for provider calls made in this context (and tasks created in it)."""
+    if priority is None:
+        yield
+        return
+    if priority not in PRIORITY_WEIGHTS:
+        raise ValueError(f"unknown priority {priority!r}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimitExceeded(Exception):
+    """No token could be had within the caller's deadline."""
+
+    def __init__(self, name: str, wait: Optional[float] = None):
+        detail = f", next token in {wait:.1f}s" if wait is not None else ""
+        super().__init__(f"rate limit for {name} not acquired before deadline{detail}")
+        self.name = name
+        self.wait = wait
+
+
+class QuotaExhausted(RateLimitExceeded):
+    """The provider quota left is reserved for higher-priority work."""
+
+    def __init__(self, name: str, priority: str, remaining: float):
+        Exception.__init__(self, f"{name} quota reserved for higher priority than {priority} ({remaining:.1%} left)")
+        self.name = name
+        self.wait = None
+        self.priority = priority
+
 
 class RateLimiter:
-    """Simple token-bucket style rate limiter per key (e.g., API source)."""
+    """
+    Token bucket per key (e.g., API source). Callers reserve the next free slot
+    and sleep until it without holding a lock, so waiters are served in arrival
+    order and each can give up (timeout) without blocking the ones behind it.
+    """
 
-    def __init__(self, rate_per_sec: float, burst: int = 1):
+    def __init__(self, rate_per_sec: float, burst: int = 1, name: str = ""):
+        self.name = name
         self.rate_per_sec = rate_per_sec
-        self.tokens = burst
+        self.tokens = float(burst)  # negative while slots are reserved ahead
         self.capacity = burst
         self.updated_at = time.monotonic()
+        self.stats = {"acquired": 0, "waited": 0, "wait_sec": 0.0, "timeouts": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_sec)
+        self.updated_at = now
+
+    def available(self) -> float:
+        """Tokens currently in the bucket (refill applied, nothing consumed)."""
+        elapsed = time.monotonic() - self.updated_at
+        return max(min(self.capacity, self.tokens + elapsed * self.rate_per_sec), 0.0)
+
+    async def reserve(self, timeout: Optional[float] = None) -> Tuple[float, bool]:
+        """
+        Take the next free slot without sleeping: (seconds until it's due, True).
+        RateLimitExceeded if that's past `timeout`; refund() gives it back.
+        """
+        self._refill()
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate_per_sec
+        if timeout is not None and wait > timeout:
+            self.stats["timeouts"] += 1
+            raise RateLimitExceeded(self.name, wait)
+        self.tokens -= 1
+        if wait > 0:
+            self.stats["waited"] += 1
+            self.stats["wait_sec"] += wait
+        self.stats["acquired"] += 1
+        return wait, True
+
+    def refund(self):
+        self.tokens += 1
+        self.stats["acquired"] -= 1
+
+    async def acquire(self, timeout: Optional[float] = None):
+        wait, _ = await self.reserve(timeout)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.refund()
+                raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "wait_sec": round(self.stats["wait_sec"], 3),
+            "backend": "local",
+            "rate_per_sec": self.rate_per_sec,
+            "burst": self.capacity,
+            "available": round(self.available(), 3),
+        }
+
+
+class PostgresBucketBackend:
+    """
+    Shared token buckets in rate_limit_buckets, refilled from the DB clock so all
+    instances agree. Any backend with the same `lease` coroutine (e.g. a Redis
+    script) can be swapped in.
+    """
+
+    LEASE_SQL = text(
+        """
+        WITH cur AS (
+            SELECT name, LEAST(:capacity, tokens + EXTRACT(EPOCH FROM (clock_timestamp() - updated_at)) * :rate) AS avail
+            FROM rate_limit_buckets WHERE name = :name FOR UPDATE
+        ), granted AS (
+            SELECT name, avail, GREATEST(LEAST(:want, FLOOR(avail)), 0) AS n FROM cur
+        )
+        UPDATE rate_limit_buckets b
+        SET tokens = granted.avail - granted.n, updated_at = clock_timestamp()
+        FROM granted WHERE b.name = granted.name
+        RETURNING granted.n, granted.avail
+        """
+    )
+
+    async def lease(self, name: str, want: int, rate: float, capacity: float) -> Tuple[int, float]:
+        """Take up to `want` whole tokens; returns (granted, tokens available before the grant)."""
+        async with get_async_session() as db:
+            params = {"name": name, "want": want, "rate": rate, "capacity": capacity}
+            row = (await db.execute(self.LEASE_SQL, params)).fetchone()
+            if row is None:
+                await db.execute(
+                    text("INSERT INTO rate_limit_buckets (name, tokens) VALUES (:name, :capacity) ON CONFLICT (name) DO NOTHING"),
+                    params,
+                )
+                row = (await db.execute(self.LEASE_SQL, params)).fetchone()
+            await db.commit()
+        return int(row[0]), float(row[1])
+
+
+class SharedRateLimiter:
+    """
+    Bucket shared across instances via `backend`. Tokens are leased a few at a
+    time so most calls never touch the store; waiters queue FIFO on one lock
+    (one lease in flight per process), sleep outside it when the bucket is dry,
+    and each has its own deadline. When the store fails, limiting falls back to
+    a local bucket for a while.
+    """
+
+    def __init__(self, name: str, rate_per_sec: float, burst: int, backend: PostgresBucketBackend):
+        self.name = name
+        self.rate_per_sec = rate_per_sec
+        self.capacity = burst
+        self.backend = backend
+        self.lease_size = max(1, min(burst, math.floor(rate_per_sec * RATE_LIMIT_LEASE_SEC)))
+        self.local = RateLimiter(rate_per_sec, burst, name=name)
         self._lock = asyncio.Lock()
+        self._leased = 0
+        self._lease_expires = 0.0
+        self._shared_available = float(burst)
+        self._fallback_until = 0.0
+        self.stats = {"acquired": 0, "waited": 0, "wait_sec": 0.0, "timeouts": 0, "leases": 0, "backend_errors": 0}
+
+    def available(self) -> float:
+        leased = self._leased if time.monotonic() < self._lease_expires else 0
+        if time.monotonic() < self._fallback_until:
+            return self.local.available()
+        return min(self.capacity, leased + self._shared_available)
+
+    def _take_leased(self) -> bool:
+        if self._leased >= 1 and time.monotonic() < self._lease_expires:
+            self._leased -= 1
+            return True
+        self._leased = 0
+        return False
+
+    async def reserve(self, timeout: Optional[float] = None) -> Tuple[float, bool]:
+        """
+        (wait, reserved): with reserved, a token is held once `wait` has passed
+        (refund() gives it back); otherwise the shared bucket is dry, try again
+        after `wait`. Never sleeps for a refill.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if time.monotonic() >= self._fallback_until:
+            try:
+                await asyncio.wait_for(self._lock.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise RateLimitExceeded(self.name) from None
+            try:
+                wait = await self._acquire_shared(deadline)
+            finally:
+                self._lock.release()
+            if wait is not None:
+                if wait == 0:
+                    self.stats["acquired"] += 1
+                return wait, wait == 0
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        wait, _ = await self.local.reserve(remaining)
+        self.stats["acquired"] += 1
+        return wait, True
+
+    def refund(self):
+        # Only local-fallback reservations are ever handed out ahead of time.
+        self.local.refund()
+        self.stats["acquired"] -= 1
+
+    async def acquire(self, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait, reserved = await self.reserve(None if deadline is None else max(deadline - time.monotonic(), 0.0))
+            if wait > 0:
+                # Sleep outside the lock so other waiters can take leased tokens meanwhile.
+                try:
+                    await asyncio.sleep(wait)
+                except asyncio.CancelledError:
+                    if reserved:
+                        self.refund()
+                    raise
+            if reserved:
+                return
+
+    async def _acquire_shared(self, deadline: Optional[float]) -> Optional[float]:
+        """
+        Called under the lock. 0.0 once a shared token is taken, otherwise seconds
+        to wait before trying again; None means use the local fallback.
+        """
+        while not self._take_leased():
+            if time.monotonic() < self._fallback_until:
+                return None
+            try:
+                granted, available = await self.backend.lease(self.name, self.lease_size, self.rate_per_sec, self.capacity)
+            except Exception as e:
+                self.stats["backend_errors"] += 1
+                self._fallback_until = time.monotonic() + RATE_LIMIT_FALLBACK_SEC
+                logger.warning({"event": "rate_limit_backend_unavailable", "limiter": self.name, "detail": str(e),
+                                "fallback_sec": RATE_LIMIT_FALLBACK_SEC})
+                return None
+            self._shared_available = max(available - granted, 0.0)
+            if granted:
+                self.stats["leases"] += 1
+                self._leased = granted
+                self._lease_expires = time.monotonic() + RATE_LIMIT_LEASE_TTL_SEC
+                continue
+            wait = max((1 - available) / self.rate_per_sec, 0.001)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self.stats["timeouts"] += 1
+                raise RateLimitExceeded(self.name, wait)
+            self.stats["waited"] += 1
+            self.stats["wait_sec"] += wait
+            return wait
+        return 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "wait_sec": round(self.stats["wait_sec"], 3),
+            "backend": "postgres",
+            "rate_per_sec": self.rate_per_sec,
+            "burst": self.capacity,
+            "lease_size": self.lease_size,
+            "leased": self._leased if time.monotonic() < self._lease_expires else 0,
+            "available": round(self.available(), 3),
+            "fallback_active": time.monotonic() < self._fallback_until,
+            "local_fallback": self.local.snapshot(),
+        }
+
+
+class PriorityGate:
+    """
+    Start-time fair queueing in front of one bucket: one waiter at a time is let
+    through to reserve a token, chosen by weighted virtual time across classes.
+    The waiter sleeps until its slot outside the gate; the gate stays shut until
+    then, so the next token goes to whoever ranks highest when it comes due, not
+    to whoever was queued first.
+    """
+
+    def __init__(self, weights: Dict[str, float] = PRIORITY_WEIGHTS):
+        self.weights = weights
+        self._queues: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in weights}
+        self._start: Dict[str, float] = {p: 0.0 for p in weights}
+        self._vtime = 0.0
+        self._busy = False
+        self._hold_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {p: {"served": 0, "timeouts": 0, "quota_rejected": 0, "wait_sec": 0.0} for p in weights}
+
+    def depth(self, priority: str) -> int:
+        return sum(1 for fut in self._queues[priority] if not fut.done())
+
+    def _dispatch(self):
+        if self._busy or self._timer is not None:
+            return
+        hold = self._hold_until - time.monotonic()
+        if hold > 0:
+            self._timer = asyncio.get_running_loop().call_later(hold, self._wake)
+            return
+        best = None
+        for priority, queue in self._queues.items():
+            while queue and queue[0].done():
+                queue.popleft()
+            if queue and (best is None or self._start[priority] < self._start[best]):
+                best = priority
+        if best is None:
+            return
+        self._vtime = self._start[best]
+        self._start[best] += 1.0 / self.weights[best]
+        self._busy = True
+        self._queues[best].popleft().set_result(None)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, hold: float = 0.0):
+        self._busy = False
+        self._hold_until = time.monotonic() + hold
+        self._dispatch()
+
+    async def _turn(self, priority: str, timeout: Optional[float], name: str):
+        queue = self._queues[priority]
+        if not any(not fut.done() for fut in queue):
+            # A class returning from idle starts at the current virtual time (no banked credit).
+            self._start[priority] = max(self._start[priority], self._vtime)
+        turn = asyncio.get_running_loop().create_future()
+        queue.append(turn)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(turn, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if turn.done() and not turn.cancelled():
+                self._release()
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats[priority]["timeouts"] += 1
+                raise RateLimitExceeded(name) from None
+            raise
+
+    async def run(self, priority: str, limiter: "RateLimiter | SharedRateLimiter", timeout: Optional[float], name: str = ""):
+        started = time.monotonic()
+
+        def remaining() -> Optional[float]:
+            return None if timeout is None else max(timeout - (time.monotonic() - started), 0.0)
+
+        while True:
+            await self._turn(priority, remaining(), name)
+            wait = 0.0
+            try:
+                wait, reserved = await limiter.reserve(remaining())
+            except RateLimitExceeded:
+                self.stats[priority]["timeouts"] += 1
+                raise
+            finally:
+                self._release(wait)
+            if wait > 0:
+                try:
+                    await asyncio.sleep(wait)
+                except asyncio.CancelledError:
+                    if reserved:
+                        limiter.refund()
+                    raise
+            if reserved:
+                break
+        self.stats[priority]["served"] += 1
+        self.stats[priority]["wait_sec"] += time.monotonic() - started
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            p: {**s, "wait_sec": round(s["wait_sec"], 3), "queued": self.depth(p), "weight": self.weights[p]}
+            for p, s in self.stats.items()
+        }
+
+
+class QuotaTracker:
+    """
+    Daily/monthly call quota for a provider (0 = unlimited). With a shared
+    backend, usage is merged into provider_quota_usage every QUOTA_SYNC_SEC so
+    all instances see the same totals.
+    """
+
+    UPSERT_SQL = text(
+        """
+        INSERT INTO provider_quota_usage (provider, period, period_start, used)
+        VALUES (:provider, :period, :period_start, :delta)
+        ON CONFLICT (provider, period, period_start) DO UPDATE
+            SET used = provider_quota_usage.used + EXCLUDED.used
+        RETURNING used
+        """
+    )
+
+    def __init__(self, name: str, daily: int = 0, monthly: int = 0, shared: bool = False):
+        self.name = name
+        self.limits = {"daily": int(daily), "monthly": int(monthly)}
+        self.shared = shared
+        self.used = {"daily": 0, "monthly": 0}
+        self._unsynced = {"daily": 0, "monthly": 0}
+        self._periods = self._current_periods()
+        self._last_sync = 0.0
+        self._sync_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.limits.values())
+
+    @staticmethod
+    def _current_periods() -> Dict[str, date]:
+        today = datetime.utcnow().date()
+        return {"daily": today, "monthly": today.replace(day=1)}
+
+    def _roll(self):
+        periods = self._current_periods()
+        for period, start in periods.items():
+            if self._periods[period] != start:
+                self.used[period] = 0
+                self._unsynced[period] = 0
+        self._periods = periods
+
+    def remaining_fraction(self) -> Optional[float]:
+        if not self.enabled:
+            return None
+        self._roll()
+        fractions = [max(1 - self.used[p] / limit, 0.0) for p, limit in self.limits.items() if limit]
+        return min(fractions)
+
+    def allows(self, priority: str) -> bool:
+        remaining = self.remaining_fraction()
+        return remaining is None or remaining > QUOTA_RESERVE.get(priority, 0.0)
+
+    def record(self, cost: int):
+        if not self.enabled:
+            return
+        self._roll()
+        for period in self.used:
+            self.used[period] += cost
+            self._unsynced[period] += cost
+        if self.shared and time.monotonic() - self._last_sync >= QUOTA_SYNC_SEC and (self._sync_task is None or self._sync_task.done()):
+            self._last_sync = time.monotonic()
+            self._sync_task = asyncio.create_task(self.sync())
+
+    async def sync(self):
+        periods, deltas = dict(self._periods), dict(self._unsynced)
+        for period in deltas:
+            self._unsynced[period] -= deltas[period]
+        try:
+            async with get_async_session() as db:
+                totals = {}
+                for period, start in periods.items():
+                    params = {"provider": self.name, "period": period, "period_start": start, "delta": deltas[period]}
+                    totals[period] = (await db.execute(self.UPSERT_SQL, params)).scalar()
+                await db.commit()
+        except Exception as e:
+            for period in deltas:
+                self._unsynced[period] += deltas[period]
+            logger.warning({"event": "quota_sync_failed", "provider": self.name, "detail": str(e)})
+            return
+        if periods == self._periods:
+            for period, total in totals.items():
+                # Calls made while the sync was in flight are still only counted locally.
+                self.used[period] = int(total) + self._unsynced[period]
+
+    def snapshot(self) -> Dict[str, Any]:
+        remaining = self.remaining_fraction()
+        return {
+            "limits": self.limits,
+            "used": dict(self.used),
+            "remaining_fraction": round(remaining, 4) if remaining is not None else None,
+            "throttled": [p for p in QUOTA_RESERVE if not self.allows(p)],
+            "shared": self.shared,
+        }
+
+
+_postgres_backend: Optional[PostgresBucketBackend] = None
+
+
+def _build_limiter(name: str, rate_per_sec: float, burst: int, backend: str):
+    global _postgres_backend
+    if backend == "postgres":
+        if _postgres_backend is None:
+            _postgres_backend = PostgresBucketBackend()
+        return SharedRateLimiter(name, rate_per_sec, burst, _postgres_backend)
+    return RateLimiter(rate_per_sec=rate_per_sec, burst=burst, name=name)
 
-    async def acquire(self):
-        async with self._lock:
-            now = time.monotonic()
-            elapsed = now - self.updated_at
-            self.updated_at = now
-            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_sec)
-            if self.tokens < 1:
-                sleep_for = (1 - self.tokens) / self.rate_per_sec
-                await asyncio.sleep(sleep_for)
-                self.tokens = 0
-            self.tokens -= 1
 
 class MultiRateLimiter:
-    """Manage multiple per-source limiters."""
+    """
+    Manage multiple per-source limiters. Each source's bucket sits behind a
+    PriorityGate and an optional QuotaTracker; callers' priority comes from
+    `priority=` or the surrounding rate_priority() context.
+    """
 
-    def __init__(self, configs: Dict[str, Dict[str, float]]):
-        self._limiters: Dict[str, RateLimiter] = {
-            name: RateLimiter(rate_per_sec=cfg.get("rate_per_sec", 1.0), burst=int(cfg.get("burst", 1)))
+    def __init__(self, configs: Dict[str, Dict[str, float]], backend: str = RATE_LIMIT_BACKEND,
+                 acquire_timeout: Optional[float] = RATE_LIMIT_ACQUIRE_TIMEOUT_SEC):
+        self.acquire_timeout = acquire_timeout
+        self._limiters = {
+            name: _build_limiter(name, cfg.get("rate_per_sec", 1.0), int(cfg.get("burst", 1)), backend)
+            for name, cfg in configs.items()
+        }
+        self._gates = {name: PriorityGate() for name in configs}
+        self._quotas = {
+            name: QuotaTracker(name, cfg.get("daily_quota", 0), cfg.get("monthly_quota", 0), shared=backend == "postgres")
             for name, cfg in configs.items()
         }
 
-    async def acquire(self, name: str):
+    async def acquire(self, name: str, timeout: Optional[float] = None, priority: Optional[str] = None, cost: int = 1):
         limiter = self._limiters.get(name)
-        if limiter:
-            await limiter.acquire()
\ No newline at end of file
+        if not limiter:
+            return
+        priority = priority or _priority.get()
+        if priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"unknown priority {priority!r}")
+        quota = self._quotas[name]
+        if not quota.allows(priority):
+            self._gates[name].stats[priority]["quota_rejected"] += 1
+            raise QuotaExhausted(name, priority, quota.remaining_fraction() or 0.0)
+        started = time.perf_counter()
+        try:
+            await self._gates[name].run(priority, limiter, timeout if timeout is not None else self.acquire_timeout, name)
+        except RateLimitExceeded:
+            RATE_LIMIT_WAIT.observe(time.perf_counter() - started, name, priority, "timeout")
+            raise
+        RATE_LIMIT_WAIT.observe(time.perf_counter() - started, name, priority, "ok")
+        quota.record(cost)
+
+    def budget(self, name: str, priority: Optional[str] = None) -> float:
+        """Fraction of the bucket currently available for `name` (1.0 when unlimited, 0.0 when quota-throttled)."""
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            return 1.0
+        if priority is not None and not self._quotas[name].allows(priority):
+            return 0.0
+        return limiter.available() / limiter.capacity
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {**limiter.snapshot(), "priorities": self._gates[name].snapshot(), "quota": self._quotas[name].snapshot()}
+            for name, limiter in self._limiters.items()
+        }
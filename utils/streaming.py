@@ -0,0 +1,139 @@
+import base64
+import codecs
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, Iterable, List
+
+from fastapi.responses import StreamingResponse
+
+from .db_helpers import log_error
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+_skip_ws = re.compile(r"[ \t\n\r]*").match
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Opaque, URL-safe pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor("malformed cursor") from None
+    if not isinstance(state, dict):
+        raise InvalidCursor("malformed cursor")
+    return state
+
+
+def _default(value: Any) -> Any:
+    # Same rendering as FastAPI's JSON responses for the types BigQuery/Postgres rows carry.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def ndjson_lines(rows: Iterable[Any]) -> bytes:
+    return b"".join(json.dumps(row, default=_default, separators=(",", ":")).encode() + b"\n" for row in rows)
+
+
+async def _ndjson_chunks(batches: AsyncIterator[List[Any]], encoded: bool, context: str) -> AsyncIterator[bytes]:
+    try:
+        async for batch in batches:
+            if batch:
+                yield b"\n".join(batch) + b"\n" if encoded else ndjson_lines(batch)
+    except Exception as e:
+        # Headers are already sent: all we can do is log and cut the stream short.
+        logger.exception({"event": "stream_aborted", "context": context})
+        await log_error(context, str(e))
+        raise
+
+
+def ndjson_response(batches: AsyncIterator[List[Any]], context: str, encoded: bool = False) -> StreamingResponse:
+    """
+    One response chunk per batch (a BigQuery page, the items completed by one
+    upstream read); batches are pulled only as the client reads, so memory
+    holds a single batch. `encoded` batches are already JSON bytes.
+    """
+    return StreamingResponse(_ndjson_chunks(batches, encoded, context), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def split_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[bytes]]:
+    """
+    Split a streamed JSON array into its elements' raw bytes, yielding the
+    elements completed by each chunk; only the element in progress is
+    buffered. A body that is not a top-level array is yielded whole, once.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    pos = 0
+    is_array = None
+    first = True
+    finished = False
+    async for chunk in chunks:
+        if finished:
+            continue
+        text += decoder.decode(chunk)
+        if is_array is None:
+            pos = _skip_ws(text, 0).end()
+            if pos == len(text):
+                continue
+            is_array = text[pos] == "["
+            pos += 1
+        if not is_array:
+            continue
+        items: List[bytes] = []
+        while True:
+            start = _skip_ws(text, pos).end()
+            if first and start < len(text) and text[start] == "]":
+                finished = True  # empty array
+                break
+            try:
+                # Parsed (in C) only to find where the element ends; its source text is passed on as is.
+                _, end = _raw_decode(text, start)
+            except ValueError:
+                break  # element continues in the next chunk
+            after = _skip_ws(text, end).end()
+            if after == len(text) or text[after] not in ",]":
+                break  # a number may still be growing ("1" of "1.5"); wait for its delimiter
+            items.append(text[start:end].encode())
+            first = False
+            pos = after + 1
+            if text[after] == "]":
+                finished = True
+                break
+        text = text[pos:]
+        pos = 0
+        if items:
+            yield items
+    if is_array is False:
+        yield [(text + decoder.decode(b"", final=True)).strip().encode()]
+    elif is_array and not finished:
+        raise ValueError("truncated or malformed JSON array")
+
+
+async def split_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[bytes]]:
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        lines = buf.split(b"\n")
+        buf = lines.pop()
+        items = [line.strip() for line in lines if line.strip()]
+        if items:
+            yield items
+    if buf.strip():
+        yield [buf.strip()]
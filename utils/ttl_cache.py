@@ -0,0 +1,112 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class AsyncTTLCache:
+    """
+    TTL + LRU cache for async loaders with single-flight: concurrent misses on
+    the same key share one in-flight load instead of each running their own.
+    Failed loads are not cached.
+
+    With `stale_ttl`, an entry past `ttl` is still served for up to `stale_ttl`
+    more seconds while one background load refreshes it (stale-while-revalidate);
+    if that refresh fails the stale value keeps being served until it expires.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256, stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # A load only stores its result while it is still the registered in-flight
+        # load for its key, so loads that raced an invalidate() are discarded.
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale_served": 0, "load_errors": 0, "evictions": 0, "invalidations": 0}
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, bool, Any]:
+        """(found, fresh, value)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, False, None
+        age = time.monotonic() - entry[0]
+        if age >= self.ttl + self.stale_ttl:
+            del self._entries[key]
+            return False, False, None
+        self._entries.move_to_end(key)
+        return True, age < self.ttl, entry[1]
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        return task
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        found, fresh, value = self._lookup(key)
+        if found and fresh:
+            self.stats["hits"] += 1
+            return value
+        if found:
+            self.stats["stale_served"] += 1
+            self._start_load(key, loader)
+            return value
+        if key in self._inflight:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+        # Shielded so one cancelled caller (e.g. client disconnect) doesn't fail the others.
+        return await asyncio.shield(self._start_load(key, loader))
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        except BaseException:
+            self.stats["load_errors"] += 1
+            raise
+        finally:
+            current = self._inflight.get(key) is asyncio.current_task()
+            if current:
+                del self._inflight[key]
+        if current:
+            self._store(key, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        self.stats["invalidations"] += 1
+        if key is None:
+            self._entries.clear()
+            # Callers already waiting keep their load; new callers start a fresh one.
+            self._inflight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        served = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"] + self.stats["stale_served"]
+        return {
+            **self.stats,
+            # Everything except misses was answered without a backend call of its own.
+            "hit_ratio": round((served - self.stats["misses"]) / served, 4) if served else None,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "ttl_sec": self.ttl,
+            "stale_ttl_sec": self.stale_ttl,
+            "max_entries": self.max_entries,
+        }
+
+
+def _consume_exception(task: asyncio.Future):
+    # Stale refreshes may have no awaiter; failures are already counted in load_errors.
+    if not task.cancelled():
+        task.exception()